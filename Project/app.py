@@ -1,16 +1,13 @@
 import streamlit as st
-from visualizations import (
-    create_genre_popularity_chart, 
-    create_audio_features_correlation, 
-    create_energy_time_analysis,
-    create_danceability_engagement,
-    create_consistent_artists,
-    create_track_length_viral,
-    create_energy_by_genre,
-    create_tempo_loudness_analysis,
-    create_explicit_content_analysis
-)
-import pandas as pd
+from visualizations import get_chart, dataset_columns
+from visualizations.live_dataset import LiveDataset
+from visualizations.filtering import filter_frame, dataset_genres
+from visualizations.aggregates import row_count
+from visualizations.joint_histograms import FEATURE_LABELS, RESOLUTIONS
+from visualizations.warmup import start_warmup
+from visualizations.prefetch import prefetcher
+from visualizations.profiling import PROFILE_ENABLED, PROFILE_LOG, start_trace, span, finish_trace, stage_totals, start_profile, stop_profile
+import uuid
 import os
 
 st.set_page_config(
@@ -20,46 +17,36 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-@st.cache_data
-def load_data():
-    possible_paths = [
-        'data/dataset.csv',
-        './data/dataset.csv', 
-        'Project/data/dataset.csv',
-        os.path.join(os.path.dirname(__file__), 'data', 'dataset.csv')
-    ]
-    
-    for path in possible_paths:
-        try:
-            if os.path.exists(path):
-                return pd.read_csv(path)
-        except:
-            continue
-    
-    return pd.read_csv('data/dataset.csv')
+start_trace()
+if 'profiler' in st.session_state:
+    # A profiled rerun cut short by st.rerun() leaves its profiler running
+    st.session_state.pop('profiler').disable()
+if st.session_state.pop('profile_next_rerun', False):
+    st.session_state.profiler = start_profile()
 
-df = load_data()
+@st.cache_resource
+def live_dataset():
+    # Shared across sessions so the memory-mapped snapshot is not copied per rerun,
+    # limited to the columns the charts declare and reloaded in the background when the CSV changes
+    dataset = LiveDataset(dataset_columns())
+    dataset.current()
+    dataset.watch()
+    return dataset
+
+with span('data_load'):
+    # Held for the whole rerun, a reload swapping in a new version only affects later reruns
+    df = live_dataset().current()
 
 
 def filter_data_by_genre(df, selected_genres):
     if 'All Genres' in selected_genres or not selected_genres:
         return df
-    return df[df['track_genre'].isin(selected_genres)]
+    return filter_frame(df, selected_genres, 'All')
 
 def filter_data(df, selected_genres, explicit_filter):
     """Filter data by both genre and explicit content"""
-    filtered_df = df.copy()
-    
-
-    if selected_genres and 'All Genres' not in selected_genres:
-        filtered_df = filtered_df[filtered_df['track_genre'].isin(selected_genres)]
-    
-    if explicit_filter == "Explicit Only":
-        filtered_df = filtered_df[filtered_df['explicit'] == True]
-    elif explicit_filter == "Non-Explicit Only":
-        filtered_df = filtered_df[filtered_df['explicit'] == False]
-    
-    return filtered_df
+    with span('filter'):
+        return filter_frame(df, selected_genres, explicit_filter)
 
 def load_css(file_name):
     possible_paths = [
@@ -108,7 +95,7 @@ st.markdown("""
 if 'filter_panel_open' not in st.session_state:
     st.session_state.filter_panel_open = False
 
-all_genres = sorted(df['track_genre'].unique())
+all_genres = dataset_genres(df)
 genre_options = ['All Genres'] + all_genres
 
 
@@ -137,24 +124,47 @@ tab_descriptions = {
     }
 }
 
+def feature_explorer_controls(tab_key):
+    """Feature pair and bin resolution pickers for the feature explorer"""
+    features = list(FEATURE_LABELS)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        x_feature = st.selectbox("X axis feature:", options=features, index=features.index('danceability'),
+                                 format_func=FEATURE_LABELS.get, key=f"explorer_x_{tab_key}")
+    with col2:
+        y_options = [f for f in features if f != x_feature]
+        y_feature = st.selectbox("Y axis feature:", options=y_options, index=y_options.index('energy') if 'energy' in y_options else 0,
+                                 format_func=FEATURE_LABELS.get, key=f"explorer_y_{tab_key}")
+    with col3:
+        resolution = st.select_slider("Bins per feature:", options=list(RESOLUTIONS), value=8, key=f"explorer_bins_{tab_key}")
+    return {'x_feature': x_feature, 'y_feature': y_feature, 'resolution': resolution}
+
+
 graph_config = {
     "Track's Popularity": {
         "graphs": [
             {
                 "title": "Top 20 Genres by Average Popularity", 
-                "func": create_genre_popularity_chart,
+                "func": "create_genre_popularity_chart",
                 "description": "Which music genres consistently achieve higher popularity scores on Spotify? This analysis reveals the most successful genres.",
                 "insights": ["Electronic and pop genres dominate popularity rankings", "Traditional genres show varying success patterns", "Emerging genres demonstrate growth potential"]
             },
             {
                 "title": "Audio Feature Combinations + Vocal vs Instrumental", 
-                "func": create_audio_features_correlation,
+                "func": "create_audio_features_correlation",
                 "description": "How do different audio characteristics work together to create popular tracks? Explore the relationships between features like energy, danceability, and vocal content.",
                 "insights": ["High-energy tracks often correlate with high danceability", "Vocal tracks generally outperform instrumental ones", "Sweet spots exist for feature combinations"]
             },
+            {
+                "title": "Audio Feature Explorer", 
+                "func": "create_feature_explorer",
+                "controls": feature_explorer_controls,
+                "description": "Pick any two audio features and a bin resolution to see how their combinations relate to average popularity.",
+                "insights": ["Every feature pair is precomputed, so switching pairs is instant", "Finer bins reveal narrow sweet spots", "Empty cells mark combinations no track has"]
+            },
             {
                 "title": "Energy Correlation + Energy Trends", 
-                "func": create_energy_time_analysis,
+                "func": "create_energy_time_analysis",
                 "description": "Track the evolution of energy levels in popular music and understand how energy correlates with other musical features.",
                 "insights": ["Music energy levels have evolved over decades", "Energy strongly correlates with listener engagement", "Genre-specific energy patterns exist"]
             }
@@ -164,19 +174,19 @@ graph_config = {
         "graphs": [
             {
                 "title": "How Does Danceability Affect Listener Engagement?", 
-                "func": create_danceability_engagement,
+                "func": "create_danceability_engagement",
                 "description": "Explore the relationship between a track's danceability score and its popularity. Do more danceable tracks perform better?",
                 "insights": ["Moderate danceability often performs best", "Different genres have optimal danceability ranges", "Danceability correlates with energy and valence"]
             },
             {
                 "title": "Which Artists Consistently Produce Popular Tracks?", 
-                "func": create_consistent_artists,
+                "func": "create_consistent_artists",
                 "description": "Identify artists who regularly create popular content and understand what makes them successful.",
                 "insights": ["Top artists maintain consistent quality", "Genre specialization leads to reliability", "Popular artists adapt to trends while maintaining style"]
             },
             {
                 "title": "Are Longer or Shorter Tracks More Likely to Go Viral?", 
-                "func": create_track_length_viral,
+                "func": "create_track_length_viral",
                 "description": "Analyze the relationship between track duration and popularity to understand optimal song lengths.",
                 "insights": ["Optimal track length varies by genre", "Streaming platforms influence length preferences", "Attention span considerations affect virality"]
             }
@@ -186,19 +196,19 @@ graph_config = {
         "graphs": [
             {
                 "title": "How Does Energy Level Vary by Genre?", 
-                "func": create_energy_by_genre,
+                "func": "create_energy_by_genre",
                 "description": "Compare energy distributions across different music genres to understand genre-specific characteristics.",
                 "insights": ["Each genre has distinct energy signatures", "High-energy genres dominate certain contexts", "Energy variance differs significantly by genre"]
             },
             {
                 "title": "Tempo & Loudness vs Popularity", 
-                "func": create_tempo_loudness_analysis,
+                "func": "create_tempo_loudness_analysis",
                 "description": "Examine how tempo and loudness interact to influence track success and listener preference.",
                 "insights": ["Optimal tempo-loudness combinations exist", "Genre influences ideal tempo ranges", "Loudness wars impact modern music"]
             },
             {
                 "title": "How Does Explicit Content Affect Track Popularity?", 
-                "func": create_explicit_content_analysis,
+                "func": "create_explicit_content_analysis",
                 "description": "Understand the impact of explicit content on track performance across different contexts and demographics.",
                 "insights": ["Explicit content effects vary by genre", "Platform policies influence explicit track success", "Audience preferences differ by demographic"]
             }
@@ -206,6 +216,14 @@ graph_config = {
     }
 }
 
+
+@st.cache_resource
+def warmup_charts(fingerprint, _df):
+    # Once per dataset version, a no-op unless CHART_WARMUP_WORKERS is set
+    return start_warmup(_df, [graph['func'] for tab in graph_config.values() for graph in tab['graphs']])
+
+warmup_charts(df.attrs['fingerprint'], df)
+
 if st.session_state.show_onboarding:
     st.info("""
      ** ** 
@@ -307,12 +325,23 @@ if st.session_state.show_filter:
             st.info("**All content types**")
         
 
-        st.metric("Filtered Tracks", f"{len(current_filtered_df):,}")
+        st.metric("Filtered Tracks", f"{row_count(current_filtered_df):,}")
+        if current_filtered_df.attrs.get('sampled') and 'All Genres' not in current_genres and len(current_genres) > 1:
+            st.caption("Streamed dataset: a track listed under several of the selected genres counts once per genre.")
     
     st.markdown("---")
 
 st.markdown('<div class="main-content">', unsafe_allow_html=True)
 
+def prefetch_neighbours(tab_name, current_index, filtered_df):
+    """Build the previous and next charts of this tab and the first chart of the other tabs in the background"""
+    graphs = graph_config[tab_name]["graphs"]
+    names = [graphs[i]['func'] for i in (current_index + 1, current_index - 1) if 0 <= i < len(graphs)]
+    names += [tab['graphs'][0]['func'] for name, tab in graph_config.items() if name != tab_name]
+    if 'prefetch_owner' not in st.session_state:
+        st.session_state.prefetch_owner = uuid.uuid4().hex
+    prefetcher.prefetch(st.session_state.prefetch_owner, filtered_df, [get_chart(name) for name in names])
+
 def display_graph_with_navigation(tab_name, tab_key):
     """Display current graph with navigation and enhanced information"""
 
@@ -356,13 +385,20 @@ def display_graph_with_navigation(tab_name, tab_key):
         st.markdown("<p style='color: #B8B8B8; font-size: 0.9rem; margin-bottom: 1rem;'><i>Box plots show energy distribution: median (line), quartiles (box), and outliers (points)</i></p>", unsafe_allow_html=True)
     
 
+    chart_options = current_graph['controls'](tab_key) if 'controls' in current_graph else {}
+
     try:
         with st.spinner("Loading visualization..."):
-            fig = current_graph['func'](current_filtered_df)
-            st.plotly_chart(fig, use_container_width=True, key=f"{tab_key}_{current_index}")
+            with span('chart', chart=current_graph['func']):
+                fig = prefetcher.figure(get_chart(current_graph['func']), current_filtered_df, **chart_options)
+            payload = len(fig.to_json()) if PROFILE_ENABLED else None
+            with span('plotly_chart', bytes=payload):
+                st.plotly_chart(fig, use_container_width=True, key=f"{tab_key}_{current_index}")
     except Exception as e:
         st.error(f"Error loading visualization: {str(e)}")
         st.info("Please try refreshing the page or navigating to a different graph.")
+
+    prefetch_neighbours(tab_name, current_index, current_filtered_df)
     
 
     col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 1, 2])
@@ -407,6 +443,21 @@ current_filtered_df = filter_data(df, current_genres, current_explicit)
 
 st.markdown(f"""
 <div style='text-align: center; color: #FFFFFF; font-size: 0.9rem; margin-top: 2rem;'>
-    INF8808E | Data from Spotify Dataset | <strong>{len(current_filtered_df):,} tracks</strong> analyzed across 20+ audio features
+    INF8808E | Data from Spotify Dataset | <strong>{row_count(current_filtered_df):,} tracks</strong> analyzed across 20+ audio features
 </div>
 """, unsafe_allow_html=True)
+
+if PROFILE_ENABLED:
+    if 'profiler' in st.session_state:
+        st.session_state.profile_data = stop_profile(st.session_state.pop('profiler'))
+    record = finish_trace()
+    with st.expander("Developer: performance"):
+        st.caption(f"This rerun took {record['total_ms']:.0f} ms, appended to {PROFILE_LOG}. Aggregation is the time charts spend in the shared aggregates, chart the rest of the figure construction.")
+        st.dataframe([{'stage': stage, 'ms': round(ms, 1)} for stage, ms in stage_totals(record).items()], use_container_width=True)
+        st.dataframe([{**entry, 'ms': round(entry.get('ms', 0.0), 1)} for entry in record['spans']], use_container_width=True)
+        if st.button("Profile next rerun", key="profile_next"):
+            st.session_state.profile_next_rerun = True
+            st.rerun()
+        if 'profile_data' in st.session_state:
+            st.download_button("Download profile (.prof)", st.session_state.profile_data, file_name="rerun.prof",
+                               mime="application/octet-stream", key="profile_download")
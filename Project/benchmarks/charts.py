@@ -0,0 +1,175 @@
+"""Scaling benchmark for every chart exported by the visualizations package
+
+Usage (from the Project directory):
+
+    python -m benchmarks.charts --rows 114000 1000000 --output bench.json
+    python -m benchmarks.charts --baseline bench_baseline.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.io as pio
+import plotly.tools
+
+import visualizations
+from visualizations.store import prepare
+from visualizations.filtering import filter_frame, dataset_genres
+from visualizations.dataset import compact_frame, tracks_from_rows
+from visualizations.tracks import TRACK_ID
+from visualizations.frozen_figure import freeze
+from benchmarks.synthetic import generate_dataset
+
+DEFAULT_ROWS = [114_000, 1_000_000, 10_000_000]
+
+
+def filter_states(df):
+    genres = dataset_genres(df)
+    return {
+        'all': (['All Genres'], 'All'),
+        'one_genre': (genres[:1], 'All'),
+        'five_genres': (genres[:5], 'All'),
+        'explicit_only': (['All Genres'], 'Explicit Only'),
+        'five_genres_clean': (genres[:5], 'Non-Explicit Only')
+    }
+
+
+def plotly_chart_spec(fig):
+    """The JSON st.plotly_chart derives from `fig` on every rerun"""
+    return pio.to_json(plotly.tools.return_figure_from_figure_or_data(fig, validate_figure=True), validate=False)
+
+
+def best_time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure(func, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig = func(data)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    frozen = freeze(fig)
+    return {
+        'seconds': min(timings),
+        'peak_mb': peak / 1024 / 1024,
+        'figure_bytes': len(fig.to_json()),
+        # Per-rerun cost of handing the chart to Streamlit, as built and as kept in the figure cache
+        'serialize_seconds': best_time(lambda: plotly_chart_spec(fig), repeat),
+        'cached_serialize_seconds': best_time(lambda: plotly_chart_spec(frozen), repeat)
+    }
+
+
+def run(rows, charts, repeat):
+    results = []
+    for n_rows in rows:
+        start = time.perf_counter()
+        df = generate_dataset(n_rows)
+        generate_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        columns = visualizations.dataset_columns()
+        df = prepare(tracks_from_rows(compact_frame(df, columns + [TRACK_ID]), columns))
+        prepare_seconds = time.perf_counter() - start
+        print(f"{n_rows:>11,} rows | generated in {generate_seconds:.1f}s | prepared in {prepare_seconds:.2f}s", file=sys.stderr)
+
+        for state, (genres, explicit) in filter_states(df).items():
+            start = time.perf_counter()
+            data = filter_frame(df, genres, explicit)
+            filter_seconds = time.perf_counter() - start
+
+            for name in charts:
+                try:
+                    result = measure(getattr(visualizations, name), data, repeat)
+                except Exception as e:
+                    result = {'error': f'{type(e).__name__}: {e}'}
+                result.update({'rows': n_rows, 'chart': name, 'state': state, 'filtered_rows': len(data), 'filter_seconds': filter_seconds})
+                results.append(result)
+                print(format_result(result), file=sys.stderr)
+        del df
+    return results
+
+
+def format_result(result):
+    label = f"{result['rows']:>11,} {result['state']:<18} {result['chart']:<36}"
+    if 'error' in result:
+        return f"{label} ERROR {result['error']}"
+    return (f"{label} {result['seconds'] * 1000:9.1f} ms {result['peak_mb']:8.1f} MB {result['figure_bytes'] / 1024:9.1f} KB"
+            f" | rerun {result['serialize_seconds'] * 1000:6.1f} -> {result['cached_serialize_seconds'] * 1000:6.1f} ms")
+
+
+def compare(results, baseline, tolerance):
+    """Print the time ratio against the baseline and return the entries slower than `tolerance`"""
+    previous = {(r['rows'], r['chart'], r['state']): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    for result in results:
+        before = previous.get((result['rows'], result['chart'], result['state']))
+        if before is None or 'error' in result:
+            continue
+        ratio = result['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        flag = ''
+        if ratio > tolerance:
+            regressions.append(result)
+            flag = '  <-- regression'
+        print(f"{result['rows']:>11,} {result['state']:<18} {result['chart']:<36} x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--charts', nargs='+', default=visualizations.__all__)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    results = run(args.rows, args.charts, args.repeat)
+
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plotly': plotly.__version__,
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Cold import time of the visualizations package, the app's startup modules and each chart
+
+Every target is imported in a fresh interpreter with -X importtime, so nothing is already cached.
+
+Usage (from the Project directory):
+
+    python -m benchmarks.import_time --output import_results.json
+    python -m benchmarks.import_time --baseline import_baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import visualizations
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP_MODULES = [
+    'visualizations',
+    'visualizations.dataset',
+    'visualizations.store',
+    'visualizations.filtering',
+    'visualizations.figure_cache',
+    'visualizations.joint_histograms'
+]
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def targets():
+    result = {
+        'package': 'import visualizations',
+        'startup': 'import ' + ', '.join(STARTUP_MODULES)
+    }
+    for name in visualizations.__all__:
+        result[name] = f'from visualizations import {name}'
+    return result
+
+
+def measure(statement):
+    """Total import time in ms of `statement` in a new interpreter, and its slowest top-level imports"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True, check=True, cwd=PROJECT_DIR)
+    total_us = 0
+    top_level = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        total_us += int(self_us)
+        if len(indent) == 1:
+            top_level.append((module, int(cumulative_us) / 1000))
+    top_level.sort(key=lambda item: item[1], reverse=True)
+    return total_us / 1000, top_level[:5]
+
+
+def run(repeat):
+    results = []
+    for name, statement in targets().items():
+        runs = [measure(statement) for _ in range(repeat)]
+        total_ms, slowest = min(runs, key=lambda run: run[0])
+        results.append({'target': name, 'statement': statement, 'ms': total_ms, 'slowest': slowest})
+        print(f"{name:<36} {total_ms:8.1f} ms   " + ', '.join(f'{module} {ms:.0f}' for module, ms in slowest[:3]), file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print the ratio against the baseline and return the targets slower than `tolerance`"""
+    previous = {r['target']: r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(result['target'])
+        if before is None:
+            continue
+        ratio = result['ms'] / before['ms'] if before['ms'] else float('inf')
+        flag = ''
+        if ratio > tolerance:
+            regressions.append(result)
+            flag = '  <-- regression'
+        print(f"{result['target']:<36} x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='import_results.json')
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat)
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Concurrent-session load test for app.py driven by Streamlit's AppTest
+
+Usage (from the Project directory):
+
+    python -m benchmarks.load_test --sessions 8 --steps 30 --output load_results.json
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import resource
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.synthetic import generate_dataset
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+TAB_BUTTONS = ['tab1', 'tab2', 'tab3']
+
+TAB_KEYS = {
+    "Track's Popularity": 'popularity',
+    "Audience Analysis": 'audience',
+    "Track Analysis": 'track'
+}
+
+# Relative frequency of each interaction in a simulated session
+ACTIONS = {
+    'next': 0.35,
+    'back': 0.15,
+    'tab': 0.25,
+    'genres': 0.15,
+    'explicit': 0.10
+}
+
+EXPLICIT_OPTIONS = ["All", "Explicit Only", "Non-Explicit Only"]
+
+
+def rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def session_state_bytes(at):
+    total = 0
+    for value in at.session_state.to_dict().values():
+        try:
+            total += len(pickle.dumps(value))
+        except Exception:
+            continue
+    return total
+
+
+def share_mock_runtime():
+    """AppTest installs a mock Runtime singleton for each run and clears it when the run ends.
+
+    Concurrent sessions would otherwise lose the runtime in the middle of a run, so
+    keep the last installed mock visible to every session.
+    """
+    from streamlit.runtime.runtime import Runtime
+
+    original = Runtime.instance.__func__
+    installed = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            installed['runtime'] = cls._instance
+            return cls._instance
+        if 'runtime' in installed:
+            return installed['runtime']
+        return original(cls)
+
+    Runtime.instance = classmethod(instance)
+
+
+def _button(at, key):
+    matches = [b for b in at.button if b.key == key]
+    return matches[0] if matches else None
+
+
+def perform(at, action, rng, genres):
+    """Apply one interaction to the session; returns False when it is not available on the current page"""
+    tab_key = TAB_KEYS[at.session_state['active_tab']]
+
+    if action in ('next', 'back'):
+        button = _button(at, f'{action}_{tab_key}')
+        if button is None:
+            return False
+        button.click()
+    elif action == 'tab':
+        _button(at, rng.choice(TAB_BUTTONS)).click()
+    else:
+        if not at.session_state['show_filter']:
+            _button(at, 'filter_toggle').click()
+            at.run()
+        if action == 'genres':
+            choice = ['All Genres'] if rng.random() < 0.3 else rng.sample(genres, rng.randint(1, 3))
+            at.multiselect(key='genre_filter').set_value(choice)
+        else:
+            at.selectbox(key='explicit_filter').set_value(rng.choice(EXPLICIT_OPTIONS))
+    return True
+
+
+def run_session(session_id, steps, genres, timeout, think_time):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(session_id)
+    samples = []
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    start = time.perf_counter()
+    at.run()
+    samples.append(('initial', time.perf_counter() - start))
+
+    names, weights = zip(*ACTIONS.items())
+    for _ in range(steps):
+        action = rng.choices(names, weights)[0]
+        if not perform(at, action, rng, genres):
+            continue
+        start = time.perf_counter()
+        at.run()
+        samples.append((action, time.perf_counter() - start))
+        if think_time:
+            time.sleep(rng.uniform(0, 2 * think_time))
+
+    return {
+        'session': session_id,
+        'samples': samples,
+        'errors': [e.value for e in at.error] + [str(e.value) for e in at.exception],
+        'state_bytes': session_state_bytes(at)
+    }
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    return {
+        'count': len(values),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max())
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--steps', type=int, default=30, help='interactions per session')
+    parser.add_argument('--rows', type=int, default=114_000, help='rows of the synthetic dataset')
+    parser.add_argument('--dataset', help='use this CSV instead of a synthetic one')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean pause between interactions in seconds')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--output', default='load_results.json')
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = args.dataset
+        if dataset is None:
+            dataset = os.path.join(tmp, 'dataset.csv')
+            generate_dataset(args.rows).to_csv(dataset, index=False)
+        os.environ['SPOTIFY_DATASET'] = dataset
+
+        import pandas as pd
+        genres = sorted(pd.read_csv(dataset, usecols=['track_genre'])['track_genre'].dropna().unique())
+
+        share_mock_runtime()
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            futures = [pool.submit(run_session, i, args.steps, genres, args.timeout, args.think_time) for i in range(args.sessions)]
+            sessions = [f.result() for f in futures]
+        elapsed = time.perf_counter() - start
+        rss_after = rss_mb()
+
+    latencies = [seconds for s in sessions for _, seconds in s['samples'] if _ != 'initial']
+    by_action = {}
+    for s in sessions:
+        for action, seconds in s['samples']:
+            by_action.setdefault(action, []).append(seconds)
+
+    report = {
+        'sessions': args.sessions,
+        'steps': args.steps,
+        'rows': args.rows if args.dataset is None else None,
+        'elapsed_seconds': elapsed,
+        'reruns_per_second': sum(len(s['samples']) for s in sessions) / elapsed,
+        'rerun_latency': percentiles(latencies) if latencies else None,
+        'by_action': {action: percentiles(values) for action, values in by_action.items()},
+        'peak_rss_mb': rss_after,
+        'rss_growth_per_session_mb': (rss_after - rss_before) / args.sessions,
+        'session_state_bytes': float(np.mean([s['state_bytes'] for s in sessions])),
+        'errors': [e for s in sessions for e in s['errors']]
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{args.sessions} sessions x {args.steps} steps in {elapsed:.1f}s ({report['reruns_per_second']:.1f} reruns/s)")
+    if report['rerun_latency']:
+        lat = report['rerun_latency']
+        print(f"rerun latency p50 {lat['p50_ms']:.0f} ms | p95 {lat['p95_ms']:.0f} ms | p99 {lat['p99_ms']:.0f} ms")
+    print(f"peak RSS {rss_after:.0f} MB | growth per session {report['rss_growth_per_session_mb']:.1f} MB | session state {report['session_state_bytes']:.0f} B")
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+N_GENRES = 114
+EXPLICIT_RATE = 0.086
+COLLAB_RATE = 0.22
+
+
+def _pool(prefix, size):
+    return np.array([f'{prefix} {i}' for i in range(size)], dtype=object)
+
+
+def generate_dataset(n_rows, seed=0):
+    """Random frame with the columns and dtypes of data/dataset.csv
+
+    String columns are drawn from fixed pools so large frames share the same
+    string objects instead of allocating one per row.
+    """
+    rng = np.random.default_rng(seed)
+    genres = np.array([f'genre_{i:03d}' for i in range(N_GENRES)], dtype=object)
+
+    n_artists = max(10, n_rows // 4)
+    artist_pool = _pool('Artist', n_artists)
+    # Zipf-like artist activity so some artists have many tracks
+    weights = 1.0 / np.arange(1, n_artists + 1) ** 0.8
+    weights /= weights.sum()
+    lead = rng.choice(n_artists, size=n_rows, p=weights)
+    artists = artist_pool[lead]
+    collab = rng.random(n_rows) < COLLAB_RATE
+    guests = artist_pool[rng.integers(0, n_artists, collab.sum())]
+    artists[collab] = [f'{a};{b}' for a, b in zip(artists[collab], guests)]
+
+    track_pool = _pool('Track', max(10, int(n_rows * 0.8)))
+    track_codes = rng.integers(0, len(track_pool), n_rows)
+
+    popularity = np.where(rng.random(n_rows) < 0.14, 0, rng.normal(38, 18, n_rows)).clip(0, 100).astype(np.int64)
+    duration_ms = rng.lognormal(np.log(215000), 0.35, n_rows).clip(8000, 5_300_000).astype(np.int64)
+
+    return pd.DataFrame({
+        'Unnamed: 0': np.arange(n_rows),
+        'track_id': np.array([f'{code:022x}' for code in range(len(track_pool))], dtype=object)[track_codes],
+        'artists': artists,
+        'album_name': _pool('Album', max(10, n_rows // 3))[rng.integers(0, max(10, n_rows // 3), n_rows)],
+        'track_name': track_pool[track_codes],
+        'popularity': popularity,
+        'duration_ms': duration_ms,
+        'explicit': rng.random(n_rows) < EXPLICIT_RATE,
+        'danceability': rng.beta(5, 3, n_rows).round(3),
+        'energy': rng.beta(2.5, 1.5, n_rows).round(3),
+        'key': rng.integers(0, 12, n_rows),
+        'loudness': rng.normal(-8.3, 5.0, n_rows).clip(-49.5, 4.5).round(3),
+        'mode': (rng.random(n_rows) < 0.64).astype(np.int64),
+        'speechiness': rng.beta(1.2, 12, n_rows).round(4),
+        'acousticness': rng.beta(0.6, 1.2, n_rows).round(4),
+        'instrumentalness': np.where(rng.random(n_rows) < 0.6, 0.0, rng.beta(0.5, 1.5, n_rows)).round(4),
+        'liveness': rng.beta(1.5, 6, n_rows).round(4),
+        'valence': rng.beta(2, 2, n_rows).round(3),
+        'tempo': rng.normal(122, 30, n_rows).clip(0, 243).round(3),
+        'time_signature': rng.choice([1, 3, 4, 5], size=n_rows, p=[0.01, 0.08, 0.89, 0.02]),
+        'track_genre': np.sort(genres[rng.integers(0, N_GENRES, n_rows)])
+    })
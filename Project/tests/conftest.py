@@ -0,0 +1,88 @@
+import os
+import sys
+import warnings
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import generate_dataset
+from visualizations.dataset import compact_frame, tracks_from_rows
+from visualizations.store import prepare
+from visualizations.tracks import TRACK_ID
+
+N_ROWS = 2_000
+
+# (genres, explicit filter) states the tests compare, as the sidebar passes them
+FILTER_STATES = [
+    (['All Genres'], 'All'),
+    (['All Genres'], 'Explicit Only'),
+    (['genre_005'], 'All'),
+    (['genre_001', 'genre_002', 'genre_003'], 'Non-Explicit Only'),
+    ([f'genre_{i:03d}' for i in range(4, 11)], 'Explicit Only')
+]
+
+
+@pytest.fixture(autouse=True)
+def _quiet_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        yield
+
+
+@pytest.fixture(scope='session')
+def rows():
+    """Synthetic rows with the columns of data/dataset.csv, without its index column
+
+    Like the CSV, they list a track once per genre, the loader keeps the values of its first row.
+    """
+    return compact_frame(generate_dataset(N_ROWS).drop(columns='Unnamed: 0'))
+
+
+@pytest.fixture(scope='session')
+def tracks(rows):
+    """Registered track table of `rows`, as the app loads it, keeping the TRACK_ID to match tracks to rows"""
+    return prepare(tracks_from_rows(rows))
+
+
+@pytest.fixture(scope='session')
+def unique_rows(rows):
+    """The reference dedupe: each track at its first row"""
+    return rows.drop_duplicates(TRACK_ID).reset_index(drop=True)
+
+
+@pytest.fixture(scope='session')
+def genre_rows(rows, unique_rows):
+    """One row per (track, genre) pair carrying the track's values, what per-genre charts count"""
+    pairs = rows[[TRACK_ID, 'track_genre']].drop_duplicates()
+    return pairs.merge(unique_rows.drop(columns='track_genre'), on=TRACK_ID)
+
+
+@pytest.fixture
+def csv_path(rows, tmp_path):
+    """The synthetic rows written like data/dataset.csv, with pandas' index column"""
+    path = str(tmp_path / 'dataset.csv')
+    rows.to_csv(path)
+    return path
+
+
+def reference_state(frame, genres, explicit_filter):
+    """Rows of `frame` in a filter state, selected with a plain boolean mask"""
+    mask = frame['explicit'].notna()
+    if 'All Genres' not in genres:
+        mask &= frame['track_genre'].isin(genres)
+    if explicit_filter == 'Explicit Only':
+        mask &= frame['explicit']
+    elif explicit_filter == 'Non-Explicit Only':
+        mask &= ~frame['explicit']
+    rows = frame[mask].copy()
+    rows.attrs = {}
+    return rows
+
+
+def track_state(tracks, genre_rows, genres, explicit_filter):
+    """Tracks of the registered table in a filter state, each once, selected through `genre_rows`"""
+    selected = reference_state(genre_rows, genres, explicit_filter)[TRACK_ID]
+    rows = tracks[tracks[TRACK_ID].isin(selected).to_numpy()].copy()
+    rows.attrs = {}
+    return rows
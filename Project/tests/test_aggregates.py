@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+from conftest import FILTER_STATES, reference_state
+from visualizations.aggregates import grouped_stats, top_tracks, genre_counts
+from visualizations.binning import BINNINGS, category_labels
+from visualizations.filtering import filter_frame
+from visualizations.store import get_derived, get_selection
+
+SPEC = {'popularity': ['mean', 'std', 'count'], 'duration_ms': ['mean'], 'energy': ['mean', 'std']}
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+@pytest.mark.parametrize('by', ['track_genre', ['track_genre', 'explicit']])
+def test_cube_genre_stats_match_groupby(tracks, genre_rows, genres, explicit_filter, by):
+    filtered = filter_frame(tracks, genres, explicit_filter)
+    assert get_derived(filtered, 'stats_cube').supports(by, SPEC)
+    # Per-genre stats count a track in every selected genre listing it
+    expected = reference_state(genre_rows, genres, explicit_filter).groupby(by).agg(SPEC)
+    pd.testing.assert_frame_equal(grouped_stats(filtered, by, SPEC), expected, check_dtype=False, rtol=1e-5)
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+@pytest.mark.parametrize('by', ['explicit', 'energy_category', 'danceability_range', 'valence_bins'])
+def test_track_stats_count_each_track_once(tracks, genres, explicit_filter, by):
+    filtered = filter_frame(tracks, genres, explicit_filter)
+    # Groupings not by genre count every track once, so the reference is the filtered track table itself
+    plain = filtered.copy()
+    plain.attrs = {}
+    if by in BINNINGS:
+        expected = plain.groupby(category_labels(plain, by), observed=BINNINGS[by]['observed']).agg(SPEC)
+    else:
+        expected = plain.groupby(by).agg(SPEC)
+    pd.testing.assert_frame_equal(grouped_stats(filtered, by, SPEC), expected, check_dtype=False, rtol=1e-5)
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_top_tracks_match_idxmax(tracks, genre_rows, genres, explicit_filter):
+    state = reference_state(genre_rows, genres, explicit_filter)
+    result = top_tracks(filter_frame(tracks, genres, explicit_filter))
+    expected = state.groupby('track_genre')['popularity'].max()
+    pd.testing.assert_series_equal(result['popularity'], expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_genre_counts_count_a_track_in_every_genre(tracks, genre_rows, genres, explicit_filter):
+    expected = reference_state(genre_rows, genres, explicit_filter)['track_genre'].value_counts()
+    result = genre_counts(filter_frame(tracks, genres, explicit_filter))
+    pd.testing.assert_series_equal(result.sort_index(), expected.sort_index(), check_dtype=False, check_index_type=False, check_names=False)
+
+
+def test_equal_length_copies_are_grouped_by_pandas(tracks):
+    # Reordered rows with the dataset's fingerprint but no filter state stamped on them
+    shuffled = tracks.sample(frac=1, random_state=0)
+    shuffled.attrs = {'fingerprint': tracks.attrs['fingerprint']}
+    assert get_selection(tracks) is not None and get_selection(shuffled) is None
+    expected = shuffled.groupby('explicit').agg({'popularity': ['mean', 'count']})
+    pd.testing.assert_frame_equal(grouped_stats(shuffled, 'explicit', {'popularity': ['mean', 'count']}), expected, check_dtype=False)
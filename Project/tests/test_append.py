@@ -0,0 +1,138 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import FILTER_STATES
+from visualizations import append, disk_cache
+from visualizations.aggregates import grouped_stats, genre_counts
+from visualizations.append import INDEX_COLUMN, append_rows, main as append_main
+from visualizations.artists import artist_stats
+from visualizations.box_stats import genre_box_summaries, length_box_summaries
+from visualizations.dataset import load_dataset, read_csv, snapshot_is_stale, snapshot_path, _snapshot_metadata
+from visualizations.filtering import filter_frame
+from visualizations.joint_histograms import joint_popularity
+from visualizations.store import prepare
+from visualizations.tracks import TRACK_ID
+
+N_BASE = 1_600
+SPEC = {'popularity': ['mean', 'std', 'count'], 'energy': ['mean']}
+
+
+@pytest.fixture(scope='module')
+def paths(rows, tmp_path_factory):
+    """(base, delta, full) CSVs: the first rows, the rest, and all of them in one file"""
+    directory = tmp_path_factory.mktemp('append')
+    paths = [str(directory / name) for name in ('base.csv', 'delta.csv', 'full.csv')]
+    rows.iloc[:N_BASE].to_csv(paths[0])
+    rows.iloc[N_BASE:].to_csv(paths[1])
+    rows.to_csv(paths[2])
+    return paths
+
+
+@pytest.fixture(scope='module')
+def datasets(paths):
+    """(appended, rebuilt) datasets of the same rows, the delta naming both new and already listed tracks"""
+    base_path, delta_path, full_path = paths
+    base = prepare(load_dataset(base_path))
+    appended = append_rows(base, read_csv(delta_path), base[TRACK_ID].to_numpy())
+    return appended, prepare(load_dataset(full_path))
+
+
+def by_track(frame):
+    """Tracks in TRACK_ID order, appended tracks follow the snapshot's while a rebuild sorts them in"""
+    frame = frame.sort_values(TRACK_ID).reset_index(drop=True)
+    frame.attrs = {}
+    return frame
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_appended_structures_match_rebuild(datasets, genres, explicit_filter):
+    appended, rebuilt = (filter_frame(data, genres, explicit_filter) for data in datasets)
+    pd.testing.assert_frame_equal(by_track(appended), by_track(rebuilt))
+    pd.testing.assert_series_equal(genre_counts(appended).sort_index(), genre_counts(rebuilt).sort_index())
+    for by in ['track_genre', 'explicit', 'length_category', 'energy_bins']:
+        pd.testing.assert_frame_equal(grouped_stats(appended, by, SPEC), grouped_stats(rebuilt, by, SPEC), rtol=1e-6)
+    pd.testing.assert_frame_equal(artist_stats(appended, 2, True), artist_stats(rebuilt, 2, True), rtol=1e-9)
+
+    names = list(genre_counts(rebuilt).index[:5])
+    for result, expected in [(genre_box_summaries(appended, names), genre_box_summaries(rebuilt, names)),
+                             (length_box_summaries(appended), length_box_summaries(rebuilt))]:
+        for key, summary in expected.items():
+            assert (result[key] is None) == (summary is None)
+            if summary is not None:
+                np.testing.assert_allclose([result[key][s] for s in ('q1', 'median', 'q3')],
+                                           [summary[s] for s in ('q1', 'median', 'q3')], atol=1e-6)
+
+    for expected, result in zip(joint_popularity(rebuilt, 'danceability', 'tempo', 4),
+                                joint_popularity(appended, 'danceability', 'tempo', 4)):
+        np.testing.assert_allclose(result, expected, rtol=1e-9)
+
+
+@pytest.fixture
+def dataset_path(paths, tmp_path, monkeypatch):
+    """A loaded copy of the base CSV as the app's dataset, with a cache of its own"""
+    path = str(tmp_path / 'dataset.csv')
+    with open(paths[0]) as source, open(path, 'w') as target:
+        target.write(source.read())
+    load_dataset(path)
+    monkeypatch.setenv('SPOTIFY_DATASET', path)
+    monkeypatch.setattr(disk_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    return path
+
+
+def test_append_command_grows_csv_and_snapshot(paths, dataset_path):
+    base_path, delta_path, full_path = paths
+    assert append_main([delta_path]) == 0
+    pd.testing.assert_frame_equal(read_csv(dataset_path), read_csv(full_path))
+    assert not snapshot_is_stale(dataset_path)
+    pd.testing.assert_frame_equal(by_track(load_dataset(dataset_path)), by_track(load_dataset(full_path)))
+    assert_same_metadata(dataset_path, full_path)
+
+
+def assert_same_metadata(path, rebuilt_path):
+    """The appended snapshot records the value ranges and next index a rebuild from the CSV finds"""
+    appended, rebuilt = (_snapshot_metadata(snapshot_path(p)) for p in (path, rebuilt_path))
+    assert json.loads(appended[b'value_ranges']) == json.loads(rebuilt[b'value_ranges'])
+    assert appended[b'next_index'] == rebuilt[b'next_index']
+    assert appended[b'genres'] == rebuilt[b'genres']
+
+
+def test_delta_of_new_tracks_keeps_the_stored_columns(rows, dataset_path, tmp_path):
+    base = rows.iloc[:N_BASE]
+    delta = rows.iloc[N_BASE:]
+    # New tracks of known genres, so the membership column is extended rather than rebuilt
+    delta = delta[~delta[TRACK_ID].isin(base[TRACK_ID]) & delta['track_genre'].isin(base['track_genre'])].drop_duplicates(TRACK_ID)
+    delta_path, full_path = str(tmp_path / 'delta.csv'), str(tmp_path / 'full.csv')
+    delta.to_csv(delta_path)
+    pd.concat([base, delta]).to_csv(full_path)
+    assert append_main([delta_path]) == 0
+    pd.testing.assert_frame_equal(read_csv(dataset_path), read_csv(full_path))
+    pd.testing.assert_frame_equal(by_track(load_dataset(dataset_path)), by_track(load_dataset(full_path)))
+    assert_same_metadata(dataset_path, full_path)
+
+
+def test_delta_without_index_continues_it(paths, dataset_path, tmp_path):
+    base_path, delta_path, full_path = paths
+    path = str(tmp_path / 'delta.csv')
+    read_csv(delta_path).drop(columns=INDEX_COLUMN).to_csv(path, index=False)
+    assert append_main([path]) == 0
+    pd.testing.assert_frame_equal(read_csv(dataset_path), read_csv(full_path))
+    assert not snapshot_is_stale(dataset_path)
+    pd.testing.assert_frame_equal(by_track(load_dataset(dataset_path)), by_track(load_dataset(full_path)))
+    assert_same_metadata(dataset_path, full_path)
+
+
+def test_failed_append_leaves_the_dataset_unchanged(paths, dataset_path, monkeypatch):
+    def broken(*args, **kwargs):
+        raise KeyError('track_genre')
+
+    with open(dataset_path, 'rb') as f:
+        before = f.read()
+    monkeypatch.setattr(append, 'appended_snapshot', broken)
+    with pytest.raises(KeyError):
+        append_main([paths[1]])
+    with open(dataset_path, 'rb') as f:
+        assert f.read() == before
+    assert not snapshot_is_stale(dataset_path)
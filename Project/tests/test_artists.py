@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import FILTER_STATES, track_state
+from visualizations.artists import ARTIST_SEPARATOR, artist_stats
+from visualizations.consistent_artists import create_consistent_artists
+from visualizations.filtering import filter_frame
+from visualizations.store import get_derived
+
+
+def reference_stats(rows, min_tracks, include_collabs):
+    """artist_stats with pandas: solo rows grouped by artist, or every credit of a split `artists` string"""
+    if include_collabs:
+        rows = rows.assign(artists=rows['artists'].str.split(ARTIST_SEPARATOR)).explode('artists')
+    else:
+        rows = rows[~rows['artists'].str.contains(ARTIST_SEPARATOR, regex=False)]
+    stats = rows.groupby('artists')['popularity'].agg(['mean', 'std', 'count'])
+    stats.columns = ['avg_popularity', 'popularity_std', 'track_count']
+    return stats[stats['track_count'] >= min_tracks]
+
+
+@pytest.mark.parametrize('include_collabs', [False, True])
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_artist_stats_match_groupby(tracks, genre_rows, genres, explicit_filter, include_collabs):
+    state = track_state(tracks, genre_rows, genres, explicit_filter)
+    result = artist_stats(filter_frame(tracks, genres, explicit_filter), 2, include_collabs)
+    expected = reference_stats(state, 2, include_collabs)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_index_type=False, rtol=1e-9)
+
+
+def test_unregistered_rows_match_groupby(tracks):
+    rows = tracks.head(500).copy()
+    rows.attrs = {}
+    pd.testing.assert_frame_equal(artist_stats(rows, 1, True), reference_stats(rows, 1, True),
+                                  check_dtype=False, check_index_type=False, rtol=1e-9)
+
+
+def test_tracks_of_lists_every_credit(tracks):
+    index = get_derived(tracks, 'artist_index')
+    credits = tracks['artists'].str.split(ARTIST_SEPARATOR)
+    for name in ['Artist 0', 'Artist 7', 'Artist 123']:
+        expected = [i for i, names in enumerate(credits) if name in names]
+        # The synthetic credits now and then name the same artist twice
+        assert list(np.unique(index.tracks_of(name))) == expected
+    assert len(index.tracks_of('Nobody')) == 0
+
+
+def test_chart_credits_every_artist_of_a_collaboration(tracks):
+    data = filter_frame(tracks, ['All Genres'], 'All')
+    expected = artist_stats(data, 2, True).round(2).nlargest(10, 'avg_popularity')
+    fig = create_consistent_artists(data, min_tracks=2)
+    assert list(fig.data[0].y) == list(expected.index)
+    # Charted artists gain the tracks they share with others
+    solo_counts = artist_stats(data, 1, False)['track_count'].reindex(expected.index, fill_value=0)
+    assert (expected['track_count'] > solo_counts).any()
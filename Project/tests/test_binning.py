@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import FILTER_STATES
+from visualizations.aggregates import grouped_stats
+from visualizations.binning import BINNINGS, category_labels, code_column
+from visualizations.filtering import filter_frame
+
+
+def reference_labels(values, binning):
+    """The pd.cut the charts used before bin codes"""
+    spec = BINNINGS[binning]
+    # The float32 columns stand for the CSV's decimals, which codes compare at float32 precision
+    values = values.astype(np.float64).round(6)
+    if spec['kind'] == 'equal':
+        return pd.cut(values, bins=len(spec['labels']), labels=spec['labels'])
+    if spec['kind'] == 'threshold':
+        return pd.cut(values, [-np.inf, *spec['edges'], np.inf], labels=spec['labels'], right=False)
+    return pd.cut(values, spec['edges'], labels=spec['labels'])
+
+
+@pytest.mark.parametrize('binning', list(BINNINGS))
+def test_codes_match_pd_cut(tracks, binning):
+    labels = category_labels(tracks, binning)
+    expected = reference_labels(tracks[BINNINGS[binning]['column']], binning)
+    pd.testing.assert_series_equal(labels.astype(object), expected.astype(object), check_names=False)
+
+
+def test_codes_are_stored_as_int8(tracks):
+    for binning in BINNINGS:
+        assert tracks[code_column(binning)].dtype == np.int8
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_filtered_rows_keep_full_dataset_bins(tracks, genres, explicit_filter):
+    # 'equal' bins come from the range of the whole dataset, not of the filtered rows
+    filtered = filter_frame(tracks, genres, explicit_filter)
+    labels = reference_labels(tracks['energy'], 'energy_bins').loc[filtered.index]
+    pd.testing.assert_series_equal(category_labels(filtered, 'energy_bins').astype(object), labels.astype(object), check_names=False)
+    spec = {'popularity': ['mean', 'count']}
+    expected = filtered.groupby(labels, observed=True).agg(spec)
+    pd.testing.assert_frame_equal(grouped_stats(filtered, 'energy_bins', spec), expected, check_dtype=False, check_names=False)
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_uncoded_rows_of_a_registered_dataset_keep_its_bins(tracks, genres, explicit_filter):
+    filtered = filter_frame(tracks, genres, explicit_filter)
+    # Reordered and without code columns, so pandas groups them, still cut from the registered dataset
+    rows = filtered.drop(columns=[code_column(name) for name in BINNINGS]).sample(frac=1, random_state=0)
+    rows.attrs = {'fingerprint': tracks.attrs['fingerprint']}
+    spec = {'popularity': ['mean', 'count']}
+    for binning in ['energy_bins', 'valence_bins', 'length_category']:
+        pd.testing.assert_frame_equal(grouped_stats(rows, binning, spec), grouped_stats(filtered, binning, spec), rtol=1e-9)
+
+
+def test_unregistered_rows_use_their_own_range(tracks):
+    rows = tracks.head(300).drop(columns=code_column('energy_bins'))
+    rows.attrs = {}
+    expected = reference_labels(rows['energy'], 'energy_bins')
+    pd.testing.assert_series_equal(category_labels(rows, 'energy_bins').astype(object), expected.astype(object), check_names=False)
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import FILTER_STATES, reference_state
+from visualizations.binning import BINNINGS
+from visualizations.box_stats import box_summary, box_summary_from_counts, genre_box_summaries, length_box_summaries
+from visualizations.filtering import filter_frame
+from visualizations.store import get_derived
+
+QUARTILES = ('q1', 'median', 'q3')
+
+
+def assert_quartiles(summary, values):
+    expected = np.percentile(np.asarray(values, dtype=np.float64), [25, 50, 75])
+    np.testing.assert_allclose([summary[key] for key in QUARTILES], expected, atol=1e-6)
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 1000])
+def test_box_summary_matches_percentile(size):
+    values = np.random.default_rng(size).normal(0.5, 0.2, size)
+    assert_quartiles(box_summary(values), values)
+
+
+def test_box_summary_whiskers_are_tukey_fences():
+    values = np.concatenate([np.linspace(0.4, 0.6, 50), [0.0, 1.0]])
+    summary = box_summary(values)
+    assert summary['lowerfence'] == 0.4 and summary['upperfence'] == 0.6
+    np.testing.assert_array_equal(summary['outliers'], [0.0, 1.0])
+
+
+def test_box_summary_from_counts_matches_percentile():
+    values = np.random.default_rng(0).integers(0, 101, 5000)
+    summary = box_summary_from_counts(np.bincount(values, minlength=101))
+    assert_quartiles(summary, values)
+    assert summary['count'] == len(values) and np.isclose(summary['mean'], values.mean())
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_genre_energy_boxes_match_percentile(tracks, genre_rows, genres, explicit_filter):
+    # Energies are written with 3 decimals, so the boxes come from the sketch's exact counts
+    assert get_derived(tracks, 'quantile_sketches').is_exact('energy')
+    state = reference_state(genre_rows, genres, explicit_filter)
+    names = sorted(state['track_genre'].unique())[:10]
+    summaries = genre_box_summaries(filter_frame(tracks, genres, explicit_filter), names)
+    for genre in names:
+        assert_quartiles(summaries[genre], state.loc[state['track_genre'] == genre, 'energy'])
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_length_boxes_match_percentile(tracks, genres, explicit_filter):
+    spec = BINNINGS['length_category']
+    filtered = filter_frame(tracks, genres, explicit_filter)
+    # Length boxes count every selected track once
+    state = filtered.copy()
+    state.attrs = {}
+    categories = pd.cut(state['duration_ms'], spec['edges'], labels=spec['labels'])
+    summaries = length_box_summaries(filtered)
+    for label in spec['labels']:
+        values = state.loc[categories == label, 'popularity']
+        if len(values):
+            assert_quartiles(summaries[label], values)
+        else:
+            assert summaries[label] is None
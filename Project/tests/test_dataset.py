@@ -0,0 +1,95 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from visualizations import dataset, dataset_columns
+from visualizations.binning import BINNINGS, code_column
+from visualizations.dataset import load_dataset, read_csv, snapshot_path, snapshot_is_stale
+from visualizations.store import get_derived
+from visualizations.tracks import TRACK_ID, split_tracks
+
+
+def assert_matches_csv(df, csv_path):
+    """`df` holds the track table of the CSV and is registered with its genre membership"""
+    tracks, membership = split_tracks(read_csv(csv_path))
+    # Arrow hands strings back as pandas' string dtype
+    pd.testing.assert_frame_equal(df[tracks.columns], tracks, check_dtype=False)
+    loaded = get_derived(df, 'genre_membership')
+    np.testing.assert_array_equal(loaded.genres, membership.genres)
+    np.testing.assert_array_equal(loaded.tracks, membership.tracks)
+    np.testing.assert_array_equal(loaded.genre_codes, membership.genre_codes)
+
+
+def test_snapshot_matches_csv(csv_path):
+    df = load_dataset(csv_path)
+    assert os.path.exists(snapshot_path(csv_path))
+    assert not snapshot_is_stale(csv_path)
+    assert_matches_csv(df, csv_path)
+
+
+def test_fresh_snapshot_is_reused(csv_path):
+    load_dataset(csv_path)
+    built = os.stat(snapshot_path(csv_path)).st_mtime_ns
+    load_dataset(csv_path)
+    assert os.stat(snapshot_path(csv_path)).st_mtime_ns == built
+
+
+def test_changed_csv_rebuilds_snapshot(csv_path, rows):
+    load_dataset(csv_path)
+    rows.head(10).to_csv(csv_path)
+    assert snapshot_is_stale(csv_path)
+    df = load_dataset(csv_path)
+    assert len(df) == rows.head(10)[TRACK_ID].nunique()
+    assert not snapshot_is_stale(csv_path)
+
+
+def test_unreadable_snapshot_falls_back_to_csv(csv_path, caplog):
+    with open(snapshot_path(csv_path), 'wb') as f:
+        f.write(b'not an arrow file')
+    with caplog.at_level(logging.WARNING, logger=dataset.__name__):
+        assert_matches_csv(load_dataset(csv_path), csv_path)
+    assert 'reading the CSV' in caplog.text
+
+
+def test_snapshot_of_another_layout_falls_back_to_csv(csv_path):
+    import pyarrow as pa
+
+    load_dataset(csv_path)
+    # Current source metadata, so the snapshot is not rebuilt, but without the fingerprint
+    table = pa.ipc.open_file(pa.memory_map(snapshot_path(csv_path))).read_all()
+    metadata = {key: value for key, value in table.schema.metadata.items() if key != b'source_fingerprint'}
+    table = table.replace_schema_metadata(metadata)
+    # Replaced rather than rewritten, the first load still maps the old file
+    with pa.OSFile(snapshot_path(csv_path) + '.tmp', 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(snapshot_path(csv_path) + '.tmp', snapshot_path(csv_path))
+    assert not snapshot_is_stale(csv_path)
+    assert_matches_csv(load_dataset(csv_path), csv_path)
+
+
+def test_unexpected_errors_are_not_hidden(csv_path, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError('bug')
+
+    monkeypatch.setattr(dataset, 'read_snapshot', broken)
+    with pytest.raises(RuntimeError):
+        load_dataset(csv_path)
+
+
+def test_projected_load_keeps_manifest_columns_and_codes(csv_path):
+    columns = dataset_columns(['create_energy_by_genre'])
+    loaded = load_dataset(csv_path, columns)
+    # Genres live in the membership, not on the track table
+    assert set(loaded.columns) == set(columns) - {'track_genre'} | {code_column(name) for name in BINNINGS}
+    assert loaded['energy'].dtype == np.float32
+
+
+def test_older_snapshot_version_is_rebuilt(csv_path, monkeypatch):
+    load_dataset(csv_path)
+    monkeypatch.setattr(dataset, 'SNAPSHOT_VERSION', 'next')
+    assert snapshot_is_stale(csv_path)
+    load_dataset(csv_path)
+    assert not snapshot_is_stale(csv_path)
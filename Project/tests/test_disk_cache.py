@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from visualizations import disk_cache, dataset_columns
+from visualizations.build_cache import main as build_cache
+from visualizations.dataset import load_dataset, tracks_from_rows
+from visualizations.energy_by_genre import create_energy_by_genre
+from visualizations.figure_cache import cached_figure, figure_cache, figure_key
+from visualizations.filtering import filter_frame
+from visualizations.store import prepare, derived_structures, release
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
+
+
+@pytest.fixture(scope='module')
+def frame(rows):
+    return prepare(tracks_from_rows(rows.head(400), fingerprint='disk-cache-test'))
+
+
+def saved(frame):
+    disk_cache.reset(frame)
+    disk_cache.save_derived(frame, derived_structures(frame))
+    disk_cache.write_manifest(frame)
+
+
+def test_derived_structures_round_trip(frame):
+    saved(frame)
+    copy = frame.copy()
+    loaded = disk_cache.load_derived(copy)
+    assert loaded.keys() == derived_structures(frame).keys()
+    # The pickled structures point at the frame they are loaded for, not a stored copy of it
+    assert loaded['filter_engine'].frame is copy
+
+
+def test_other_code_or_columns_invalidate(frame, monkeypatch):
+    saved(frame)
+    assert disk_cache.load_derived(frame.drop(columns='tempo')) == {}
+    monkeypatch.setattr(disk_cache, 'code_version', lambda: 'other')
+    assert disk_cache.load_derived(frame) == {}
+
+
+def test_figures_are_keyed_by_state_and_options(frame):
+    saved(frame)
+    data = filter_frame(frame, ['All Genres'], 'Explicit Only')
+    key = figure_key(create_energy_by_genre, data)
+    disk_cache.save_figure(key, create_energy_by_genre(data))
+    assert disk_cache.load_figure(key).to_dict() == json.loads(create_energy_by_genre(data).to_json())
+    assert disk_cache.load_figure(figure_key(create_energy_by_genre, filter_frame(frame, ['All Genres'], 'All'))) is None
+    assert disk_cache.load_figure(key[:4] + ((('data', None),),)) is None
+
+
+def test_figures_of_an_older_cache_are_ignored(frame, monkeypatch):
+    saved(frame)
+    data = filter_frame(frame, ['All Genres'], 'All')
+    key = figure_key(create_energy_by_genre, data)
+    disk_cache.save_figure(key, create_energy_by_genre(data))
+    monkeypatch.setattr(disk_cache, 'code_version', lambda: 'other')
+    assert disk_cache.load_figure(key) is None
+
+
+def test_build_cache_serves_figures(rows, tmp_path, monkeypatch):
+    path = str(tmp_path / 'dataset.csv')
+    rows.head(300).to_csv(path)
+    monkeypatch.setenv('SPOTIFY_DATASET', path)
+    assert build_cache(['--charts', 'create_energy_by_genre']) == 0
+
+    # Loaded as the app loads it, so the cache written for that frame is valid for this one,
+    # after dropping the command's registration of the same file so this frame gets the filter engine
+    df = load_dataset(path, dataset_columns())
+    release(df.attrs['fingerprint'])
+    df = prepare(load_dataset(path, dataset_columns()))
+    assert disk_cache.is_valid(df.attrs['fingerprint'], df)
+    data = filter_frame(df, ['All Genres'], 'All')
+    stored = disk_cache.load_figure(figure_key(create_energy_by_genre, data))
+    assert stored is not None
+    figure_cache.clear()
+    assert cached_figure(create_energy_by_genre, data).to_dict() == stored.to_dict()
+    # Other states are answered from the derived structures, their figures are not stored
+    assert disk_cache.load_figure(figure_key(create_energy_by_genre, filter_frame(df, ['All Genres'], 'Explicit Only'))) is None
@@ -0,0 +1,67 @@
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from visualizations.figure_cache import FigureCache, cached_figure, figure_cache
+from visualizations.filtering import filter_frame
+from visualizations.frozen_figure import FrozenFigure
+from visualizations.store import prepare
+
+
+def test_least_recently_used_entries_leave_first():
+    cache = FigureCache(max_bytes=300)
+    for key in 'abc':
+        cache.put(key, key, size=100)
+    cache.get('a')
+    cache.put('d', 'd', size=100)
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == ['a', 'c', 'd']
+    assert cache.stats()['bytes'] == 300
+
+
+def test_byte_budget_counts_replaced_and_oversized_entries():
+    cache = FigureCache(max_bytes=300)
+    cache.put('a', 'a', size=200)
+    cache.put('a', 'a2', size=50)
+    assert cache.stats()['bytes'] == 50
+    # An entry larger than the whole budget is returned but not kept
+    assert cache.put('big', 'big', size=301) == 'big'
+    assert cache.get('big') is None and cache.stats()['bytes'] == 50
+
+
+def test_entries_are_sized_by_their_json():
+    cache = FigureCache(max_bytes=10_000_000)
+    fig = go.Figure(go.Bar(x=[1, 2], y=[3, 4]))
+    cache.put('fig', fig)
+    assert cache.stats()['bytes'] == len(fig.to_json())
+
+
+def test_cached_figure_keys_on_filter_state(rows):
+    df = prepare(rows.copy())
+    builds = []
+
+    def chart(data):
+        builds.append(len(data))
+        return go.Figure(go.Bar(y=[len(data)]))
+
+    figure_cache.clear()
+    first = cached_figure(chart, filter_frame(df, ['genre_001'], 'All'))
+    assert cached_figure(chart, filter_frame(df, ['genre_001'], 'All')) is first
+    cached_figure(chart, filter_frame(df, ['genre_001'], 'Explicit Only'))
+    # Frames without a known filter state are never cached
+    unstamped = df.head(10).copy()
+    unstamped.attrs = {}
+    cached_figure(chart, unstamped)
+    cached_figure(chart, unstamped)
+    assert len(builds) == 4
+
+
+def test_cached_figures_are_frozen(rows):
+    df = prepare(rows.copy())
+    data = filter_frame(df, ['genre_002'], 'All')
+    built = go.Figure(go.Bar(y=[len(data)]))
+    figure_cache.clear()
+    fig = cached_figure(lambda data: built, data)
+    assert isinstance(fig, FrozenFigure)
+    # Streamlit's dict and JSON come from the stored text, not a fresh serialization
+    assert fig.to_json() == pio.to_json(built, validate=False)
+    assert fig.to_dict() is fig.to_dict()
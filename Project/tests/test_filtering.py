@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import FILTER_STATES, reference_state
+from visualizations.filtering import filter_frame
+from visualizations.store import get_selection
+from visualizations.tracks import TRACK_ID
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_filter_frame_matches_mask(tracks, genre_rows, genres, explicit_filter):
+    # A track is selected once, however many of the selected genres list it
+    selected = reference_state(genre_rows, genres, explicit_filter)[TRACK_ID].unique()
+    expected = tracks[tracks[TRACK_ID].isin(selected)]
+
+    filtered = filter_frame(tracks, genres, explicit_filter)
+    pd.testing.assert_frame_equal(filtered.sort_index(), expected)
+    assert get_selection(filtered) is not None
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_unregistered_filter_frame_matches_mask(rows, genres, explicit_filter):
+    pd.testing.assert_frame_equal(filter_frame(rows, genres, explicit_filter), reference_state(rows, genres, explicit_filter))
+
+
+def test_filter_states_are_shared(tracks):
+    assert filter_frame(tracks, ['genre_005'], 'All') is filter_frame(tracks, ['genre_005'], 'All')
+    assert filter_frame(tracks, ['genre_002', 'genre_001'], 'All') is filter_frame(tracks, ['genre_001', 'genre_002'], 'All')
+
+
+def test_explicit_states_are_a_view(tracks):
+    # Tracks are stored by explicit flag, so an "All Genres" state is one block served without a copy
+    filtered = filter_frame(tracks, ['All Genres'], 'Explicit Only')
+    assert np.shares_memory(filtered['popularity'].to_numpy(), tracks['popularity'].to_numpy())
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import FILTER_STATES, track_state
+from visualizations.feature_explorer import create_feature_explorer
+from visualizations.figure_cache import cached_figure, figure_cache
+from visualizations.filtering import filter_frame
+from visualizations.joint_histograms import joint_popularity
+
+
+def reference_joint(rows, full, row_feature, column_feature, resolution):
+    """Count and mean popularity per pair of pd.cut bins, the bins spanning the range of `full`"""
+    row_bins = pd.cut(full[row_feature], bins=resolution, labels=False).loc[rows.index]
+    column_bins = pd.cut(full[column_feature], bins=resolution, labels=False).loc[rows.index]
+    grouped = rows['popularity'].groupby([row_bins, column_bins]).agg(['count', 'mean'])
+    count = np.zeros((resolution, resolution), dtype=np.int64)
+    mean = np.full((resolution, resolution), np.nan)
+    for (i, j), (n, average) in grouped.iterrows():
+        count[int(i), int(j)], mean[int(i), int(j)] = n, average
+    return count, mean
+
+
+@pytest.mark.parametrize('features, resolution', [(('danceability', 'energy'), 4), (('tempo', 'valence'), 8),
+                                                  (('loudness', 'acousticness'), 12)])
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_joint_popularity_matches_groupby(tracks, genre_rows, genres, explicit_filter, features, resolution):
+    count, mean, row_edges, column_edges = joint_popularity(filter_frame(tracks, genres, explicit_filter), *features, resolution)
+    expected_count, expected_mean = reference_joint(track_state(tracks, genre_rows, genres, explicit_filter), tracks, *features, resolution)
+    np.testing.assert_array_equal(count, expected_count)
+    np.testing.assert_allclose(mean, expected_mean, rtol=1e-9)
+    assert len(row_edges) == len(column_edges) == resolution + 1
+
+
+def test_swapped_features_transpose(tracks):
+    data = filter_frame(tracks, ['genre_005'], 'All')
+    count, mean, _, _ = joint_popularity(data, 'energy', 'danceability', 6)
+    swapped_count, swapped_mean, _, _ = joint_popularity(data, 'danceability', 'energy', 6)
+    np.testing.assert_array_equal(count, swapped_count.T)
+    np.testing.assert_array_equal(mean, swapped_mean.T)
+
+
+def test_unregistered_rows_use_their_own_range(tracks):
+    rows = tracks.head(300).copy()
+    rows.attrs = {}
+    count, mean, _, _ = joint_popularity(rows, 'danceability', 'energy', 4)
+    expected_count, expected_mean = reference_joint(rows, rows, 'danceability', 'energy', 4)
+    np.testing.assert_array_equal(count, expected_count)
+    np.testing.assert_allclose(mean, expected_mean, rtol=1e-9)
+
+
+def test_feature_explorer_caches_each_feature_pair(tracks):
+    figure_cache.clear()
+    data = filter_frame(tracks, ['All Genres'], 'All')
+    fig = cached_figure(create_feature_explorer, data, x_feature='tempo', y_feature='energy', resolution=6)
+    assert cached_figure(create_feature_explorer, data, x_feature='tempo', y_feature='energy', resolution=6) is fig
+    assert cached_figure(create_feature_explorer, data, x_feature='valence', y_feature='energy', resolution=6) is not fig
+
+    _, mean, _, _ = joint_popularity(data, 'energy', 'tempo', 6)
+    built = create_feature_explorer(data, x_feature='tempo', y_feature='energy', resolution=6)
+    np.testing.assert_allclose(np.asarray(built.data[0].z, dtype=np.float64), np.round(mean, 2))
+    assert len(create_feature_explorer(data, x_feature='energy', y_feature='energy').data) == 0
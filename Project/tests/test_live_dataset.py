@@ -0,0 +1,52 @@
+import os
+
+from visualizations.live_dataset import LiveDataset
+from visualizations.store import get_derived
+from visualizations.tracks import TRACK_ID
+
+
+def rewrite(path, rows, n_rows):
+    rows.head(n_rows).to_csv(path)
+    # A later mtime even when the filesystem's clock is coarse
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def settle(live):
+    """Two checks, as the watcher does, so a change that stopped is reloaded"""
+    return live.check(live.check())
+
+
+def test_changed_csv_is_swapped_in_after_it_settles(csv_path, rows):
+    # Row counts no other test loads, so these versions are registered by this test alone
+    rewrite(csv_path, rows, 1_100)
+    live = LiveDataset(csv_path=csv_path, interval=0)
+    first = live.current()
+    assert live.check() is None
+
+    rewrite(csv_path, rows, 900)
+    assert live.check() is not None and live.current() is first
+    settle(live)
+    second = live.current()
+    assert len(second) == rows.head(900)[TRACK_ID].nunique() and second.attrs['fingerprint'] != first.attrs['fingerprint']
+    # Reruns still holding the previous frame keep its derived structures
+    assert get_derived(first, 'filter_engine') is not None
+
+    rewrite(csv_path, rows, 700)
+    settle(live)
+    assert len(live.current()) == rows.head(700)[TRACK_ID].nunique()
+    assert get_derived(first, 'filter_engine') is None
+    assert get_derived(second, 'filter_engine') is not None
+
+
+def test_touched_csv_keeps_the_frame(csv_path):
+    live = LiveDataset(csv_path=csv_path, interval=0)
+    frame = live.current()
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    settle(live)
+    assert live.current() is frame
+
+
+def test_disabled_reloading_starts_no_watcher(csv_path):
+    assert LiveDataset(csv_path=csv_path, interval=0).watch() is None
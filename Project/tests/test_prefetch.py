@@ -0,0 +1,77 @@
+import threading
+
+import plotly.graph_objects as go
+import pytest
+
+from visualizations.figure_cache import figure_cache, figure_key
+from visualizations.filtering import filter_frame
+from visualizations.prefetch import Prefetcher
+
+
+class Chart:
+    """A chart function that counts its builds and can be held until released"""
+
+    def __init__(self, name, gate=None):
+        self.__module__, self.__qualname__ = __name__, name
+        self.gate = gate
+        self.builds = []
+
+    def __call__(self, data):
+        if self.gate is not None:
+            assert self.gate.wait(10)
+        self.builds.append(len(data))
+        return go.Figure(go.Bar(y=[len(data)]))
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    figure_cache.clear()
+
+
+def test_prefetched_chart_is_built_once(tracks):
+    prefetcher = Prefetcher(2)
+    gate = threading.Event()
+    chart = Chart('held', gate)
+    data = filter_frame(tracks, ['genre_001'], 'All')
+    prefetcher.prefetch('session', data, [chart])
+    # Asking while the prefetch is still running waits for it instead of building again
+    waiter = threading.Thread(target=lambda: prefetcher.figure(chart, data))
+    waiter.start()
+    gate.set()
+    waiter.join(10)
+    fig = prefetcher.figure(chart, data)
+    assert chart.builds == [len(data)]
+    assert figure_cache.get(figure_key(chart, data)) is fig
+
+
+def test_changing_state_cancels_queued_charts(tracks):
+    prefetcher = Prefetcher(1)
+    gate = threading.Event()
+    running, queued = Chart('running', gate), Chart('queued')
+    prefetcher.prefetch('session', filter_frame(tracks, ['genre_001'], 'All'), [running, queued])
+    prefetcher.prefetch('session', filter_frame(tracks, ['genre_002'], 'All'), [])
+    gate.set()
+    prefetcher.figure(running, filter_frame(tracks, ['genre_001'], 'All'))
+    prefetcher._pool.shutdown(wait=True)
+    assert len(running.builds) == 1 and queued.builds == []
+
+
+def test_unknown_states_and_disabled_prefetcher_build_nothing(tracks):
+    chart = Chart('unused')
+    unstamped = tracks.head(10).copy()
+    unstamped.attrs = {}
+    Prefetcher(1).prefetch('session', unstamped, [chart])
+    Prefetcher(0).prefetch('session', filter_frame(tracks, ['genre_001'], 'All'), [chart])
+    assert chart.builds == []
+
+
+def test_cached_charts_are_not_prefetched(tracks):
+    prefetcher = Prefetcher(1)
+    chart = Chart('cached')
+    data = filter_frame(tracks, ['genre_001'], 'All')
+    prefetcher.figure(chart, data)
+    hits = figure_cache.stats()['hits']
+    prefetcher.prefetch('session', data, [chart])
+    prefetcher._pool.shutdown(wait=True)
+    # Neither rebuilt nor counted as a cache hit
+    assert chart.builds == [len(data)] and figure_cache.stats()['hits'] == hits
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from conftest import FILTER_STATES, track_state
+from visualizations import quantiles
+from visualizations.filtering import filter_frame
+from visualizations.quantiles import SKETCH_COLUMNS, feature_quantiles, grid_decimals
+from visualizations.store import get_derived
+
+QS = [0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0]
+
+
+def test_grid_decimals():
+    assert grid_decimals(np.array([1, 5, 9])) == 0
+    assert grid_decimals(np.array([0.5, 0.25, 0.125], dtype=np.float32)) == 3
+    assert grid_decimals(np.array([np.pi, np.e])) is None
+
+
+@pytest.mark.parametrize('column', SKETCH_COLUMNS)
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_sketch_quantiles_match_sorted_tracks(tracks, genre_rows, genres, explicit_filter, column, monkeypatch):
+    # Every selection is read from the sketches
+    monkeypatch.setattr(quantiles, 'EXACT_QUANTILE_ROWS', 0)
+    sketches = get_derived(tracks, 'quantile_sketches')
+    values = track_state(tracks, genre_rows, genres, explicit_filter)[column].to_numpy(dtype=np.float64)
+    result = feature_quantiles(filter_frame(tracks, genres, explicit_filter), column, QS)
+    np.testing.assert_allclose(result, np.quantile(values, QS), atol=sketches.error(column) + 1e-6)
+
+
+def test_small_selections_sort_their_tracks(tracks, genre_rows):
+    data = filter_frame(tracks, ['genre_005'], 'All')
+    values = track_state(tracks, genre_rows, ['genre_005'], 'All')['tempo'].to_numpy(dtype=np.float64)
+    np.testing.assert_allclose(feature_quantiles(data, 'tempo', QS), np.quantile(values, QS), rtol=1e-6)
+
+
+def test_columns_written_with_few_decimals_are_exact(tracks):
+    sketches = get_derived(tracks, 'quantile_sketches')
+    assert set(sketches.grids) == set(SKETCH_COLUMNS)
+    assert sketches.is_exact('energy') and sketches.error('energy') == 0
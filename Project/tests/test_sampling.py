@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from conftest import FILTER_STATES, reference_state
+from visualizations.filtering import filter_frame
+from visualizations.sampling import stable_sample
+from visualizations.store import get_derived
+from visualizations.tracks import TRACK_ID
+
+
+def priority_sample(tracks, genre_rows, genres, explicit_filter, k):
+    """The k tracks of a filter state that come first in the sampler's global order"""
+    order = get_derived(tracks, 'stable_sampler').order
+    keep = set(reference_state(genre_rows, genres, explicit_filter)[TRACK_ID])
+    ranked = tracks.iloc[order]
+    return ranked.index[ranked[TRACK_ID].isin(keep).to_numpy()][:k]
+
+
+# k=5 takes the walk over the global order, the larger sizes the per-cell prefixes
+@pytest.mark.parametrize('k', [5, 200, 5_000])
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_sample_is_top_priority_rows_of_state(tracks, genre_rows, genres, explicit_filter, k):
+    sample = stable_sample(filter_frame(tracks, genres, explicit_filter), k)
+    assert list(sample.index) == list(priority_sample(tracks, genre_rows, genres, explicit_filter, k))
+
+
+def test_narrower_state_keeps_its_rows_from_wider_sample(tracks):
+    wide = stable_sample(filter_frame(tracks, ['All Genres'], 'All'), 500)
+    narrow = stable_sample(filter_frame(tracks, ['All Genres'], 'Explicit Only'), 500)
+    # Every explicit row shown before the filter change is still shown after it
+    assert set(wide.index[wide['explicit'].to_numpy()]) <= set(narrow.index)
+
+
+def test_unstamped_frame_falls_back_to_seeded_sample(tracks):
+    data = tracks.head(300).copy()
+    data.attrs = {}
+    np.testing.assert_array_equal(stable_sample(data, 50).index, stable_sample(data, 50).index)
+    assert len(stable_sample(data, 1_000)) == 300
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import FILTER_STATES, track_state
+from visualizations.filtering import FilterEngine, filter_frame
+from visualizations.sampling import StableSampler, stable_sample
+from visualizations.store import canonical_filters, get_derived
+from visualizations.tracks import TRACK_ID
+from visualizations.sql_backend import check_parity, sql_database_for
+
+
+def test_pandas_backend_answers_without_sql(tracks):
+    assert sql_database_for(tracks) == (None, None)
+
+
+def test_duckdb_matches_pandas(tracks):
+    pytest.importorskip('duckdb')
+    from visualizations.sql_backend import SQLDatabase
+
+    states = [canonical_filters(genres, explicit_filter) for genres, explicit_filter in FILTER_STATES]
+    states.append(((), None))
+    assert check_parity(tracks, SQLDatabase(tracks), states) == []
+
+
+@pytest.fixture
+def duckdb_backend(tracks, monkeypatch):
+    """The duckdb backend switched on for the registered tracks"""
+    pytest.importorskip('duckdb')
+    from visualizations import sql_backend, store
+
+    monkeypatch.setattr(sql_backend, 'QUERY_BACKEND', 'duckdb')
+    monkeypatch.setitem(store._builders, 'sql_database', sql_backend.SQLDatabase)
+    return sql_backend.sql_database(tracks)
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_duckdb_selects_the_filter_engine_rows(tracks, duckdb_backend, genres, explicit_filter):
+    key = canonical_filters(genres, explicit_filter)
+    expected = np.arange(len(tracks))[get_derived(tracks, 'filter_engine').positions(*key)]
+    np.testing.assert_array_equal(duckdb_backend.positions(*key), expected)
+    sampler = get_derived(tracks, 'stable_sampler')
+    for k in (1, 50, len(tracks)):
+        np.testing.assert_array_equal(duckdb_backend.sample_positions(*key, k), sampler.rows(*key, k))
+
+
+@pytest.mark.parametrize('genres, explicit_filter', FILTER_STATES)
+def test_duckdb_backend_samples_in_sql(tracks, genre_rows, duckdb_backend, monkeypatch, genres, explicit_filter):
+    expected = stable_sample(filter_frame(tracks, genres, explicit_filter), 100)
+    assert set(expected[TRACK_ID]) <= set(track_state(tracks, genre_rows, genres, explicit_filter)[TRACK_ID])
+
+    def unused(*args):
+        raise AssertionError('sampled with pandas')
+
+    monkeypatch.setattr(StableSampler, 'rows', unused)
+    monkeypatch.setattr(FilterEngine, 'positions', unused)
+    # A fresh engine, the registered one memoizes the rows selected with pandas
+    data = FilterEngine(tracks).select(genres, explicit_filter)
+    pd.testing.assert_frame_equal(stable_sample(data, 100), expected)
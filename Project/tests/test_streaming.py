@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import FILTER_STATES
+from visualizations.aggregates import grouped_stats, genre_counts, top_tracks, row_count
+from visualizations.artists import artist_stats
+from visualizations.box_stats import genre_box_summaries, length_box_summaries
+from visualizations.dataset import load_dataset
+from visualizations.filtering import filter_frame
+from visualizations.joint_histograms import joint_popularity
+from visualizations.store import get_derived, prepare
+from visualizations import streaming
+
+SPEC = {'popularity': ['mean', 'std', 'count'], 'energy': ['mean']}
+BOX_STATS = ('count', 'q1', 'median', 'q3', 'lowerfence', 'upperfence')
+# A sample smaller than the dataset, so only the folded aggregates can give the loaded answers
+SAMPLE_ROWS = 300
+
+
+def answers(data):
+    """Every aggregate a chart reads for the rows of `data`"""
+    names = list(genre_counts(data).index[:10])
+    return {
+        'rows': row_count(data),
+        'stats': {by: grouped_stats(data, by, SPEC) for by in ['track_genre', 'explicit', 'energy_category', 'length_category', 'energy_bins']},
+        'genre_counts': genre_counts(data),
+        'top_tracks': top_tracks(data),
+        'artists': artist_stats(data, 2, True),
+        'genre_boxes': genre_box_summaries(data, names),
+        'length_boxes': length_box_summaries(data),
+        'joint': joint_popularity(data, 'danceability', 'energy', 4)
+    }
+
+
+@pytest.fixture(scope='module')
+def datasets(genre_rows, tmp_path_factory):
+    """(loaded dataset, its answers per filter state, streamed dataset) of one CSV
+
+    The CSV lists a track once per genre, with the same values on each of its rows as in the source,
+    and lists some (track, genre) pairs twice.
+    """
+    path = str(tmp_path_factory.mktemp('streaming') / 'dataset.csv')
+    rows = pd.concat([genre_rows, genre_rows.sample(100, random_state=0)], ignore_index=True)
+    rows.to_csv(path)
+    loaded = prepare(load_dataset(path))
+    expected = {i: answers(filter_frame(loaded, *state)) for i, state in enumerate(FILTER_STATES)}
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(streaming, 'STREAM_SAMPLE_ROWS', SAMPLE_ROWS)
+        streamed = streaming.stream_dataset(path, chunk_rows=len(rows) // 5)
+    return loaded, expected, streamed
+
+
+def assert_boxes_equal(result, expected):
+    for key, summary in expected.items():
+        assert (result[key] is None) == (summary is None)
+        if summary is not None:
+            np.testing.assert_allclose([result[key][s] for s in BOX_STATS], [summary[s] for s in BOX_STATS], atol=1e-6)
+
+
+def shares_tracks(genres):
+    return 'All Genres' not in genres and len(genres) > 1
+
+
+@pytest.mark.parametrize('state', range(len(FILTER_STATES)))
+def test_streamed_answers_match_loaded(datasets, state):
+    loaded, expected, streamed = datasets
+    genres, explicit_filter = FILTER_STATES[state]
+    data = filter_frame(streamed, genres, explicit_filter)
+    assert data.attrs.get('sampled') and len(data) <= expected[state]['rows']
+    result, expected = answers(data), expected[state]
+
+    # Per-genre answers count a track once in each genre listing it, like the loaded dataset
+    pd.testing.assert_frame_equal(result['stats']['track_genre'], expected['stats']['track_genre'], rtol=1e-6)
+    pd.testing.assert_series_equal(result['genre_counts'], expected['genre_counts'])
+    pd.testing.assert_frame_equal(result['top_tracks'], expected['top_tracks'])
+    assert_boxes_equal(result['genre_boxes'], expected['genre_boxes'])
+    if shares_tracks(genres):
+        # Streamed selections of several genres count a track once per selected genre listing it
+        assert result['rows'] == sum(row_count(filter_frame(loaded, [genre], explicit_filter)) for genre in genres)
+        return
+
+    assert result['rows'] == expected['rows']
+    for by, stats in expected['stats'].items():
+        pd.testing.assert_frame_equal(result['stats'][by], stats, rtol=1e-6)
+    pd.testing.assert_frame_equal(result['artists'], expected['artists'], rtol=1e-9)
+    assert_boxes_equal(result['length_boxes'], expected['length_boxes'])
+    for value, reference in zip(result['joint'], expected['joint']):
+        np.testing.assert_allclose(value, reference, rtol=1e-9)
+
+
+def test_streamed_sample_is_bounded_and_kept_apart(datasets):
+    loaded, _, streamed = datasets
+    assert len(streamed) <= SAMPLE_ROWS
+    # The loaded dataset keeps its own registration and derived structures
+    assert streamed.attrs['fingerprint'] == loaded.attrs['fingerprint'] + streaming.OUT_OF_CORE_SUFFIX
+    assert get_derived(loaded, 'filter_engine').frame is loaded
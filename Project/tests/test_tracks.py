@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from visualizations.aggregates import grouped_stats
+from visualizations.filtering import filter_frame
+from visualizations.store import get_derived
+from visualizations.tracks import TRACK_ID, with_genres, unique_tracks
+
+FEATURES = ['popularity', 'duration_ms', 'energy', 'danceability', 'explicit', 'artists', 'track_name']
+
+
+def test_track_table_holds_each_track_once(tracks, unique_rows):
+    assert tracks[TRACK_ID].is_unique
+    assert 'track_genre' not in tracks.columns
+    # Every track keeps the values of its first row
+    pd.testing.assert_frame_equal(
+        tracks.set_index(TRACK_ID)[FEATURES].sort_index(),
+        unique_rows.set_index(TRACK_ID)[FEATURES].sort_index())
+
+
+def test_membership_lists_every_genre_of_a_track(tracks, rows):
+    membership = get_derived(tracks, 'genre_membership')
+    assert membership.tracks.dtype == np.int32 and membership.genre_codes.dtype == np.int16
+    pairs = with_genres(tracks)[[TRACK_ID, 'track_genre']]
+    expected = rows[[TRACK_ID, 'track_genre']].drop_duplicates()
+    assert len(pairs) == len(membership.tracks) == len(expected)
+    assert set(map(tuple, pairs.to_numpy())) == set(map(tuple, expected.to_numpy()))
+
+
+def test_unique_tracks_matches_drop_duplicates(rows, unique_rows):
+    pd.testing.assert_frame_equal(unique_tracks(rows).reset_index(drop=True), unique_rows)
+
+
+def test_cross_genre_stats_count_each_track_once(tracks, unique_rows):
+    spec = {'popularity': ['count', 'mean'], 'energy': ['mean']}
+    expected = unique_rows.groupby('explicit').agg(spec)
+    result = grouped_stats(filter_frame(tracks, ['All Genres'], 'All'), 'explicit', spec)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, rtol=1e-5)
+
@@ -1,20 +1,78 @@
-from .genre_popularity import create_genre_popularity_chart
-from .audio_features_correlation import create_audio_features_correlation
-from .energy_time_analysis import create_energy_time_analysis
-from .danceability_engagement import create_danceability_engagement
-from .consistent_artists import create_consistent_artists
-from .track_length_viral import create_track_length_viral
-from .tempo_loudness_analysis import create_tempo_loudness_analysis
-from .energy_by_genre import create_energy_by_genre
-from .explicit_content_analysis import create_explicit_content_analysis
-__all__ = [
-    'create_genre_popularity_chart',
-    'create_audio_features_correlation',
-    'create_energy_time_analysis',
-    'create_danceability_engagement',
-    'create_consistent_artists',
-    'create_track_length_viral',
-    'create_tempo_loudness_analysis',
-    'create_energy_by_genre',
-    'create_explicit_content_analysis'
-] 
\ No newline at end of file
+import importlib
+
+TRACK_LABEL_COLUMNS = ['track_name', 'artists']
+
+# Chart function name -> module defining it and the dataset columns it reads.
+# A module is imported on the chart's first use, the columns decide what the app loads.
+CHARTS = {
+    'create_genre_popularity_chart': {
+        'module': 'genre_popularity',
+        'columns': ['track_genre', 'popularity', 'duration_ms', 'energy', 'danceability'] + TRACK_LABEL_COLUMNS
+    },
+    'create_audio_features_correlation': {
+        'module': 'audio_features_correlation',
+        'columns': ['popularity', 'energy', 'danceability', 'valence', 'instrumentalness']
+    },
+    'create_energy_time_analysis': {
+        'module': 'energy_time_analysis',
+        'columns': ['popularity', 'energy'] + TRACK_LABEL_COLUMNS
+    },
+    'create_danceability_engagement': {
+        'module': 'danceability_engagement',
+        'columns': ['popularity', 'danceability', 'energy', 'valence'] + TRACK_LABEL_COLUMNS
+    },
+    'create_consistent_artists': {
+        'module': 'consistent_artists',
+        'columns': ['popularity', 'artists']
+    },
+    'create_track_length_viral': {
+        'module': 'track_length_viral',
+        'columns': ['popularity', 'duration_ms']
+    },
+    'create_tempo_loudness_analysis': {
+        'module': 'tempo_loudness_analysis',
+        'columns': ['popularity', 'tempo', 'loudness'] + TRACK_LABEL_COLUMNS
+    },
+    'create_energy_by_genre': {
+        'module': 'energy_by_genre',
+        'columns': ['track_genre', 'energy']
+    },
+    'create_explicit_content_analysis': {
+        'module': 'explicit_content_analysis',
+        'columns': ['track_genre', 'explicit', 'popularity']
+    },
+    'create_feature_explorer': {
+        'module': 'feature_explorer',
+        'columns': ['popularity', 'danceability', 'energy', 'valence', 'acousticness', 'instrumentalness',
+                    'speechiness', 'liveness', 'tempo', 'loudness']
+    }
+}
+
+__all__ = list(CHARTS)
+
+
+def get_chart(name):
+    """Chart function registered as `name`, importing its module the first time"""
+    if name not in CHARTS:
+        raise KeyError(f'Unknown chart: {name}')
+    func = getattr(importlib.import_module(f".{CHARTS[name]['module']}", __name__), name)
+    globals()[name] = func
+    return func
+
+
+def dataset_columns(charts=None):
+    """Columns the given charts (all by default), the filters and the derived structures read"""
+    from .store import BUILDER_MODULES
+
+    columns = set()
+    for name in charts or CHARTS:
+        columns.update(CHARTS[name]['columns'])
+    for module in BUILDER_MODULES:
+        columns.update(importlib.import_module(f'.{module}', __name__).COLUMNS)
+    return sorted(columns)
+
+
+def __getattr__(name):
+    if name in CHARTS:
+        return get_chart(name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,284 @@
+import numpy as np
+import pandas as pd
+from .profiling import timed
+from .store import register_builder, get_derived, get_selection
+from .binning import BINNINGS, category_codes, category_labels
+from .sql_backend import sql_database_for
+from .tracks import unique_tracks, with_genres
+
+VALUE_COLUMNS = ['popularity', 'duration_ms', 'energy', 'danceability', 'valence']
+
+STATS = ('mean', 'std', 'count')
+
+COLUMNS = ['track_genre', 'explicit', 'track_name', 'artists'] + VALUE_COLUMNS + [spec['column'] for spec in BINNINGS.values()]
+
+
+def _is_binning(by):
+    return isinstance(by, str) and by in BINNINGS
+
+
+def _normalize_spec(spec):
+    return {column: [stats] if isinstance(stats, str) else list(stats) for column, stats in spec.items()}
+
+
+def cube_arrays(df, genre_codes, n_genres, rows=None):
+    """Per-cell sums of the rows `rows` of `df` (all by default), coded by genre (-1 for none), and the row
+    of top popularity per (genre, explicit) cell, -1 where empty
+
+    A row may be given several times, once per genre it is counted under. Ties for the top go to the lowest row.
+    """
+    rows = np.arange(len(df)) if rows is None else rows
+    explicit = df['explicit'].to_numpy(dtype=bool)[rows].astype(np.intp)
+    valid = genre_codes >= 0
+    cell = genre_codes * 2 + explicit
+    n_cells = n_genres * 2
+
+    values = np.column_stack([df[column].to_numpy(dtype=np.float64)[rows] for column in VALUE_COLUMNS])
+    present = ~np.isnan(values)
+    values = np.where(present, values, 0.0)
+
+    cells = {}
+    groupings = {'track_genre': np.zeros(len(rows), dtype=np.intp)}
+    groupings.update({name: category_codes(df, name)[rows] for name in BINNINGS})
+    for name, codes in groupings.items():
+        n_bins = len(BINNINGS[name]['labels']) if name in BINNINGS else 1
+        keep = valid & (codes >= 0)
+        index = cell[keep] * n_bins + codes[keep]
+        size = n_cells * n_bins
+        shape = (n_genres, 2, n_bins)
+        cells[name] = {
+            'rows': np.bincount(index, minlength=size).reshape(shape),
+            'count': np.stack([np.bincount(index, weights=present[keep, i], minlength=size).reshape(shape) for i in range(len(VALUE_COLUMNS))]),
+            'sum': np.stack([np.bincount(index, weights=values[keep, i], minlength=size).reshape(shape) for i in range(len(VALUE_COLUMNS))]),
+            'sumsq': np.stack([np.bincount(index, weights=values[keep, i] ** 2, minlength=size).reshape(shape) for i in range(len(VALUE_COLUMNS))])
+        }
+
+    # First row holding the highest popularity in each (genre, explicit) cell, like groupby().idxmax()
+    popularity = df['popularity'].to_numpy()[rows]
+    order = np.lexsort((rows, -popularity, cell))
+    order = order[valid[order]]
+    first = order[np.r_[True, cell[order][1:] != cell[order][:-1]]] if len(order) else order
+    top_row = np.full(n_cells, -1, dtype=np.intp)
+    top_row[cell[first]] = rows[first]
+    return cells, top_row
+
+
+class StatsCube:
+    """Count, sum and sum of squares per (genre, explicit, bin) cell, mergeable across any filter state
+
+    Cells are those of the filter engine's entries: a track counts under every genre listing it, and
+    once more under the trailing "All Genres" genre that groupings across genres read.
+    """
+
+    def __init__(self, genres, cells, top, frame, n_entries=0):
+        self.genres = genres
+        self.genre_codes = {genre: code for code, genre in enumerate(genres)}
+        self.cells = cells
+        self.top = top
+        self.frame = frame
+        self.n_entries = n_entries
+
+    @classmethod
+    def from_frame(cls, df):
+        engine = get_derived(df, 'filter_engine')
+        cells, top_row = cube_arrays(df, engine.codes // 2, engine.n_genres + 1, engine.tracks)
+        top = {
+            'row': top_row.reshape(engine.n_genres + 1, 2),
+            'popularity': df['popularity'].to_numpy()
+        }
+        return cls(engine.membership.genres, cells, top, df, engine.n_entries)
+
+    def extend(self, frame, start):
+        """Cube of `frame`, whose first `start` tracks are this cube's frame, from the entries added since alone
+
+        None when the new tracks add genres or move the edges of an 'equal' binning.
+        """
+        engine = get_derived(frame, 'filter_engine')
+        if not np.array_equal(engine.membership.genres, self.genres):
+            return None
+        old_ranges, ranges = get_derived(self.frame, 'value_ranges'), get_derived(frame, 'value_ranges')
+        if any(not np.array_equal(old_ranges.edges(name), ranges.edges(name)) for name in BINNINGS):
+            return None
+
+        rows = engine.tracks[self.n_entries:]
+        cells, top_row = cube_arrays(frame, engine.codes[self.n_entries:] // 2, len(self.genres) + 1, rows)
+        merged = {name: {stat: self.cells[name][stat] + array for stat, array in arrays.items()} for name, arrays in cells.items()}
+
+        # An added entry takes a cell's top spot with a higher popularity, or an equal one on an earlier track
+        popularity = frame['popularity'].to_numpy()
+        row = self.top['row'].ravel().copy()
+        candidate_popularity, current_popularity = popularity[np.maximum(top_row, 0)], popularity[np.maximum(row, 0)]
+        better = (top_row >= 0) & ((row < 0) | (candidate_popularity > current_popularity)
+                                   | ((candidate_popularity == current_popularity) & (top_row < row)))
+        row[better] = top_row[better]
+        top = {
+            'row': row.reshape(self.top['row'].shape),
+            'popularity': popularity
+        }
+        return StatsCube(self.genres, merged, top, frame, engine.n_entries)
+
+    def supports(self, by, spec):
+        keys = tuple(by) if isinstance(by, (list, tuple)) else (by,)
+        if keys not in (('track_genre',), ('explicit',), ('track_genre', 'explicit')) and not _is_binning(by):
+            return False
+        return all(column in VALUE_COLUMNS and set(stats) <= set(STATS) for column, stats in _normalize_spec(spec).items())
+
+    def _select(self, genres, explicit, by_genre=True):
+        if genres is None:
+            genre_index = np.arange(len(self.genres)) if by_genre else np.array([len(self.genres)], dtype=np.intp)
+        else:
+            genre_index = np.array(sorted(self.genre_codes[g] for g in genres if g in self.genre_codes), dtype=np.intp)
+        explicit_index = np.array([0, 1] if explicit is None else [int(explicit)], dtype=np.intp)
+        return genre_index, explicit_index
+
+    def query(self, by, spec, genres=None, explicit=None):
+        """Equivalent of data.groupby(by).agg(spec) for the rows matching the filter state
+
+        Groupings not by genre sum the cells of the selected genres, so they count each track once only
+        for "All Genres" or genres without tracks in common.
+        """
+        keys = tuple(by) if isinstance(by, (list, tuple)) else (by,)
+        genre_index, explicit_index = self._select(genres, explicit, 'track_genre' in keys)
+        grouping = by if _is_binning(by) else 'track_genre'
+        arrays = self.cells[grouping]
+
+        def reduce(array):
+            array = array[..., genre_index, :, :][..., explicit_index, :]
+            if by == 'track_genre':
+                return array.sum(axis=(-2, -1))
+            if by == 'explicit':
+                return array.sum(axis=(-3, -1))
+            if _is_binning(by):
+                return array.sum(axis=(-3, -2))
+            return array.sum(axis=-1).reshape(array.shape[:-3] + (-1,))
+
+        rows = reduce(arrays['rows'])
+        count, total, squares = reduce(arrays['count']), reduce(arrays['sum']), reduce(arrays['sumsq'])
+
+        if by == 'track_genre':
+            index = pd.Index(self.genres[genre_index], name='track_genre')
+        elif by == 'explicit':
+            index = pd.Index(explicit_index.astype(bool), name='explicit')
+        elif _is_binning(by):
+            labels = BINNINGS[by]['labels']
+            index = pd.CategoricalIndex(labels, categories=labels, ordered=True, name=by)
+        else:
+            index = pd.MultiIndex.from_product(
+                [self.genres[genre_index], explicit_index.astype(bool)], names=['track_genre', 'explicit'])
+
+        keep = rows > 0
+        if _is_binning(by) and not BINNINGS[by]['observed']:
+            keep = np.ones_like(keep)
+
+        flat = all(isinstance(stats, str) for stats in spec.values())
+        spec = _normalize_spec(spec)
+        columns = {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for column, stats in spec.items():
+                i = VALUE_COLUMNS.index(column)
+                n, s, ss = count[i], total[i], squares[i]
+                for stat in stats:
+                    if stat == 'count':
+                        result = n.astype(np.int64)
+                    elif stat == 'mean':
+                        result = np.where(n > 0, s / n, np.nan)
+                    else:
+                        variance = np.maximum(ss - s * s / n, 0) / (n - 1)
+                        result = np.where(n > 1, np.sqrt(variance), np.nan)
+                    columns[column if flat else (column, stat)] = result[keep]
+        return pd.DataFrame(columns, index=index[keep])
+
+    def genre_rows(self, genres=None, explicit=None):
+        """Row count per genre of the filter state, largest first like value_counts(), ties in genre order"""
+        genre_index, explicit_index = self._select(genres, explicit)
+        rows = self.cells['track_genre']['rows'][genre_index][:, explicit_index].sum(axis=(1, 2))
+        counts = pd.Series(rows.astype(np.int64), index=pd.Index(self.genres[genre_index], name='track_genre'), name='count')
+        return counts[counts > 0].sort_values(ascending=False, kind='stable')
+
+    def track_count(self, genres=None, explicit=None):
+        """Tracks in the filter state, for "All Genres" or genres without tracks in common"""
+        genre_index, explicit_index = self._select(genres, explicit, by_genre=False)
+        return int(self.cells['track_genre']['rows'][genre_index][:, explicit_index].sum())
+
+    def top_tracks(self, genres=None, explicit=None):
+        genre_index, explicit_index = self._select(genres, explicit)
+        candidates = self.top['row'][genre_index][:, explicit_index]
+        popularity = np.where(candidates >= 0, self.top['popularity'][candidates], -np.inf)
+        # Highest popularity first, then earliest track, matching idxmax tie-breaking
+        order = np.lexsort((np.where(candidates >= 0, candidates, np.iinfo(np.intp).max), -popularity), axis=-1)
+        rows = np.take_along_axis(candidates, order[:, :1], axis=1)[:, 0]
+        keep = rows >= 0
+        rows = rows[keep]
+        return pd.DataFrame({
+            'track_name': self.frame['track_name'].iloc[rows].to_numpy(dtype=object),
+            'artists': self.frame['artists'].iloc[rows].to_numpy(dtype=object),
+            'popularity': self.top['popularity'][rows]
+        }, index=pd.Index(self.genres[genre_index][keep], name='track_genre'))
+
+
+register_builder('stats_cube', StatsCube.from_frame)
+
+
+def _cube_for(data):
+    cube = get_derived(data, 'stats_cube')
+    selection = get_selection(data) if cube is not None else None
+    return (cube, selection) if selection is not None else (None, None)
+
+
+@timed('aggregation')
+def grouped_stats(data, by, spec):
+    """data.groupby(by).agg(spec), answered from the stats cube when `data` is a known filter state
+
+    `by` is a column name, ['track_genre', 'explicit'] or one of the BINNINGS names. Groupings by genre
+    join the tracks with their genres, counting a track in every selected genre listing it, others
+    count each track once.
+    """
+    database, selection = sql_database_for(data)
+    if database is not None and database.supports(by, spec):
+        return database.grouped_stats(by, spec, *selection)
+
+    by_genre = 'track_genre' in (list(by) if isinstance(by, (list, tuple)) else [by])
+    cube, selection = _cube_for(data)
+    if cube is not None and cube.supports(by, spec):
+        if by_genre or get_derived(data, 'filter_engine').cells(*selection) is not None:
+            return cube.query(by, spec, *selection)
+
+    data = with_genres(data) if by_genre else unique_tracks(data)
+    if _is_binning(by):
+        return data.groupby(category_labels(data, by), observed=BINNINGS[by]['observed']).agg(spec)
+    return data.groupby(by).agg(spec)
+
+
+@timed('aggregation')
+def top_tracks(data):
+    """Most popular track per genre with its artists and popularity"""
+    database, selection = sql_database_for(data)
+    if database is not None:
+        return database.top_tracks(*selection)
+
+    cube, selection = _cube_for(data)
+    if cube is not None:
+        return cube.top_tracks(*selection)
+
+    rows = with_genres(data).reset_index(drop=True)
+    top = rows.loc[rows.groupby('track_genre')['popularity'].idxmax()][['track_genre', 'track_name', 'artists', 'popularity']]
+    return top.set_index('track_genre')
+
+
+@timed('aggregation')
+def genre_counts(data):
+    """Tracks per genre of `data` like value_counts(), from the stats cube when `data` is a known filter state"""
+    database, selection = sql_database_for(data)
+    if database is not None:
+        return database.genre_rows(*selection)
+
+    cube, selection = _cube_for(data)
+    if cube is None:
+        return with_genres(data)['track_genre'].value_counts()
+    return cube.genre_rows(*selection)
+
+
+def row_count(data):
+    """Number of tracks `data` stands for, counted by the stats cube when it is a sample of a streamed dataset"""
+    cube, selection = _cube_for(data) if data.attrs.get('sampled') else (None, None)
+    return len(data) if cube is None else cube.track_count(*selection)
@@ -0,0 +1,144 @@
+"""Append the tracks of a delta CSV to the dataset, updating its snapshot and cached derived structures
+
+Only the new rows are parsed, binned and aggregated. Rows of tracks already in the dataset only add
+genres to them, new tracks are appended to the track table: counts, sums, sums of squares, top tracks,
+histograms and artist stats add the delta's contribution, and the filter, sample and artist indexes
+merge the new tracks in. The grown dataset gets a new fingerprint, so nothing cached for the old rows
+is served for it. Appends that add a genre or widen an 'equal' binning's range rebuild the affected
+structures instead.
+
+The CSV is neither reread nor rehashed: its next index and the value ranges the 'equal' binnings take
+their edges from are kept in the snapshot, and the new fingerprint chains the old one with the appended
+bytes. Matching the delta's track ids and merging the genre membership still scan the existing tracks,
+and the snapshot file is rewritten with its existing columns copied as they are stored.
+
+Usage (from the Project directory):
+
+    python -m visualizations.append new_tracks.csv
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from . import dataset_columns
+from .binning import BINNINGS, ValueRanges, bin_codes, code_column
+from .dataset import (INDEX_COLUMN, find_dataset_path, snapshot_path, load_dataset, read_csv, read_snapshot, compact_frame,
+                      appended_fingerprint, appended_snapshot, write_snapshot, _snapshot_metadata)
+from .store import prepare, extend_dataset, derived_structures, get_derived
+from .tracks import TRACK_ID, match_tracks
+from .disk_cache import save_derived, write_manifest
+
+
+def extend_frame(df, delta):
+    """`df` with the rows of `delta` appended, binned with the edges of the combined rows"""
+    code_columns = {code_column(name) for name in BINNINGS}
+    missing = [column for column in df.columns if column not in delta.columns and column not in code_columns]
+    if missing:
+        raise ValueError(f"Delta is missing columns: {', '.join(missing)}")
+    delta = compact_frame(delta, df.columns)
+    delta = delta[[column for column in df.columns if column in delta.columns]]
+    delta = delta.astype({column: df[column].dtype for column in delta.columns})
+
+    # The dataset's ranges widened by the delta's give the combined edges without scanning the old rows
+    old_ranges = get_derived(df, 'value_ranges')
+    ranges = old_ranges.merge(ValueRanges.of(delta))
+    rebinned = {}
+    for name, spec in BINNINGS.items():
+        if code_column(name) not in df.columns:
+            continue
+        edges = ranges.edges(name)
+        delta[code_column(name)] = bin_codes(delta[spec['column']], name, edges)
+        if not np.array_equal(edges, old_ranges.edges(name)):
+            rebinned[name] = edges
+
+    frame = pd.concat([df, delta], ignore_index=True)
+    # The new rows widened an 'equal' binning's range, so every row's code moves with its edges
+    for name, edges in rebinned.items():
+        frame[code_column(name)] = bin_codes(frame[BINNINGS[name]['column']], name, edges)
+    return frame
+
+
+def append_rows(df, delta, track_ids, fingerprint=None):
+    """Prepared dataset `df` with the rows of `delta` added, its derived structures extended from the new rows
+
+    `track_ids` identify the tracks of `df` in order. Rows of known tracks add their genres to them,
+    the others append new tracks.
+    """
+    new_tracks, track = match_tracks(track_ids, delta)
+    listed = delta['track_genre'].notna().to_numpy()
+    membership = get_derived(df, 'genre_membership').merge(track[listed], delta['track_genre'].to_numpy()[listed])
+    return extend_dataset(df, extend_frame(df, new_tracks), fingerprint, {'genre_membership': membership})
+
+
+def csv_rows(csv_path, delta_path, first_index):
+    """Bytes appending the rows of the delta CSV to the dataset CSV as text, in the dataset's column order"""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    rows = pd.read_csv(delta_path, dtype=str, keep_default_na=False)
+    if INDEX_COLUMN in header and INDEX_COLUMN not in rows.columns:
+        rows[INDEX_COLUMN] = np.arange(first_index, first_index + len(rows)).astype(str)
+    rows = rows[header]
+
+    with open(csv_path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        newline = f.read(1) not in (b'\n', b'\r')
+    return (b'\n' if newline else b'') + rows.to_csv(header=False, index=False).encode()
+
+
+def append_csv(csv_path, data):
+    """Append `data` to the dataset CSV, cutting it back to its old length if the write fails"""
+    size = os.path.getsize(csv_path)
+    try:
+        with open(csv_path, 'ab') as f:
+            f.write(data)
+    except BaseException:
+        os.truncate(csv_path, size)
+        raise
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('delta', help='CSV of new tracks with the dataset\'s columns')
+    args = parser.parse_args(argv)
+
+    csv_path = find_dataset_path()
+    start = time.perf_counter()
+    df = prepare(load_dataset(csv_path, dataset_columns()))
+    track_ids = read_snapshot(snapshot_path(csv_path), [TRACK_ID])[TRACK_ID].to_numpy()
+    delta = read_csv(args.delta)
+    header = pd.read_csv(csv_path, nrows=0).columns
+    missing = [column for column in header if column not in delta.columns and column != INDEX_COLUMN]
+    if missing:
+        parser.error(f"{args.delta} is missing columns: {', '.join(missing)}")
+    # The CSV lists a track once per genre, so its index continues from its rows rather than the tracks,
+    # as recorded in the snapshot
+    first_index = int(_snapshot_metadata(snapshot_path(csv_path))[b'next_index'])
+    if INDEX_COLUMN in header and INDEX_COLUMN not in delta.columns:
+        delta[INDEX_COLUMN] = np.arange(first_index, first_index + len(delta))
+    next_index = max(first_index, int(delta[INDEX_COLUMN].max()) + 1) if INDEX_COLUMN in header and len(delta) else first_index + len(delta)
+    print(f"Loaded {len(df):,} tracks and a delta of {len(delta):,} rows in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    # Everything is derived before the CSV changes, so a delta that fails leaves the dataset as it was
+    start = time.perf_counter()
+    data = csv_rows(csv_path, args.delta, first_index)
+    fingerprint = appended_fingerprint(df.attrs['fingerprint'], data)
+    frame = append_rows(df, delta, track_ids, fingerprint)
+    new_tracks, _ = match_tracks(track_ids, delta)
+    table = appended_snapshot(snapshot_path(csv_path), new_tracks, get_derived(frame, 'genre_membership'), next_index)
+    print(f"Extended the derived structures in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+    # Past the CSV, a failure only leaves the snapshot and cache stale, and they are rebuilt from it
+    start = time.perf_counter()
+    append_csv(csv_path, data)
+    write_snapshot(table, csv_path, fingerprint)
+    save_derived(frame, derived_structures(frame))
+    write_manifest(frame)
+    print(f"Wrote the CSV, snapshot and cache in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    print(f"Dataset {df.attrs['fingerprint']} -> {frame.attrs['fingerprint']}, {len(frame):,} tracks")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
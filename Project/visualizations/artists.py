@@ -0,0 +1,172 @@
+import copy
+import numpy as np
+import pandas as pd
+from .profiling import timed
+from .store import register_builder, get_derived, get_selection
+from .tracks import unique_tracks
+
+ARTIST_SEPARATOR = ';'
+MIN_ARTIST_TRACKS = 8
+
+COLUMNS = ['track_genre', 'explicit', 'artists', 'popularity']
+
+
+def _credits(frame):
+    """Sorted artist names and one (row, artist id) entry per split credit of `frame`, with each row's credit count"""
+    # Split each distinct credit string once rather than every row
+    string_codes, strings = pd.factorize(frame['artists'])
+    credits = [s.split(ARTIST_SEPARATOR) for s in strings]
+    names, artist_codes = np.unique(np.array([name for c in credits for name in c], dtype=object), return_inverse=True)
+    n_credits = np.array([len(c) for c in credits], dtype=np.intp)
+    string_offsets = np.r_[0, np.cumsum(n_credits)]
+
+    # One entry per (track, credited artist), rows without artists have none
+    row_credits = np.where(string_codes >= 0, n_credits[string_codes], 0)
+    rows = np.repeat(np.arange(len(frame)), row_credits)
+    within = np.arange(len(rows)) - np.repeat(np.cumsum(row_credits) - row_credits, row_credits)
+    artists = artist_codes[string_offsets[string_codes[rows]] + within]
+    return names, rows, artists, row_credits
+
+
+class ArtistIndex:
+    """Artist ids and an artist -> track CSR adjacency over the split `artists` credits, built once at load"""
+
+    def __init__(self, frame):
+        names, rows, artists, row_credits = _credits(frame)
+        order = np.argsort(artists, kind='stable')
+        self.names = names
+        self.indptr = np.r_[0, np.cumsum(np.bincount(artists, minlength=len(names)))]
+        self.tracks = rows[order]
+        self.artists = artists[order]
+        self.solo = (row_credits == 1)[self.tracks]
+        self.popularity = frame['popularity'].to_numpy(dtype=np.float64)[self.tracks]
+        self.n_tracks = len(frame)
+
+    def extend(self, frame, start):
+        """Index of `frame` with the credits of the tracks appended after `start` merged in, old credits are not split again"""
+        names, rows, artists, row_credits = _credits(frame.iloc[start:])
+        rows = rows + start
+        positions = np.searchsorted(self.names, names)
+        if np.all(positions < len(self.names)) and np.array_equal(self.names[np.minimum(positions, len(self.names) - 1)], names):
+            all_names, old_ids, new_ids = self.names, self.artists, positions[artists]
+        else:
+            # Artist ids follow the sorted names, so ids of existing artists shift past any new names
+            all_names = np.union1d(self.names, names)
+            old_ids = np.searchsorted(all_names, self.names)[self.artists]
+            new_ids = np.searchsorted(all_names, names)[artists]
+
+        keys = old_ids * len(frame) + self.tracks
+        by_key = np.argsort(new_ids * len(frame) + rows, kind='stable')
+        at = np.searchsorted(keys, new_ids[by_key] * len(frame) + rows[by_key], side='right')
+        rows, new_ids = rows[by_key], new_ids[by_key]
+
+        index = copy.copy(self)
+        index.names = all_names
+        index.artists = np.insert(old_ids, at, new_ids)
+        index.indptr = np.r_[0, np.cumsum(np.bincount(index.artists, minlength=len(all_names)))]
+        index.tracks = np.insert(self.tracks, at, rows)
+        index.solo = np.insert(self.solo, at, (row_credits == 1)[rows - start])
+        index.popularity = np.insert(self.popularity, at, frame['popularity'].to_numpy(dtype=np.float64)[rows])
+        index.n_tracks = len(frame)
+        return index
+
+    def tracks_of(self, name):
+        """Row positions of every track crediting `name`"""
+        i = np.searchsorted(self.names, name)
+        if i == len(self.names) or self.names[i] != name:
+            return np.array([], dtype=np.intp)
+        return self.tracks[self.indptr[i]:self.indptr[i + 1]]
+
+    def stats(self, min_tracks=MIN_ARTIST_TRACKS, include_collabs=False, rows=None):
+        """Popularity mean, std and track count per artist, for artists with at least `min_tracks`
+
+        `rows` restricts the tracks to those positions, a slice or an array, all tracks by default.
+        """
+        selected = ~np.isnan(self.popularity)
+        if not include_collabs:
+            selected &= self.solo
+        if rows is not None:
+            counted = np.zeros(self.n_tracks, dtype=bool)
+            counted[rows] = True
+            selected &= counted[self.tracks]
+
+        values = np.where(selected, self.popularity, 0.0)
+        count = np.bincount(self.artists, weights=selected, minlength=len(self.names))
+        total = np.bincount(self.artists, weights=values, minlength=len(self.names))
+        squares = np.bincount(self.artists, weights=values ** 2, minlength=len(self.names))
+        return _popularity_stats(self.names, count, total, squares, min_tracks)
+
+    def query(self, engine, genres, explicit, min_tracks=MIN_ARTIST_TRACKS, include_collabs=False):
+        """stats() over the tracks of a filter state"""
+        rows = None if (genres, explicit) == (None, None) else engine.positions(genres, explicit)
+        return self.stats(min_tracks, include_collabs, rows)
+
+
+class ArtistTotals:
+    """Popularity count, sum and sum of squares per (artist, filter cell, solo), folded from chunks of rows
+
+    Answers stats() like ArtistIndex without one entry per credited track, for datasets streamed from disk.
+    """
+
+    def __init__(self, n_cells):
+        self.n_cells = n_cells
+        self.ids = {}
+        # Sorted (artist id * n_cells + cell) * 2 + solo keys, with their count, sum and sum of squares
+        self.keys = np.array([], dtype=np.int64)
+        self.sums = np.zeros((3, 0))
+
+    def add(self, frame, cell_codes):
+        names, rows, artists, row_credits = _credits(frame)
+        ids = np.array([self.ids.setdefault(name, len(self.ids)) for name in names], dtype=np.int64)
+        keys = (ids[artists] * self.n_cells + cell_codes[rows]) * 2 + (row_credits[rows] == 1)
+        popularity = frame['popularity'].to_numpy(dtype=np.float64)[rows]
+        present = ~np.isnan(popularity)
+        values = np.where(present, popularity, 0.0)
+
+        self.keys, inverse = np.unique(np.concatenate([self.keys, keys]), return_inverse=True)
+        weights = np.concatenate([self.sums, np.vstack([present, values, values ** 2])], axis=1)
+        self.sums = np.vstack([np.bincount(inverse, weights=w, minlength=len(self.keys)) for w in weights])
+
+    def stats(self, cells=None, min_tracks=MIN_ARTIST_TRACKS, include_collabs=False):
+        selected = np.ones(len(self.keys), dtype=bool)
+        if not include_collabs:
+            selected &= self.keys % 2 == 1
+        if cells is not None:
+            selected &= np.isin(self.keys // 2 % self.n_cells, cells)
+        artists = self.keys // 2 // self.n_cells
+        count, total, squares = (np.bincount(artists, weights=np.where(selected, w, 0.0), minlength=len(self.ids)) for w in self.sums)
+
+        # Ids follow first appearance, the result is ordered by name like ArtistIndex
+        names = np.array(list(self.ids), dtype=object)
+        order = np.argsort(names)
+        return _popularity_stats(names[order], count[order], total[order], squares[order], min_tracks)
+
+    def query(self, engine, genres, explicit, min_tracks=MIN_ARTIST_TRACKS, include_collabs=False):
+        """stats() over the filter engine cells of a filter state, whose genres share no rows"""
+        return self.stats(engine.cells(genres, explicit), min_tracks, include_collabs)
+
+
+def _popularity_stats(names, count, total, squares, min_tracks):
+    keep = (count >= max(min_tracks, 1))
+    count, total, squares = count[keep], total[keep], squares[keep]
+    mean = total / count
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.where(count > 1, np.sqrt(np.maximum(squares - total * mean, 0) / (count - 1)), np.nan)
+    return pd.DataFrame({
+        'avg_popularity': mean,
+        'popularity_std': std,
+        'track_count': count.astype(np.int64)
+    }, index=pd.Index(names[keep], name='artists'))
+
+
+register_builder('artist_index', ArtistIndex)
+
+
+@timed('aggregation')
+def artist_stats(data, min_tracks=MIN_ARTIST_TRACKS, include_collabs=False):
+    """Per-artist popularity stats for the tracks of `data`; solo tracks only unless `include_collabs`"""
+    index = get_derived(data, 'artist_index')
+    selection = get_selection(data) if index is not None else None
+    if selection is None:
+        return ArtistIndex(unique_tracks(data)).stats(min_tracks, include_collabs)
+    return index.query(get_derived(data, 'filter_engine'), *selection, min_tracks, include_collabs)
@@ -2,21 +2,24 @@ import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from .utils import get_modern_layout
+from .dataset import load_dataset
+from .binning import BINNINGS
+from .joint_histograms import joint_popularity
+
+def _popularity_pivot(data, row_binning, column_binning):
+    """Mean popularity per pair of bins, like data.groupby([rows, columns])['popularity'].mean() pivoted"""
+    row_spec, column_spec = BINNINGS[row_binning], BINNINGS[column_binning]
+    count, mean, _, _ = joint_popularity(data, row_spec['column'], column_spec['column'], len(row_spec['labels']))
+    pivot = pd.DataFrame(mean, index=pd.Index(row_spec['labels'], name=row_binning), columns=pd.Index(column_spec['labels'], name=column_binning))
+    # Only the bins observed in the data, as groupby on categoricals reports them
+    return pivot.loc[count.any(axis=1), count.any(axis=0)]
+
 
 def create_audio_features_correlation(data=None):
 
     if data is None:
-        data = pd.read_csv('data/dataset.csv')
+        data = load_dataset()
     
-
-    df_work = data.copy()
-   
-    df_work['energy_bins'] = pd.cut(df_work['energy'], bins=4, labels=['Low Energy', 'Med Energy', 'High Energy', 'Very High Energy'])
-    df_work['danceability_bins'] = pd.cut(df_work['danceability'], bins=4, labels=['Low Dance', 'Med Dance', 'High Dance', 'Very High Dance'])
-    df_work['valence_bins'] = pd.cut(df_work['valence'], bins=4, labels=['Low Valence', 'Med Valence', 'High Valence', 'Very High Valence'])
-    df_work['instrumentalness_bins'] = pd.cut(df_work['instrumentalness'], bins=4, labels=['Vocal', 'Mostly Vocal', 'Mostly Instrumental', 'Instrumental'])
-    
-
     fig = make_subplots(
         rows=2, cols=2,
         subplot_titles=[
@@ -40,9 +43,7 @@ def create_audio_features_correlation(data=None):
     ]
     
     # Energy vs Danceability
-    heatmap1_data = df_work.groupby(['energy_bins', 'danceability_bins'])['popularity'].mean().reset_index()
-    pivot1 = heatmap1_data.pivot(index='energy_bins', columns='danceability_bins', values='popularity')
-    best1 = heatmap1_data.loc[heatmap1_data['popularity'].idxmax()]
+    pivot1 = _popularity_pivot(data, 'energy_bins', 'danceability_bins')
     
     fig.add_trace(
         go.Heatmap(
@@ -57,9 +58,7 @@ def create_audio_features_correlation(data=None):
     )
     
     # Energy vs Valence  
-    heatmap2_data = df_work.groupby(['energy_bins', 'valence_bins'])['popularity'].mean().reset_index()
-    pivot2 = heatmap2_data.pivot(index='energy_bins', columns='valence_bins', values='popularity')
-    best2 = heatmap2_data.loc[heatmap2_data['popularity'].idxmax()]
+    pivot2 = _popularity_pivot(data, 'energy_bins', 'valence_bins')
     
     fig.add_trace(
         go.Heatmap(
@@ -74,9 +73,7 @@ def create_audio_features_correlation(data=None):
     )
     
     # Danceability vs Valence
-    heatmap3_data = df_work.groupby(['danceability_bins', 'valence_bins'])['popularity'].mean().reset_index()
-    pivot3 = heatmap3_data.pivot(index='danceability_bins', columns='valence_bins', values='popularity')
-    best3 = heatmap3_data.loc[heatmap3_data['popularity'].idxmax()]
+    pivot3 = _popularity_pivot(data, 'danceability_bins', 'valence_bins')
     
     fig.add_trace(
         go.Heatmap(
@@ -91,9 +88,7 @@ def create_audio_features_correlation(data=None):
     )
     
     # Energy vs Instrumentalness
-    heatmap4_data = df_work.groupby(['energy_bins', 'instrumentalness_bins'])['popularity'].mean().reset_index()
-    pivot4 = heatmap4_data.pivot(index='energy_bins', columns='instrumentalness_bins', values='popularity')
-    best4 = heatmap4_data.loc[heatmap4_data['popularity'].idxmax()]
+    pivot4 = _popularity_pivot(data, 'energy_bins', 'instrumentalness_bins')
     
     fig.add_trace(
         go.Heatmap(
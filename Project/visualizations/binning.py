@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+from .store import register_builder, get_derived
+
+# 'cut' bins are right-closed like pd.cut, 'threshold' bins are left-closed and open-ended,
+# 'equal' bins split the column's range into equal widths like pd.cut(bins=n)
+BINNINGS = {
+    'danceability_range': {
+        'column': 'danceability',
+        'kind': 'cut',
+        'edges': [0, 0.3, 0.5, 0.9, 1.0],
+        'labels': ['Low Danceability (0-0.3)', 'Medium Danceability (0.3-0.5)', 'High Danceability (0.5-0.9)', 'Very High Danceability (0.9-1.0)'],
+        'observed': False
+    },
+    'energy_category': {
+        'column': 'energy',
+        'kind': 'threshold',
+        'edges': [0.4, 0.7],
+        'labels': ['Low Energy (0-0.4)', 'Medium Energy (0.4-0.7)', 'High Energy (0.7+)'],
+        'observed': True
+    },
+    'length_category': {
+        'column': 'duration_ms',
+        'kind': 'cut',
+        'edges': [0, 150000, 210000, 270000, 600000],
+        'labels': ['Short (0-2.5min)', 'Medium (2.5-3.5min)', 'Long (3.5-4.5min)', 'Very Long (4.5min+)'],
+        'observed': True
+    },
+    'energy_bins': {
+        'column': 'energy',
+        'kind': 'equal',
+        'labels': ['Low Energy', 'Med Energy', 'High Energy', 'Very High Energy'],
+        'observed': True
+    },
+    'danceability_bins': {
+        'column': 'danceability',
+        'kind': 'equal',
+        'labels': ['Low Dance', 'Med Dance', 'High Dance', 'Very High Dance'],
+        'observed': True
+    },
+    'valence_bins': {
+        'column': 'valence',
+        'kind': 'equal',
+        'labels': ['Low Valence', 'Med Valence', 'High Valence', 'Very High Valence'],
+        'observed': True
+    },
+    'instrumentalness_bins': {
+        'column': 'instrumentalness',
+        'kind': 'equal',
+        'labels': ['Vocal', 'Mostly Vocal', 'Mostly Instrumental', 'Instrumental'],
+        'observed': True
+    }
+}
+
+# Ranges are kept for the numeric columns that are loaded, so no column is loaded for them
+COLUMNS = []
+
+
+def equal_width_edges(values, n_bins):
+    """Edges pd.cut(values, bins=n_bins) would use"""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.linspace(0.0, 1.0, n_bins + 1)
+    low, high = values.min(), values.max()
+    if low == high:
+        pad = 0.001 * abs(low) if low != 0 else 0.001
+        return np.linspace(low - pad, high + pad, n_bins + 1)
+    edges = np.linspace(low, high, n_bins + 1)
+    edges[0] -= (high - low) * 0.001
+    return edges
+
+
+def binning_edges(values, binning):
+    spec = BINNINGS[binning]
+    if spec['kind'] == 'equal':
+        return equal_width_edges(values, len(spec['labels']))
+    return np.asarray(spec['edges'], dtype=np.float64)
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    return values if values.dtype.kind == 'f' else values.astype(np.float64)
+
+
+class ValueRanges:
+    """(low, high) of every numeric column of the dataset, all its 'equal' binnings take their edges from
+
+    Kept with the dataset, so appended rows only widen the ranges they fall outside of.
+    """
+
+    def __init__(self, ranges):
+        self.ranges = {column: tuple(bounds) for column, bounds in ranges.items()}
+
+    @classmethod
+    def of(cls, frame):
+        ranges = {}
+        codes = {code_column(name) for name in BINNINGS}
+        for column in frame.columns:
+            if frame[column].dtype.kind in 'fiu' and column not in codes:
+                values = _as_float(frame[column].to_numpy())
+                values = values[~np.isnan(values)]
+                ranges[column] = (float(values.min()), float(values.max())) if len(values) else ()
+        return cls(ranges)
+
+    def merge(self, other):
+        """Ranges spanning the values of both"""
+        ranges = dict(self.ranges)
+        for column, bounds in other.ranges.items():
+            if bounds and ranges.get(column):
+                bounds = (min(ranges[column][0], bounds[0]), max(ranges[column][1], bounds[1]))
+            ranges[column] = bounds or ranges.get(column, ())
+        return ValueRanges(ranges)
+
+    def extend(self, frame, start):
+        return self.merge(ValueRanges.of(frame.iloc[start:]))
+
+    def values(self, column):
+        """Two values spanning the column's range, or none"""
+        return np.array(self.ranges.get(column, ()), dtype=np.float64)
+
+    def edges(self, binning):
+        return binning_edges(self.values(BINNINGS[binning]['column']), binning)
+
+
+register_builder('value_ranges', ValueRanges.of)
+
+
+def cut_codes(values, edges):
+    """int8 code of the right-closed bin of `edges` holding each value, -1 outside them"""
+    values = _as_float(values)
+    # Compare in the column's own precision, so a float32 0.3 still lands on a 0.3 edge
+    edges = np.asarray(edges, dtype=values.dtype)
+    codes = np.searchsorted(edges, values, side='left') - 1
+    codes[(codes < 0) | (codes >= len(edges) - 1) | np.isnan(values)] = -1
+    return codes.astype(np.int8)
+
+
+def bin_codes(values, binning, edges=None):
+    """int8 bin code per value, -1 where the value falls outside every bin
+
+    `edges` overrides the binning's own, e.g. to code appended rows with the full dataset's 'equal' edges.
+    """
+    spec = BINNINGS[binning]
+    values = _as_float(values)
+    edges = binning_edges(values, binning) if edges is None else edges
+    if spec['kind'] != 'threshold':
+        return cut_codes(values, edges)
+    codes = np.searchsorted(edges.astype(values.dtype), values, side='right')
+    codes[np.isnan(values)] = 0
+    return codes.astype(np.int8)
+
+
+def code_column(binning):
+    return f'{binning}_code'
+
+
+def add_bin_codes(df):
+    """Store the int8 code of every binning as a column, so filtered views and samples carry them along
+
+    'equal' binnings take their edges from the range of `df`, so call this on the full dataset.
+    """
+    for name, spec in BINNINGS.items():
+        if code_column(name) not in df.columns and spec['column'] in df.columns:
+            df[code_column(name)] = bin_codes(df[spec['column']], name)
+    return df
+
+
+def category_codes(data, binning):
+    """int8 bin code of every row of `data`, read from the ingest-time column when present
+
+    Otherwise the rows are binned on the edges of the dataset they were cut from when it is registered,
+    so 'equal' bins match the stored codes, and on their own range when it is not.
+    """
+    column = code_column(binning)
+    if column in data.columns:
+        return data[column].to_numpy()
+    ranges = get_derived(data, 'value_ranges')
+    return bin_codes(data[BINNINGS[binning]['column']], binning, None if ranges is None else ranges.edges(binning))
+
+
+def category_labels(data, binning):
+    """Bin label of every row of `data` as an ordered categorical Series"""
+    spec = BINNINGS[binning]
+    return pd.Series(pd.Categorical.from_codes(category_codes(data, binning), categories=spec['labels'], ordered=True), index=data.index, name=binning)
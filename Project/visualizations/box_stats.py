@@ -0,0 +1,225 @@
+import copy
+import numpy as np
+from .profiling import timed
+from .store import register_builder, get_derived, get_selection
+from .binning import BINNINGS, category_codes
+from .tracks import unique_tracks, with_genres
+
+POPULARITY_LEVELS = 101
+# Box statistics are rounded to this many decimals, below the noise of float32 feature columns
+BOX_DECIMALS = 6
+EXPLICIT_STATES = (None, False, True)
+
+COLUMNS = ['track_genre', 'explicit', 'energy', 'popularity', 'duration_ms']
+
+
+def _quantile(sorted_values, q):
+    # Linear interpolation between order statistics, as numpy.percentile and Plotly's default quartilemethod
+    h = (len(sorted_values) - 1) * q
+    lo = int(np.floor(h))
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (h - lo) * (sorted_values[hi] - sorted_values[lo])
+
+
+def box_summary(values, decimals=3):
+    """Quartiles, Tukey whiskers and distinct outliers of `values`, the fields of a precomputed go.Box"""
+    values = np.sort(np.asarray(values, dtype=np.float64)[~np.isnan(values)])
+    if len(values) == 0:
+        return None
+    q1, median, q3 = (_quantile(values, q) for q in (0.25, 0.5, 0.75))
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    outliers = values[(values < inside[0]) | (values > inside[-1])]
+    return {
+        'count': len(values),
+        'mean': values.mean(),
+        'std': values.std(ddof=1) if len(values) > 1 else np.nan,
+        'q1': round(q1, BOX_DECIMALS),
+        'median': round(median, BOX_DECIMALS),
+        'q3': round(q3, BOX_DECIMALS),
+        'lowerfence': round(inside[0], BOX_DECIMALS),
+        'upperfence': round(inside[-1], BOX_DECIMALS),
+        'outliers': np.unique(outliers.round(decimals))
+    }
+
+
+def quantile_from_counts(counts, levels, q, cumulative=None):
+    """_quantile of the values given how often each of the ascending `levels` occurs"""
+    cumulative = np.cumsum(counts) if cumulative is None else cumulative
+    n = int(cumulative[-1])
+    h = (n - 1) * q
+    lo = int(np.floor(h))
+    below, above = levels[np.searchsorted(cumulative, [lo, min(lo + 1, n - 1)], side='right')]
+    return below + (h - lo) * (above - below)
+
+
+def grid_box_summary(counts, levels):
+    """box_summary_from_counts rounded like box_summary, so boxes from value counts match the ones computed from rows"""
+    summary = box_summary_from_counts(counts, levels)
+    if summary is not None:
+        summary.update({key: round(summary[key], BOX_DECIMALS) for key in ('q1', 'median', 'q3', 'lowerfence', 'upperfence')})
+        summary['outliers'] = np.unique(summary['outliers'].round(3))
+    return summary
+
+
+def box_summary_from_counts(counts, levels=None):
+    """box_summary of values given how often each of `levels` occurs, integers 0..len(counts)-1 by default"""
+    n = int(counts.sum())
+    if n == 0:
+        return None
+    levels = np.arange(len(counts), dtype=np.float64) if levels is None else np.asarray(levels, dtype=np.float64)
+    cumulative = np.cumsum(counts)
+    q1, median, q3 = (quantile_from_counts(counts, levels, q, cumulative) for q in (0.25, 0.5, 0.75))
+    iqr = q3 - q1
+    present = levels[counts > 0]
+    inside = present[(present >= q1 - 1.5 * iqr) & (present <= q3 + 1.5 * iqr)]
+    mean = (levels * counts).sum() / n
+    return {
+        'count': n,
+        'mean': mean,
+        'std': np.sqrt(((levels - mean) ** 2 * counts).sum() / (n - 1)) if n > 1 else np.nan,
+        'q1': q1,
+        'median': median,
+        'q3': q3,
+        'lowerfence': inside[0],
+        'upperfence': inside[-1],
+        'outliers': present[(present < inside[0]) | (present > inside[-1])]
+    }
+
+
+class GenreBoxes:
+    """Energy box summaries per genre for each explicit filter, computed once at load
+
+    Only built when the quantile sketches cannot answer them exactly, see energy_boxes().
+    """
+
+    column = 'energy'
+
+    def __init__(self, frame):
+        engine = get_derived(frame, 'filter_engine')
+        self.summaries = self._summaries(frame, engine, engine.genre_codes)
+        self.n_cells = engine.n_cells
+        self.n_entries = engine.n_entries
+
+    def _summaries(self, frame, engine, genres):
+        values = frame[self.column].to_numpy()
+        return {(genre, explicit): box_summary(values[engine.positions((genre,), explicit)])
+                for genre in genres for explicit in EXPLICIT_STATES}
+
+    def extend(self, frame, start):
+        """Summaries for `frame`, recomputing only the genres listing tracks added after `start`, or None when they add genres"""
+        engine = get_derived(frame, 'filter_engine')
+        if engine.n_cells != self.n_cells:
+            return None
+        codes = np.unique(engine.codes[self.n_entries:] // 2)
+        genres = engine.membership.genres[codes[codes < engine.n_genres]]
+        boxes = copy.copy(self)
+        boxes.summaries = {**self.summaries, **self._summaries(frame, engine, genres)}
+        boxes.n_entries = engine.n_entries
+        return boxes
+
+    def get(self, genre, explicit):
+        return self.summaries.get((genre, explicit))
+
+
+class PopularityHistogram:
+    """Popularity counts per (filter engine cell, track length category), enough for exact box plots"""
+
+    binning = 'length_category'
+
+    def __init__(self, frame):
+        engine = get_derived(frame, 'filter_engine')
+        self.n_cells = engine.n_cells
+        self.n_bins = len(BINNINGS[self.binning]['labels'])
+        self.counts = self.counts_of(frame, engine.codes, engine.tracks)
+        self.n_entries = engine.n_entries
+
+    def counts_of(self, frame, cell_codes, rows=None):
+        """Counts of the rows `rows` of `frame` (all by default) alone, coded by filter engine cell"""
+        rows = np.arange(len(frame)) if rows is None else rows
+        codes = category_codes(frame, self.binning)[rows]
+        popularity = frame['popularity'].to_numpy()[rows]
+        keep = codes >= 0
+        index = (cell_codes * self.n_bins + codes) * POPULARITY_LEVELS + popularity
+        counts = np.bincount(index[keep], minlength=self.n_cells * self.n_bins * POPULARITY_LEVELS)
+        return counts.reshape(self.n_cells, self.n_bins, POPULARITY_LEVELS)
+
+    def extend(self, frame, start):
+        """Histogram of `frame` from the entries added after `start`, or None when they add genres"""
+        engine = get_derived(frame, 'filter_engine')
+        if engine.n_cells != self.n_cells or not is_popularity_integral(frame.iloc[start:]):
+            return None
+        histogram = copy.copy(self)
+        histogram.counts = self.counts + self.counts_of(frame, engine.codes[self.n_entries:], engine.tracks[self.n_entries:])
+        histogram.n_entries = engine.n_entries
+        return histogram
+
+    def query(self, cells):
+        return self.counts[np.asarray(cells, dtype=np.intp)].sum(axis=0)
+
+
+def is_popularity_integral(frame):
+    popularity = frame['popularity']
+    return popularity.dtype.kind in 'iu' and popularity.min() >= 0 and popularity.max() < POPULARITY_LEVELS
+
+
+def energy_boxes(frame):
+    """GenreBoxes of `frame`, or None when its quantile sketches count energy on a level per written value"""
+    sketches = get_derived(frame, 'quantile_sketches')
+    if sketches is not None and sketches.is_exact(GenreBoxes.column):
+        return None
+    return GenreBoxes(frame)
+
+
+register_builder('energy_boxes', energy_boxes)
+register_builder('popularity_histogram', lambda frame: PopularityHistogram(frame) if is_popularity_integral(frame) else None)
+
+
+@timed('aggregation')
+def genre_box_summaries(data, genres):
+    """Energy box summary of each genre in `genres` for the rows of `data`
+
+    Known filter states read the precomputed boxes, or else the energy counts of the quantile sketches.
+    """
+    selection = get_selection(data)
+    boxes = get_derived(data, 'energy_boxes')
+    if selection is not None and boxes is not None:
+        return {genre: boxes.get(genre, selection[1]) for genre in genres}
+    sketches = get_derived(data, 'quantile_sketches')
+    if selection is not None and sketches is not None and GenreBoxes.column in sketches.grids:
+        engine = get_derived(data, 'filter_engine')
+        offsets = [0, 1] if selection[1] is None else [int(selection[1])]
+        levels = sketches.levels(GenreBoxes.column)
+        summaries = {}
+        for genre in genres:
+            code = engine.genre_codes.get(genre)
+            cells = [] if code is None else [code * 2 + offset for offset in offsets]
+            summaries[genre] = grid_box_summary(sketches.counts_of(GenreBoxes.column, cells), levels)
+        return summaries
+
+    rows = with_genres(data)
+    grouped = rows[rows['track_genre'].isin(genres)].groupby('track_genre')[GenreBoxes.column]
+    summaries = {genre: box_summary(values.to_numpy()) for genre, values in grouped}
+    return {genre: summaries.get(genre) for genre in genres}
+
+
+@timed('aggregation')
+def length_box_summaries(data):
+    """Popularity box summary per track length category, None for empty categories"""
+    histogram = get_derived(data, 'popularity_histogram')
+    selection = get_selection(data) if histogram is not None else None
+    cells = get_derived(data, 'filter_engine').cells(*selection) if selection is not None else None
+    labels = BINNINGS['length_category']['labels']
+    if cells is not None:
+        counts = histogram.query(cells)
+        return {label: box_summary_from_counts(counts[i]) for i, label in enumerate(labels)}
+
+    data = unique_tracks(data)
+    codes = category_codes(data, 'length_category').astype(np.intp)
+    popularity = data['popularity'].to_numpy()
+    if is_popularity_integral(data):
+        keep = codes >= 0
+        index = codes[keep] * POPULARITY_LEVELS + popularity[keep]
+        counts = np.bincount(index, minlength=len(labels) * POPULARITY_LEVELS).reshape(len(labels), POPULARITY_LEVELS)
+        return {label: box_summary_from_counts(counts[i]) for i, label in enumerate(labels)}
+    return {label: box_summary(popularity[codes == i]) for i, label in enumerate(labels)}
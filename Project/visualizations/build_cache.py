@@ -0,0 +1,71 @@
+"""Precompute the derived structures and the default view's chart figures into the disk cache
+
+The derived structures answer every filter state, so figures are only stored for the state the app
+opens on (All Genres, All). The cache lives in data/cache/<dataset fingerprint>/ (or $SPOTIFY_CACHE_DIR)
+and is read by the app before computing anything.
+The dataset is the one the app loads, set SPOTIFY_DATASET to use another.
+
+Usage (from the Project directory):
+
+    python -m visualizations.build_cache
+    python -m visualizations.build_cache --charts create_feature_explorer create_energy_by_genre
+"""
+import argparse
+import sys
+import time
+
+from . import CHARTS, get_chart, dataset_columns
+from .dataset import load_dataset
+from .store import prepare, derived_structures
+from .filtering import filter_frame
+from .figure_cache import figure_key
+from .disk_cache import reset, save_derived, save_figure, write_manifest
+
+# (selected genres, explicit filter) the app opens on, the only state whose figures are stored
+DEFAULT_STATES = [(['All Genres'], 'All')]
+
+
+def build_figures(df, charts):
+    """Render and store every chart for the DEFAULT_STATES, returning (stored, failed) counts"""
+    stored, failed = 0, 0
+    for genres, explicit in DEFAULT_STATES:
+        data = filter_frame(df, genres, explicit)
+        for name in charts:
+            func = get_chart(name)
+            try:
+                fig = func(data)
+            except Exception as e:
+                # Left out of the cache, the app builds it on demand and reports the error itself
+                print(f"Skipped {name} for {genres[0]} / {explicit}: {e!r}", file=sys.stderr)
+                failed += 1
+                continue
+            save_figure(figure_key(func, data), fig)
+            stored += 1
+    return stored, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--charts', nargs='+', choices=list(CHARTS), default=list(CHARTS))
+    parser.add_argument('--no-figures', action='store_true', help='only cache the derived structures')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    df = prepare(load_dataset(columns=dataset_columns()))
+    directory = reset(df)
+    print(f"Prepared {len(df):,} tracks in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    if not args.no_figures:
+        start = time.perf_counter()
+        stored, failed = build_figures(df, args.charts)
+        print(f"Rendered {stored:,} figures ({failed:,} skipped) in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    # Saved after the figures so lazily built tables (e.g. extra joint histogram resolutions) are included
+    save_derived(df, derived_structures(df))
+    write_manifest(df)
+    print(f"Cache written to {directory}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
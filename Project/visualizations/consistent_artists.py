@@ -1,24 +1,15 @@
 import plotly.graph_objects as go
-import plotly.express as px
-import pandas as pd
 from .utils import get_modern_layout
+from .artists import artist_stats, MIN_ARTIST_TRACKS
+from .dataset import load_dataset
 
-def create_consistent_artists(data=None):
+def create_consistent_artists(data=None, min_tracks=MIN_ARTIST_TRACKS, include_collabs=True):
 
     if data is None:
-        data = pd.read_csv('data/dataset.csv')
+        data = load_dataset()
 
-    solo_artists_df = data[~data['artists'].str.contains(';', na=False)]
-    
-    artist_stats = solo_artists_df.groupby('artists').agg({
-        'popularity': ['mean', 'std', 'count'],
-        'track_name': 'count'
-    }).round(2)
-    
-    artist_stats.columns = ['avg_popularity', 'popularity_std', 'track_count', 'total_tracks']
-    artist_stats = artist_stats.reset_index()
-    
-    consistent_artists = artist_stats[artist_stats['track_count'] >= 8].copy()
+    # A collaboration counts for every artist it credits, solo tracks alone with include_collabs=False
+    consistent_artists = artist_stats(data, min_tracks, include_collabs).round(2).reset_index()
     
     top_artists = consistent_artists.nlargest(10, 'avg_popularity')
     
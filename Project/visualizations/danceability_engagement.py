@@ -1,17 +1,17 @@
-import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from .utils import get_modern_layout
+from .utils import get_modern_layout, track_labels, compact_array, SCATTER_SAMPLE_SIZE
+from .dataset import load_dataset
+from .sampling import stable_sample
+from .aggregates import grouped_stats
+from .binning import category_labels
 
 def create_danceability_engagement(data=None):
     if data is None:
-        data = pd.read_csv('data/dataset.csv')
+        data = load_dataset()
 
-    data['danceability_range'] = pd.cut(data['danceability'], 
-                                     bins=[0, 0.3, 0.5, 0.9, 1.0], 
-                                     labels=['Low Danceability (0-0.3)', 'Medium Danceability (0.3-0.5)', 'High Danceability (0.5-0.9)', 'Very High Danceability (0.9-1.0)'])
-    
-    engagement_stats = data.groupby('danceability_range').agg({
+    engagement_stats = grouped_stats(data, 'danceability_range', {
         'popularity': ['mean', 'std', 'count'],
         'energy': 'mean',
         'valence': 'mean'
@@ -27,15 +27,16 @@ def create_danceability_engagement(data=None):
         horizontal_spacing=0.15
     )
     
-    sample_df = data.sample(n=min(8000, len(data)), random_state=42)
+    sample_df = stable_sample(data, SCATTER_SAMPLE_SIZE)
+    sample_ranges = category_labels(sample_df, 'danceability_range')
     colors = ['#1DB954', '#f39c12', '#e94560', '#9b59b6']
     
     for i, dance_range in enumerate(engagement_stats['danceability_range']):
-        range_data = sample_df[sample_df['danceability_range'] == dance_range]
+        range_data = sample_df[sample_ranges == dance_range]
         fig.add_trace(
-            go.Scatter(
-                x=range_data['danceability'],
-                y=range_data['popularity'],
+            go.Scattergl(
+                x=compact_array(range_data['danceability']),
+                y=compact_array(range_data['popularity'], np.uint8),
                 mode='markers',
                 name=dance_range,
                 marker=dict(
@@ -44,16 +45,16 @@ def create_danceability_engagement(data=None):
                     opacity=0.7,
                     line=dict(width=0.5, color='#FFFFFF')
                 ),
+                text=track_labels(range_data),
                 hovertemplate=
                 "<b>Track Information</b><br>" +
-                "Track: %{customdata[0]}<br>" +
-                "Artist: %{customdata[1]}<br>" +
+                "%{text}<br>" +
                 "Danceability: %{x:.3f}<br>" +
                 "Popularity: <b>%{y}</b><br>" +
-                "Energy: %{customdata[2]:.3f}<br>" +
-                "Valence: %{customdata[3]:.3f}" +
+                "Energy: %{customdata[0]:.3f}<br>" +
+                "Valence: %{customdata[1]:.3f}" +
                 "<extra></extra>",
-                customdata=range_data[['track_name', 'artists', 'energy', 'valence']].values
+                customdata=compact_array(range_data[['energy', 'valence']])
             ),
             row=1, col=1
         )
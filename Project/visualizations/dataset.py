@@ -0,0 +1,358 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from .binning import BINNINGS, ValueRanges, add_bin_codes, bin_codes, code_column
+from .store import register, frame_fingerprint
+from .tracks import TRACK_ID, GenreMembership, split_tracks
+
+DATA_PATHS = [
+    'data/dataset.csv',
+    './data/dataset.csv',
+    'Project/data/dataset.csv',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'dataset.csv')
+]
+
+SNAPSHOT_SUFFIX = '.feather'
+# Bytes read per step when hashing the CSV
+HASH_CHUNK = 1 << 20
+# Bumped whenever the snapshot layout or dtypes change, so older snapshots are rebuilt
+SNAPSHOT_VERSION = '5'
+
+# Snapshot column listing the genre codes of each track, the names are in the schema metadata
+MEMBERSHIP_COLUMN = 'track_genres'
+
+# Index column pandas wrote into the original CSV, continued for appended rows
+INDEX_COLUMN = 'Unnamed: 0'
+
+# Narrowest dtypes that hold the Spotify value ranges (popularity 0-100, durations under 25 days)
+CSV_DTYPES = {
+    'track_id': 'object',
+    'artists': 'object',
+    'album_name': 'object',
+    'track_name': 'object',
+    'popularity': 'int8',
+    'duration_ms': 'int32',
+    'explicit': 'bool',
+    'danceability': 'float32',
+    'energy': 'float32',
+    'key': 'int8',
+    'loudness': 'float32',
+    'mode': 'int8',
+    'speechiness': 'float32',
+    'acousticness': 'float32',
+    'instrumentalness': 'float32',
+    'liveness': 'float32',
+    'valence': 'float32',
+    'tempo': 'float32',
+    'time_signature': 'int8',
+    'track_genre': 'object'
+}
+
+logger = logging.getLogger(__name__)
+
+
+def find_dataset_path():
+    if os.environ.get('SPOTIFY_DATASET'):
+        return os.environ['SPOTIFY_DATASET']
+    for path in DATA_PATHS:
+        if os.path.exists(path):
+            return path
+    return DATA_PATHS[0]
+
+
+def snapshot_path(csv_path):
+    return os.path.splitext(csv_path)[0] + SNAPSHOT_SUFFIX
+
+
+def read_csv(csv_path, columns=None):
+    return pd.read_csv(csv_path, dtype=CSV_DTYPES, usecols=columns)
+
+
+def compact_frame(df, columns=None):
+    """`df` restricted to `columns` with the narrow CSV_DTYPES, for frames that did not come from read_csv"""
+    if columns is not None:
+        df = df[[column for column in df.columns if column in columns]]
+    return df.astype({column: dtype for column, dtype in CSV_DTYPES.items() if column in df.columns})
+
+
+def tracks_from_rows(rows, columns=None, fingerprint=None):
+    """Registered track table of `rows`, which list a track once per genre like the CSV, with its bin codes
+
+    The genre membership is registered with it. The TRACK_ID column is only kept when `columns` include it.
+    """
+    fingerprint = fingerprint or frame_fingerprint(rows)
+    tracks, membership = split_tracks(rows)
+    if columns is not None and TRACK_ID not in columns:
+        tracks = tracks.drop(columns=TRACK_ID, errors='ignore')
+    return register(add_bin_codes(tracks), {'genre_membership': membership}, fingerprint)
+
+
+def file_signature(csv_path):
+    """(size, mtime) of the CSV, the cheap check for whether it changed"""
+    stat = os.stat(csv_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _source_metadata(signature):
+    return {
+        b'source_size': str(signature[0]).encode(),
+        b'source_mtime_ns': str(signature[1]).encode(),
+        b'snapshot_version': SNAPSHOT_VERSION.encode()
+    }
+
+
+def _bytes_fingerprint(data):
+    return f"{len(data):x}-{hashlib.sha1(data).hexdigest()[:16]}"
+
+
+def dataset_fingerprint(csv_path, appended=b''):
+    """Version of the CSV's contents, its size and content hash, so touching the file keeps the version
+
+    With `appended`, the version the CSV will have once those bytes are appended to it.
+    """
+    digest = hashlib.sha1()
+    size = 0
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    digest.update(appended)
+    size += len(appended)
+    return f"{size:x}-{digest.hexdigest()[:16]}"
+
+
+def appended_fingerprint(fingerprint, appended):
+    """Version of the CSV of `fingerprint` once the bytes `appended` are appended to it, without rereading it
+
+    Chained rather than a content hash, so a snapshot rebuilt from the grown CSV gets another version
+    and its cached structures are derived again once.
+    """
+    size = int(fingerprint.split('-')[0], 16) + len(appended)
+    return f"{size:x}-{hashlib.sha1(fingerprint.encode() + appended).hexdigest()[:16]}"
+
+
+def _snapshot_metadata(snap_path):
+    import pyarrow as pa
+
+    with pa.memory_map(snap_path) as source:
+        return pa.ipc.open_file(source).schema.metadata or {}
+
+
+def snapshot_is_stale(csv_path, snap_path=None):
+    """True when the snapshot is missing or was not built from the current CSV"""
+    snap_path = snap_path or snapshot_path(csv_path)
+    if not os.path.exists(snap_path):
+        return True
+    if not os.path.exists(csv_path):
+        return False
+
+    metadata = _snapshot_metadata(snap_path)
+    expected = _source_metadata(file_signature(csv_path))
+    return any(metadata.get(key) != value for key, value in expected.items())
+
+
+def _membership_column(membership, start, stop):
+    """Genre codes of the tracks `start` to `stop` as a list column"""
+    import pyarrow as pa
+
+    listed = (membership.tracks >= start) & (membership.tracks < stop)
+    tracks, genre_codes = membership.tracks[listed], membership.genre_codes[listed]
+    order = np.lexsort((genre_codes, tracks))
+    offsets = np.searchsorted(tracks[order], np.arange(start, stop + 1)).astype(np.int32)
+    return pa.ListArray.from_arrays(pa.array(offsets), pa.array(genre_codes[order], type=pa.int16()))
+
+
+def _dataset_metadata(ranges, next_index):
+    """Schema metadata an append reads instead of the CSV and the old tracks: their value ranges and the next index"""
+    return {b'value_ranges': json.dumps(ranges.ranges).encode(), b'next_index': str(next_index).encode()}
+
+
+def _with_membership(table, membership):
+    """`table` with the genre codes of every track as a list column and the genre names in its metadata"""
+    table = table.append_column(MEMBERSHIP_COLUMN, _membership_column(membership, 0, table.num_rows))
+    genres = json.dumps([str(genre) for genre in membership.genres]).encode()
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), b'genres': genres})
+
+
+def build_snapshot(csv_path, snap_path=None):
+    """Convert the CSV into an uncompressed Arrow IPC (Feather v2) file that can be memory-mapped
+
+    The snapshot holds the track table with its bin codes, ordered for the filters, and the genre
+    membership, so the loaded frame needs no deduplication, re-sorting or re-binning.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    snap_path = snap_path or snapshot_path(csv_path)
+    # Parse the bytes that were hashed, so the recorded fingerprint always matches the rows
+    with open(csv_path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        signature = (stat.st_size, stat.st_mtime_ns)
+        data = f.read()
+    rows = read_csv(io.BytesIO(data))
+    next_index = int(rows[INDEX_COLUMN].max()) + 1 if INDEX_COLUMN in rows.columns and len(rows) else len(rows)
+    tracks, membership = split_tracks(rows)
+    table = _with_membership(pa.Table.from_pandas(add_bin_codes(tracks), preserve_index=False), membership)
+    metadata = {**_dataset_metadata(ValueRanges.of(tracks), next_index), **_source_metadata(signature),
+                b'source_fingerprint': _bytes_fingerprint(data).encode()}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+
+    # Write next to the target and rename so concurrent workers never map a partial file
+    tmp_path = f'{snap_path}.{os.getpid()}.tmp'
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, snap_path)
+    return snap_path
+
+
+def appended_snapshot(snap_path, delta, membership, next_index):
+    """Snapshot table with the new tracks `delta` appended, to be written once their rows are in the CSV
+
+    The existing columns are reused as mapped, only the delta is converted and binned, on the stored value
+    ranges widened by its own. A code column is recomputed for every track only when the delta moved its
+    edges, the membership column only when it adds a genre or lists existing tracks under new ones.
+    Every column the snapshot holds must be in `delta`.
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(snap_path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    metadata = table.schema.metadata
+    old_ranges = ValueRanges(json.loads(metadata[b'value_ranges']))
+    code_columns = {code_column(name): name for name in BINNINGS if code_column(name) in table.column_names}
+    columns = [name for name in table.column_names if name not in code_columns and name != MEMBERSHIP_COLUMN]
+    missing = [column for column in columns if column not in delta.columns]
+    if missing:
+        raise ValueError(f"Delta is missing columns: {', '.join(missing)}")
+    delta = compact_frame(delta, columns)[columns]
+    ranges = old_ranges.merge(ValueRanges.of(delta))
+    for column, name in code_columns.items():
+        delta[column] = bin_codes(delta[BINNINGS[name]['column']], name, ranges.edges(name))
+    n_tracks = table.num_rows
+    stored = table.drop_columns([MEMBERSHIP_COLUMN])
+    added = pa.Table.from_pandas(delta[stored.column_names], schema=stored.schema, preserve_index=False)
+    added = added.append_column(table.schema.field(MEMBERSHIP_COLUMN), _membership_column(membership, n_tracks, n_tracks + len(delta)))
+    combined = pa.concat_tables([table, added])
+
+    for column, name in code_columns.items():
+        if not np.array_equal(old_ranges.edges(name), ranges.edges(name)):
+            values = combined.column(BINNINGS[name]['column']).to_numpy()
+            codes = pa.array(bin_codes(values, name, ranges.edges(name)))
+            combined = combined.set_column(combined.column_names.index(column), table.schema.field(column), codes)
+    old_pairs = sum(len(chunk.flatten()) for chunk in table.column(MEMBERSHIP_COLUMN).chunks)
+    genres = [str(genre) for genre in membership.genres]
+    if genres != json.loads(metadata[b'genres']) or len(membership.tracks) - old_pairs != np.count_nonzero(membership.tracks >= n_tracks):
+        index = combined.column_names.index(MEMBERSHIP_COLUMN)
+        combined = combined.set_column(index, table.schema.field(MEMBERSHIP_COLUMN), _membership_column(membership, 0, combined.num_rows))
+
+    # One buffer per column, so the loaded frame still maps the snapshot without copying
+    metadata = {**metadata, b'genres': json.dumps(genres).encode(), **_dataset_metadata(ranges, next_index)}
+    return combined.combine_chunks().replace_schema_metadata(metadata)
+
+
+def write_snapshot(table, csv_path, fingerprint, snap_path=None):
+    """Write `table` as the snapshot of the CSV as it is now, whose dataset_fingerprint is `fingerprint`"""
+    import pyarrow.feather as feather
+
+    snap_path = snap_path or snapshot_path(csv_path)
+    metadata = {**_source_metadata(file_signature(csv_path)), b'source_fingerprint': fingerprint.encode()}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+
+    tmp_path = f'{snap_path}.{os.getpid()}.tmp'
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, snap_path)
+    return snap_path
+
+
+def _with_code_columns(columns):
+    return None if columns is None else list(columns) + [code_column(name) for name in BINNINGS]
+
+
+def read_snapshot(snap_path, columns=None):
+    import pyarrow as pa
+
+    # Uncompressed IPC buffers point straight into the mapping, so workers on one host share the page cache
+    source = pa.memory_map(snap_path)
+    table = pa.ipc.open_file(source).read_all()
+    table = table.select([name for name in table.column_names if name != MEMBERSHIP_COLUMN and (columns is None or name in columns)])
+    return table.to_pandas(split_blocks=True)
+
+
+def read_membership(snap_path):
+    """Genre membership stored in the snapshot"""
+    import pyarrow as pa
+
+    table = pa.ipc.open_file(pa.memory_map(snap_path)).read_all()
+    column = table.column(MEMBERSHIP_COLUMN).combine_chunks()
+    offsets = column.offsets.to_numpy()
+    tracks = np.repeat(np.arange(len(column), dtype=np.int32), np.diff(offsets))
+    genres = json.loads(table.schema.metadata[b'genres'])
+    return GenreMembership(tracks, column.flatten().to_numpy(), genres)
+
+
+def _snapshot_errors():
+    """Errors that leave the snapshot unusable, so the loader reads the CSV instead
+
+    pyarrow missing, an unwritable or vanished file, metadata or columns of another layout, or a file
+    that is not Arrow IPC. Anything else is a bug and propagates.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return ImportError, OSError, KeyError
+    return ImportError, OSError, KeyError, pa.ArrowInvalid
+
+
+def load_dataset(csv_path=None, columns=None):
+    """Load the track table from its memory-mapped snapshot, rebuilding it when stale and falling back to CSV
+
+    With `columns`, only those columns (and their bin codes) are materialized, the TRACK_ID only when
+    listed. Tracks come in snapshot order: explicit flag, then first row in the CSV, followed by any
+    tracks appended since the snapshot was built. The frame is registered with its genre membership and value ranges.
+    """
+    csv_path = csv_path or find_dataset_path()
+    try:
+        snap_path = snapshot_path(csv_path)
+        if snapshot_is_stale(csv_path, snap_path):
+            build_snapshot(csv_path, snap_path)
+        df = add_bin_codes(read_snapshot(snap_path, _with_code_columns(columns)))
+        metadata = _snapshot_metadata(snap_path)
+        ranges = ValueRanges(json.loads(metadata[b'value_ranges']))
+        return register(df, {'genre_membership': read_membership(snap_path), 'value_ranges': ranges}, metadata[b'source_fingerprint'].decode())
+    except _snapshot_errors() as e:
+        logger.warning("Snapshot of %s unusable (%r), reading the CSV", csv_path, e)
+        fingerprint = dataset_fingerprint(csv_path)
+        rows = read_csv(csv_path, None if columns is None else sorted(set(columns) | {TRACK_ID, 'track_genre', 'explicit'}))
+        return tracks_from_rows(rows, columns, fingerprint)
+
+
+if __name__ == '__main__':
+    from . import dataset_columns
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else find_dataset_path()
+
+    start = time.perf_counter()
+    read_csv(csv_path)
+    csv_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snap_path = build_snapshot(csv_path)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read_snapshot(snap_path)
+    snapshot_seconds = time.perf_counter() - start
+
+    # Every column at 64-bit width, as the app loaded it before the column manifest
+    wide_dtypes = {column: {'i': 'int64', 'f': 'float64'}.get(pd.api.types.pandas_dtype(dtype).kind, dtype) for column, dtype in CSV_DTYPES.items()}
+    full_mb = pd.read_csv(csv_path, dtype=wide_dtypes).memory_usage(deep=True).sum() / 1024 / 1024
+    pruned_mb = load_dataset(csv_path, dataset_columns()).memory_usage(deep=True).sum() / 1024 / 1024
+
+    print(f"Snapshot written to {snap_path} in {build_seconds:.2f}s")
+    print(f"CSV parse: {csv_seconds * 1000:.0f} ms | snapshot load: {snapshot_seconds * 1000:.0f} ms")
+    print(f"Frame memory: {full_mb:.1f} MB all columns at 64-bit | {pruned_mb:.1f} MB pruned and downcast")
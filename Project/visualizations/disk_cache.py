@@ -0,0 +1,158 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+CACHE_DIR = os.environ.get('SPOTIFY_CACHE_DIR')
+
+MANIFEST_FILE = 'manifest.json'
+DERIVED_FILE = 'derived.pkl'
+FIGURES_DIR = 'figures'
+
+# Stands in for the dataset frame inside derived.pkl, the loaded frame takes its place on read
+FRAME_ID = 'frame'
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Hash of the package sources, so a cache written by other code is never read"""
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(package_dir)):
+        if name.endswith('.py'):
+            with open(os.path.join(package_dir, name), 'rb') as f:
+                digest.update(name.encode() + f.read())
+    return digest.hexdigest()[:16]
+
+
+def cache_root():
+    from .dataset import find_dataset_path
+
+    return CACHE_DIR or os.path.join(os.path.dirname(os.path.abspath(find_dataset_path())), 'cache')
+
+
+def cache_dir(fingerprint):
+    return os.path.join(cache_root(), fingerprint)
+
+
+def _row_digest(frame):
+    # Structures index rows by position, so the same rows in another order must not match
+    digest = hashlib.sha1()
+    for column in ('popularity', 'explicit', 'duration_ms'):
+        if column in frame.columns:
+            digest.update(frame[column].to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _manifest(frame):
+    return {
+        'code_version': code_version(),
+        'columns': list(frame.columns),
+        'rows': len(frame),
+        'row_digest': _row_digest(frame)
+    }
+
+
+def _read_manifest(fingerprint):
+    try:
+        with open(os.path.join(cache_dir(fingerprint), MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_valid(fingerprint, frame=None):
+    """True when the cache of `fingerprint` was written by this code, for `frame`'s columns when given"""
+    manifest = _read_manifest(fingerprint)
+    if manifest is None or manifest.get('code_version') != code_version():
+        return False
+    return frame is None or manifest == _manifest(frame)
+
+
+def _write_atomic(path, data):
+    # Write next to the target and rename so readers never see a partial file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def reset(frame):
+    """Empty the cache directory of `frame` unless it is valid for it, and return the directory"""
+    fingerprint = frame.attrs['fingerprint']
+    directory = cache_dir(fingerprint)
+    if not is_valid(fingerprint, frame):
+        shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(os.path.join(directory, FIGURES_DIR), exist_ok=True)
+    return directory
+
+
+def write_manifest(frame):
+    directory = cache_dir(frame.attrs['fingerprint'])
+    _write_atomic(os.path.join(directory, MANIFEST_FILE), json.dumps(_manifest(frame), indent=2).encode())
+
+
+class _FramePickler(pickle.Pickler):
+    def __init__(self, file, frame):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.frame = frame
+
+    def persistent_id(self, obj):
+        return FRAME_ID if obj is self.frame else None
+
+
+class _FrameUnpickler(pickle.Unpickler):
+    def __init__(self, file, frame):
+        super().__init__(file)
+        self.frame = frame
+
+    def persistent_load(self, pid):
+        if pid != FRAME_ID:
+            raise pickle.UnpicklingError(f'Unknown persistent id: {pid}')
+        return self.frame
+
+
+def save_derived(frame, derived):
+    """Pickle the derived structures of `frame`, which is stored by reference rather than copied"""
+    directory = cache_dir(frame.attrs['fingerprint'])
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f'{DERIVED_FILE}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        _FramePickler(f, frame).dump(derived)
+    os.replace(tmp_path, os.path.join(directory, DERIVED_FILE))
+
+
+def load_derived(frame):
+    """Derived structures pickled for `frame`, or an empty dict when there is no valid cache"""
+    fingerprint = frame.attrs.get('fingerprint')
+    if fingerprint is None or not is_valid(fingerprint, frame):
+        return {}
+    try:
+        with open(os.path.join(cache_dir(fingerprint), DERIVED_FILE), 'rb') as f:
+            return _FrameUnpickler(f, frame).load()
+    except Exception:
+        return {}
+
+
+def figure_path(key):
+    """Path of the figure stored under a figure_cache key, (chart, genres, explicit, fingerprint, options)"""
+    name = hashlib.sha1(repr(key).encode()).hexdigest()
+    return os.path.join(cache_dir(key[3]), FIGURES_DIR, f'{name}.json')
+
+
+def save_figure(key, fig):
+    _write_atomic(figure_path(key), fig.to_json().encode())
+
+
+def load_figure(key):
+    """Figure stored under `key`, or None when it was not precomputed"""
+    path = figure_path(key)
+    if not os.path.exists(path) or not is_valid(key[3]):
+        return None
+    from .frozen_figure import FrozenFigure
+
+    with open(path) as f:
+        # Stored figures were validated when they were built
+        return FrozenFigure(f.read())
@@ -1,29 +1,32 @@
 import plotly.graph_objects as go
-import plotly.express as px
 from .utils import get_modern_layout
+from .box_stats import genre_box_summaries
+from .aggregates import genre_counts
+from .dataset import load_dataset
 
 def create_energy_by_genre(data=None):
     if data is None:
-        import pandas as pd
-        data = pd.read_csv('data/dataset.csv')
+        data = load_dataset()
 
-    top_genres = data['track_genre'].value_counts().head(10).index
-    filtered_df = data[data['track_genre'].isin(top_genres)]
-    
+    top_genres = genre_counts(data).head(10).index
+    summaries = genre_box_summaries(data, top_genres)
 
-    genre_stats = filtered_df.groupby('track_genre')['energy'].agg(['mean', 'median', 'std', 'count']).round(3)
-    genre_stats = genre_stats.reindex(top_genres)  
-    
     fig = go.Figure()
     
     colors = ['#43E97B', '#3AE571', '#32E168', '#29DD5E', '#20D955', '#18D54B', '#0FD142', '#1DB954', '#15B54A', '#0CB240']
     
     for i, genre in enumerate(top_genres):
-        genre_data = filtered_df[filtered_df['track_genre'] == genre]['energy']
-        genre_info = genre_stats.loc[genre]
+        genre_info = summaries[genre]
+        if genre_info is None:
+            continue
         
         fig.add_trace(go.Box(
-            y=genre_data,
+            x=[genre.title()],
+            q1=[genre_info['q1']],
+            median=[genre_info['median']],
+            q3=[genre_info['q3']],
+            lowerfence=[genre_info['lowerfence']],
+            upperfence=[genre_info['upperfence']],
             name=genre.title(), 
             marker=dict(
                 color=colors[i],
@@ -32,8 +35,7 @@ def create_energy_by_genre(data=None):
             line=dict(color='#FFFFFF', width=2),
             fillcolor=colors[i],
             opacity=0.8,
-            boxpoints='outliers',  
-            pointpos=0,
+            boxpoints=False,
             hovertemplate=
             "<b>%{fullData.name}</b><br>" +
             f"Sample Count: <b>{genre_info['count']:,}</b><br>" +
@@ -41,9 +43,20 @@ def create_energy_by_genre(data=None):
             f"Median Energy: <b>{genre_info['median']:.3f}</b><br>" +
             f"Std Deviation: <b>{genre_info['std']:.3f}</b><br>" +
             "Energy Range: %{y:.3f}<br>" +
-            "<extra></extra>",
-            customdata=[genre_info['count'], genre_info['mean'], genre_info['median'], genre_info['std']]
+            "<extra></extra>"
         ))
+        
+        # Outliers are shipped as distinct values only, drawn over the box
+        if len(genre_info['outliers']):
+            fig.add_trace(go.Scatter(
+                x=[genre.title()] * len(genre_info['outliers']),
+                y=genre_info['outliers'],
+                mode='markers',
+                name=genre.title(),
+                marker=dict(color=colors[i], size=6, line=dict(color='#FFFFFF', width=1)),
+                opacity=0.8,
+                hovertemplate="<b>%{x}</b><br>Energy: %{y:.3f}<extra></extra>"
+            ))
     
     layout_update = get_modern_layout()
     layout_update.update(dict(
@@ -1,15 +1,19 @@
+import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from .utils import get_modern_layout
+from .utils import get_modern_layout, track_labels, compact_array, SCATTER_SAMPLE_SIZE
+from .dataset import load_dataset
+from .sampling import stable_sample
+from .aggregates import grouped_stats
+from .binning import category_labels
 
 def create_energy_time_analysis(data=None):
     if data is None:
-        import pandas as pd
-        data = pd.read_csv('data/dataset.csv')
+        data = load_dataset()
     
-    sample_df = data.sample(n=min(12000, len(data)), random_state=42)
+    sample_df = stable_sample(data, SCATTER_SAMPLE_SIZE)
     
-    sample_df['energy_category'] = sample_df['energy'].apply(lambda x: 'High Energy (0.7+)' if x >= 0.7 else 'Medium Energy (0.4-0.7)' if x >= 0.4 else 'Low Energy (0-0.4)')
+    sample_categories = category_labels(sample_df, 'energy_category')
     
     fig = make_subplots(
         rows=2, cols=1,
@@ -31,12 +35,12 @@ def create_energy_time_analysis(data=None):
     }
     
     for category in ordered_categories:
-        if category in sample_df['energy_category'].unique():
-            category_data = sample_df[sample_df['energy_category'] == category]
+        category_data = sample_df[sample_categories == category]
+        if not category_data.empty:
             fig.add_trace(
-                go.Scatter(
-                    x=category_data['energy'],
-                    y=category_data['popularity'],
+                go.Scattergl(
+                    x=compact_array(category_data['energy']),
+                    y=compact_array(category_data['popularity'], np.uint8),
                     mode='markers',
                     name=category,
                     marker=dict(
@@ -45,20 +49,19 @@ def create_energy_time_analysis(data=None):
                         opacity=0.7,
                         line=dict(width=0.5, color='#FFFFFF')
                     ),
+                    text=track_labels(category_data),
                     hovertemplate=
                     "<b>Track Information</b><br>" +
-                    "Track: <b>%{customdata[0]}</b><br>" +
-                    "Artist: <b>%{customdata[1]}</b><br>" +
+                    "<b>%{text}</b><br>" +
                     "Energy: <b>%{x:.3f}</b><br>" +
                     "Popularity: <b>%{y}</b><br>" +
                     "Category: <b>" + category + "</b>" +
-                    "<extra></extra>",
-                    customdata=category_data[['track_name', 'artists']].values
+                    "<extra></extra>"
                 ),
                 row=1, col=1
             )
     
-    energy_stats = data.groupby(data['energy'].apply(lambda x: 'High Energy (0.7+)' if x >= 0.7 else 'Medium Energy (0.4-0.7)' if x >= 0.4 else 'Low Energy (0-0.4)'))['popularity'].agg(['mean', 'count', 'std']).reset_index()
+    energy_stats = grouped_stats(data, 'energy_category', {'popularity': ['mean', 'count', 'std']}).reset_index()
     energy_stats.columns = ['energy_category', 'avg_popularity', 'track_count', 'std_popularity']
     
     energy_stats['order'] = energy_stats['energy_category'].map({'Low Energy (0-0.4)': 0, 'Medium Energy (0.4-0.7)': 1, 'High Energy (0.7+)': 2})
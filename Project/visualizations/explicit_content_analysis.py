@@ -1,14 +1,14 @@
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import plotly.express as px
 from .utils import get_modern_layout
+from .dataset import load_dataset
+from .aggregates import grouped_stats
 
 def create_explicit_content_analysis(data=None):
     if data is None:
-        import pandas as pd
-        data = pd.read_csv('data/dataset.csv')
+        data = load_dataset()
 
-    explicit_stats = data.groupby('explicit').agg({
+    explicit_stats = grouped_stats(data, 'explicit', {
         'popularity': ['mean', 'std', 'count']
     }).round(2)
     
@@ -16,7 +16,7 @@ def create_explicit_content_analysis(data=None):
     explicit_stats = explicit_stats.reset_index()
     explicit_stats['label'] = explicit_stats['explicit'].map({True: 'Explicit', False: 'Clean'})
     
-    genre_explicit = data.groupby(['track_genre', 'explicit'])['popularity'].mean().unstack(fill_value=0)
+    genre_explicit = grouped_stats(data, ['track_genre', 'explicit'], {'popularity': 'mean'})['popularity'].unstack(fill_value=0)
     top_genres_explicit = genre_explicit.head(10)
     
     fig = make_subplots(
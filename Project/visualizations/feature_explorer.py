@@ -0,0 +1,85 @@
+import numpy as np
+import plotly.graph_objects as go
+from .utils import get_modern_layout
+from .dataset import load_dataset
+from .joint_histograms import joint_popularity, FEATURE_LABELS
+
+
+def _range_labels(edges):
+    precision = 2 if edges[-1] - edges[0] <= 2 else 0
+    return [f'{low:.{precision}f} - {high:.{precision}f}' for low, high in zip(edges[:-1], edges[1:])]
+
+
+def create_feature_explorer(data=None, x_feature='danceability', y_feature='energy', resolution=8):
+
+    if data is None:
+        data = load_dataset()
+
+    if x_feature == y_feature or data.empty:
+        fig = go.Figure()
+        fig.add_annotation(
+            text="Pick two different audio features" if x_feature == y_feature else "No data available for the selected filters",
+            xref="paper", yref="paper",
+            x=0.5, y=0.5,
+            showarrow=False,
+            font=dict(size=16, color='#B8B8B8')
+        )
+        layout_update = get_modern_layout()
+        fig.update_layout(**layout_update)
+        return fig
+
+    count, mean, y_edges, x_edges = joint_popularity(data, y_feature, x_feature, resolution)
+
+    colorscale = [
+        [0, '#1a1a2e'],
+        [0.25, '#16213e'],
+        [0.5, '#0f3460'],
+        [0.75, '#e94560'],
+        [1, '#f1c40f']
+    ]
+
+    fig = go.Figure(go.Heatmap(
+        z=np.round(mean, 2),
+        x=_range_labels(x_edges),
+        y=_range_labels(y_edges),
+        customdata=count,
+        colorscale=colorscale,
+        hoverongaps=False,
+        hovertemplate=
+        f"{FEATURE_LABELS[x_feature]}: <b>%{{x}}</b><br>" +
+        f"{FEATURE_LABELS[y_feature]}: <b>%{{y}}</b><br>" +
+        "Avg Popularity: <b>%{z:.1f}</b><br>" +
+        "Tracks: <b>%{customdata:,}</b>" +
+        "<extra></extra>",
+        colorbar=dict(
+            title="Popularity",
+            title_font=dict(color='#FFFFFF', size=12),
+            tickfont=dict(color='#FFFFFF', size=10)
+        )
+    ))
+
+    layout_update = get_modern_layout()
+    layout_update.update(dict(
+        height=600,
+        title_text="",
+        xaxis_title=f"<b>{FEATURE_LABELS[x_feature]}</b>",
+        yaxis_title=f"<b>{FEATURE_LABELS[y_feature]}</b>",
+        margin=dict(l=110, r=80, t=40, b=110),
+        xaxis=dict(
+            tickangle=45,
+            tickfont=dict(size=10),
+            color='#B8B8B8'
+        ),
+        yaxis=dict(
+            tickfont=dict(size=10),
+            color='#B8B8B8'
+        ),
+        hoverlabel=dict(
+            bgcolor="rgba(25, 25, 25, 0.9)",
+            bordercolor="rgba(29, 185, 84, 0.5)",
+            font_color="white"
+        )
+    ))
+
+    fig.update_layout(**layout_update)
+    return fig
@@ -0,0 +1,103 @@
+import inspect
+import os
+import threading
+from collections import OrderedDict
+from .store import get_selection
+from .disk_cache import load_figure
+
+FIGURE_CACHE_MB = float(os.environ.get('FIGURE_CACHE_MB', 64))
+
+
+class FigureCache:
+    """Process-wide LRU of built figures, bounded by the size of their serialized JSON"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        # A lookup that leaves the hit and miss counters and the LRU order alone
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, fig, size=None):
+        size = size if size is not None else len(fig.to_json())
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return fig
+            self._entries[key] = (fig, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+        return fig
+
+    def get_or_build(self, key, build):
+        fig = self.get(key)
+        if fig is None:
+            fig = self.put(key, build())
+        return fig
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+figure_cache = FigureCache(int(FIGURE_CACHE_MB * 1024 * 1024))
+
+
+def _chart_options(func, kwargs):
+    """`kwargs` completed with func's defaults, so passing a default explicitly gives the same key"""
+    bound = inspect.signature(func).bind_partial(**kwargs)
+    bound.apply_defaults()
+    return tuple(sorted((name, value) for name, value in bound.arguments.items() if name != 'data'))
+
+
+def figure_key(func, data, **kwargs):
+    """(chart, genres, explicit, dataset fingerprint, chart options), or None when `data` is not a known filter state"""
+    selection = get_selection(data)
+    if selection is None:
+        return None
+    return (f'{func.__module__}.{func.__qualname__}',) + selection + (data.attrs['fingerprint'], _chart_options(func, kwargs))
+
+
+def cached_figure(func, data, **kwargs):
+    """func(data, **kwargs) as a FrozenFigure, reused from the figure cache or the precomputed disk cache when available"""
+    key = figure_key(func, data, **kwargs)
+    if key is None:
+        return func(data, **kwargs)
+
+    def build():
+        from .frozen_figure import freeze
+
+        fig = load_figure(key)
+        return fig if fig is not None else freeze(func(data, **kwargs))
+
+    return figure_cache.get_or_build(key, build)
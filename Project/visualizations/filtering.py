@@ -0,0 +1,194 @@
+import copy
+import threading
+from collections import OrderedDict
+import numpy as np
+from .sql_backend import sql_database
+from .store import register_builder, get_derived, canonical_filters, stamp_selection
+
+MEMO_SIZE = 8
+
+COLUMNS = ['track_genre', 'explicit']
+
+
+def _cell_ranges(codes, offset=0):
+    """(cell, start, stop) of every run of equal codes, positions shifted by `offset`"""
+    starts = np.r_[0, np.flatnonzero(codes[1:] != codes[:-1]) + 1] if len(codes) else np.array([], dtype=np.intp)
+    stops = np.r_[starts[1:], len(codes)]
+    return [(int(cell), int(start) + offset, int(stop) + offset) for cell, start, stop in zip(codes[starts], starts, stops)]
+
+
+def _as_positions(positions):
+    """A slice when the ascending `positions` are one contiguous block, otherwise the array itself"""
+    if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+        return slice(int(positions[0]), int(positions[-1]) + 1)
+    return positions.astype(np.intp)
+
+
+class FilterEngine:
+    """Resolves a filter state to positions in the track table and memoizes the resulting views
+
+    Genres are looked up in the genre membership, the explicit flag is a column of the track table.
+    Derived structures aggregate over entries: one per (track, genre) pair of the membership, then one
+    per track under the extra "All Genres" genre `n_genres`. Entries are coded by (genre, explicit) cell.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.membership = get_derived(frame, 'genre_membership')
+        self.genre_codes = {genre: code for code, genre in enumerate(self.membership.genres)}
+        self.n_genres = len(self.membership.genres)
+        self.explicit = frame['explicit'].to_numpy(dtype=bool)
+        # Per-genre sums count every selected track once only when no track is listed under two genres
+        self.disjoint = self.membership.is_disjoint()
+
+        all_tracks = np.arange(len(frame), dtype=np.int32)
+        self.tracks = np.concatenate([self.membership.tracks, all_tracks])
+        genre_codes = np.concatenate([self.membership.genre_codes.astype(np.intp), np.full(len(frame), self.n_genres, dtype=np.intp)])
+        self.codes = genre_codes * 2 + self.explicit[self.tracks]
+
+        # Tracks are stored by explicit flag, so each "All Genres" state is a few runs of positions
+        self.ranges = {}
+        for flag, start, stop in _cell_ranges(self.explicit.astype(np.intp)):
+            self.ranges.setdefault(flag, []).append((start, stop))
+
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_memo'], state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def n_entries(self):
+        return len(self.tracks)
+
+    def extend(self, frame, start):
+        """Engine for `frame`, whose first `start` tracks are this engine's frame, or None when it adds genres
+
+        Entries of the new membership pairs and of the appended tracks follow the existing entries, so
+        structures indexed by entry extend from `n_entries` on.
+        """
+        membership = get_derived(frame, 'genre_membership')
+        if not np.array_equal(membership.genres, self.membership.genres):
+            return None
+        n_tracks = len(frame)
+        old_pairs = self.membership.genre_codes.astype(np.int64) * n_tracks + self.membership.tracks
+        pairs = np.setdiff1d(membership.genre_codes.astype(np.int64) * n_tracks + membership.tracks, old_pairs)
+        explicit = frame['explicit'].to_numpy(dtype=bool)
+        new_tracks = np.concatenate([pairs % n_tracks, np.arange(start, n_tracks)]).astype(np.int32)
+        genre_codes = np.concatenate([pairs // n_tracks, np.full(n_tracks - start, self.n_genres)]).astype(np.intp)
+
+        engine = copy.copy(self)
+        engine.frame = frame
+        engine.membership = membership
+        engine.explicit = explicit
+        engine.disjoint = membership.is_disjoint()
+        engine.tracks = np.concatenate([self.tracks, new_tracks])
+        engine.codes = np.concatenate([self.codes, genre_codes * 2 + explicit[new_tracks]])
+        engine.ranges = {flag: list(ranges) for flag, ranges in self.ranges.items()}
+        for flag, run_start, run_stop in _cell_ranges(explicit[start:].astype(np.intp), start):
+            engine.ranges.setdefault(flag, []).append((run_start, run_stop))
+        engine._memo = OrderedDict()
+        engine._lock = threading.Lock()
+        return engine
+
+    def genre_index(self, genres):
+        """Sorted codes of the known genres among `genres`"""
+        return sorted(self.genre_codes[g] for g in genres if g in self.genre_codes)
+
+    def cells(self, genres, explicit):
+        """Cells whose entries hold every selected track once, or None when the selected genres share tracks
+
+        "All Genres" states read the cells of the extra genre.
+        """
+        explicit_index = (0, 1) if explicit is None else (int(explicit),)
+        if genres is None:
+            genre_index = [self.n_genres]
+        else:
+            genre_index = self.genre_index(genres)
+            if len(genre_index) > 1 and not self.disjoint:
+                return None
+        return [g * 2 + e for g in genre_index for e in explicit_index]
+
+    @property
+    def n_cells(self):
+        return (self.n_genres + 1) * 2
+
+    def positions(self, genres, explicit):
+        """A slice when the selected tracks are one contiguous block, otherwise an ascending array of their positions"""
+        if genres is None:
+            flags = (0, 1) if explicit is None else (int(explicit),)
+            ranges = sorted(r for flag in flags for r in self.ranges.get(flag, ()))
+            merged = []
+            for start, stop in ranges:
+                if merged and merged[-1][1] == start:
+                    merged[-1] = (merged[-1][0], stop)
+                else:
+                    merged.append((start, stop))
+            if len(merged) == 1:
+                return slice(*merged[0])
+            if not merged:
+                return np.array([], dtype=np.intp)
+            return np.concatenate([np.arange(start, stop) for start, stop in merged])
+
+        tracks = [self.membership.tracks_of(code) for code in self.genre_index(genres)]
+        if not tracks:
+            return np.array([], dtype=np.intp)
+        tracks = np.unique(np.concatenate(tracks)) if len(tracks) > 1 else tracks[0]
+        if explicit is not None:
+            tracks = tracks[self.explicit[tracks] == explicit]
+        return _as_positions(tracks)
+
+    def select(self, selected_genres, explicit_filter):
+        key = canonical_filters(selected_genres, explicit_filter)
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+
+        # With the duckdb backend the filter state is a WHERE clause like every other query
+        database = sql_database(self.frame)
+        rows = _as_positions(database.positions(*key)) if database is not None else self.positions(*key)
+        filtered_df = self.frame.iloc[rows] if isinstance(rows, slice) else self.frame.take(rows)
+        filtered_df = stamp_selection(filtered_df, selected_genres, explicit_filter)
+
+        with self._lock:
+            self._memo[key] = filtered_df
+            while len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return filtered_df
+
+
+register_builder('filter_engine', FilterEngine)
+
+
+def dataset_genres(df):
+    """Sorted genre names of the dataset `df`, read from its genre membership when it is registered"""
+    engine = get_derived(df, 'filter_engine')
+    if engine is not None:
+        return list(engine.membership.genres)
+    return sorted(df['track_genre'].dropna().unique())
+
+
+def filter_frame(df, selected_genres, explicit_filter):
+    """Rows of `df` matching the genre and explicit filters, shared between callers with the same filters"""
+    engine = get_derived(df, 'filter_engine')
+    if engine is not None and engine.frame is df:
+        return engine.select(selected_genres, explicit_filter)
+
+    filtered_df = df
+    if selected_genres and 'All Genres' not in selected_genres:
+        filtered_df = filtered_df[filtered_df['track_genre'].isin(selected_genres)]
+
+    if explicit_filter == "Explicit Only":
+        filtered_df = filtered_df[filtered_df['explicit'] == True]
+    elif explicit_filter == "Non-Explicit Only":
+        filtered_df = filtered_df[filtered_df['explicit'] == False]
+
+    return stamp_selection(filtered_df.copy(), selected_genres, explicit_filter)
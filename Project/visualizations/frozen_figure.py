@@ -0,0 +1,32 @@
+import plotly.graph_objects as go
+import plotly.io as pio
+
+
+class FrozenFigure(go.Figure):
+    """A built figure kept with its serialized JSON and plain dict form
+
+    Streamlit turns a figure into a dict and then into JSON on every rerun. A frozen figure
+    hands back the dict it was parsed from, so a cached chart is never rebuilt or deep-copied.
+    Frozen figures are shared between sessions and must not be modified.
+    """
+
+    def __init__(self, text):
+        spec = pio.json.from_json_plotly(text)
+        super().__init__(spec, _validate=False)
+        self._frozen_json = text
+        self._frozen_spec = spec
+
+    def to_dict(self):
+        return self._frozen_spec
+
+    def to_json(self, *args, **kwargs):
+        if args or kwargs:
+            return super().to_json(*args, **kwargs)
+        return self._frozen_json
+
+
+def freeze(fig):
+    """`fig` as a FrozenFigure, serialized with the fastest JSON engine available (orjson when installed)"""
+    if isinstance(fig, FrozenFigure):
+        return fig
+    return FrozenFigure(pio.to_json(fig, validate=False))
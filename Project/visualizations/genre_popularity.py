@@ -1,10 +1,10 @@
-import plotly.express as px
 from .utils import get_modern_layout
+from .dataset import load_dataset
+from .aggregates import grouped_stats, top_tracks
 
 def create_genre_popularity_chart(data=None):
     if data is None:
-        import pandas as pd
-        data = pd.read_csv('data/dataset.csv')
+        data = load_dataset()
     
 
     if data.empty:
@@ -21,7 +21,7 @@ def create_genre_popularity_chart(data=None):
         fig.update_layout(**layout_update)
         return fig
 
-    genre_stats = data.groupby('track_genre').agg({
+    genre_stats = grouped_stats(data, 'track_genre', {
         'popularity': ['mean', 'std', 'count'],
         'duration_ms': 'mean',
         'energy': 'mean',
@@ -33,8 +33,8 @@ def create_genre_popularity_chart(data=None):
    
     genre_stats['popularity_std'] = genre_stats['popularity_std'].fillna(0)
     
-    most_popular_tracks = data.loc[data.groupby('track_genre')['popularity'].idxmax()][['track_genre', 'track_name', 'artists', 'popularity']]
-    genre_stats = genre_stats.merge(most_popular_tracks.set_index('track_genre'), left_index=True, right_index=True)
+    most_popular_tracks = top_tracks(data)
+    genre_stats = genre_stats.merge(most_popular_tracks, left_index=True, right_index=True)
     genre_stats.rename(columns={'track_name': 'most_popular_track', 'artists': 'top_artist', 'popularity': 'max_popularity'}, inplace=True)
     
     top_genres = genre_stats.nlargest(20, 'avg_popularity')
@@ -43,6 +43,7 @@ def create_genre_popularity_chart(data=None):
         lambda x: f"{int(x//60000)}:{int((x%60000)//1000):02d}"
     )
     
+    import plotly.express as px
     fig = px.bar(
         x=top_genres['avg_popularity'],
         y=top_genres.index,
@@ -0,0 +1,168 @@
+import threading
+from itertools import combinations
+import numpy as np
+from .profiling import timed
+from .store import register_builder, get_derived, get_selection
+from .binning import equal_width_edges, cut_codes
+from .tracks import unique_tracks
+
+FEATURE_LABELS = {
+    'danceability': 'Danceability',
+    'energy': 'Energy',
+    'valence': 'Valence',
+    'acousticness': 'Acousticness',
+    'instrumentalness': 'Instrumentalness',
+    'speechiness': 'Speechiness',
+    'liveness': 'Liveness',
+    'tempo': 'Tempo (BPM)',
+    'loudness': 'Loudness (dB)'
+}
+
+AUDIO_FEATURES = list(FEATURE_LABELS)
+RESOLUTIONS = (4, 6, 8, 10, 12)
+PREBUILT_RESOLUTIONS = (4,)
+
+COLUMNS = ['track_genre', 'explicit', 'popularity'] + AUDIO_FEATURES
+
+# Rows times feature pairs binned per bincount call, bounds the temporary index arrays
+CHUNK_ENTRIES = 4_000_000
+
+
+class JointHistograms:
+    """Row count and popularity sum per (filter cell, feature pair, bin, bin) for every audio feature pair
+
+    Each resolution is built in one vectorized pass over the entries, the rows `rows` of the frame
+    coded by `cell_codes`, after which any pair and filter state is a lookup and a sum over the
+    selected cells.
+    """
+
+    def __init__(self, frame, cell_codes=None, n_cells=1, rows=None):
+        self.frame = frame
+        self.features = [f for f in AUDIO_FEATURES if f in frame.columns]
+        self.pairs = {pair: i for i, pair in enumerate(combinations(range(len(self.features)), 2))}
+        self.rows = np.arange(len(frame)) if rows is None else rows
+        self.cell_codes = np.zeros(len(self.rows), dtype=np.intp) if cell_codes is None else cell_codes
+        self.n_cells = n_cells
+        self.edges = {}
+        self.tables = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def table(self, resolution):
+        """(count, popularity sum) arrays of shape (cells, pairs, resolution, resolution)"""
+        if resolution not in self.tables:
+            with self._lock:
+                if resolution not in self.tables:
+                    self.tables[resolution] = self._build(resolution)
+        return self.tables[resolution]
+
+    def _build(self, resolution):
+        edges = [equal_width_edges(self.frame[f], resolution) for f in self.features]
+        self.edges[resolution] = edges
+        return self._histogram(edges, resolution, 0)
+
+    def _histogram(self, edges, resolution, first_entry):
+        first = np.array([i for i, _ in self.pairs], dtype=np.intp)
+        second = np.array([j for _, j in self.pairs], dtype=np.intp)
+        n_pairs = len(self.pairs)
+        size = self.n_cells * n_pairs * resolution * resolution
+        count = np.zeros(size, dtype=np.int64)
+        total = np.zeros(size, dtype=np.float64)
+        popularity = self.frame['popularity'].to_numpy(dtype=np.float64)
+
+        step = max(1, CHUNK_ENTRIES // max(n_pairs, 1))
+        for start in range(first_entry, len(self.rows), step):
+            rows = self.rows[start:start + step]
+            codes = np.column_stack([cut_codes(self.frame[f].to_numpy()[rows], e) for f, e in zip(self.features, edges)]).astype(np.intp)
+            a, b = codes[:, first], codes[:, second]
+            valid = (a >= 0) & (b >= 0)
+            index = ((self.cell_codes[start:start + step, None] * n_pairs + np.arange(n_pairs)) * resolution + a) * resolution + b
+            index = index[valid]
+            count += np.bincount(index, minlength=size)
+            total += np.bincount(index, weights=np.broadcast_to(popularity[rows, None], valid.shape)[valid], minlength=size)
+
+        shape = (self.n_cells, n_pairs, resolution, resolution)
+        return count.reshape(shape), total.reshape(shape)
+
+    def extend(self, frame, start):
+        """Histograms of `frame` adding the entries added after `start`, or None when they move a feature's range"""
+        engine = get_derived(frame, 'filter_engine')
+        if engine.n_cells != self.n_cells:
+            return None
+        histograms = JointHistograms(frame, engine.codes, self.n_cells, engine.tracks)
+        ranges = get_derived(frame, 'value_ranges')
+        for resolution, (count, total) in self.tables.items():
+            edges = self.edges[resolution]
+            if any(not np.array_equal(e, equal_width_edges(ranges.values(f), resolution)) for f, e in zip(self.features, edges)):
+                return None
+            added_count, added_total = histograms._histogram(edges, resolution, len(self.rows))
+            histograms.edges[resolution] = edges
+            histograms.tables[resolution] = (count + added_count, total + added_total)
+        return histograms
+
+    def query(self, cells, row_feature, column_feature, resolution):
+        """Count and popularity sum per (row bin, column bin) over `cells`, all cells when None"""
+        count, total = self.table(resolution)
+        i, j = self.features.index(row_feature), self.features.index(column_feature)
+        pair = self.pairs[(min(i, j), max(i, j))]
+        cells = slice(None) if cells is None else np.asarray(cells, dtype=np.intp)
+        count, total = count[cells, pair].sum(axis=0), total[cells, pair].sum(axis=0)
+        if i > j:
+            count, total = count.T, total.T
+        return count, total, self.edges[resolution][i], self.edges[resolution][j]
+
+    def query_rows(self, data, row_feature, column_feature, resolution):
+        """Like query() for the rows of `data`, binned on the edges of this dataset"""
+        self.table(resolution)
+        row_edges = self.edges[resolution][self.features.index(row_feature)]
+        column_edges = self.edges[resolution][self.features.index(column_feature)]
+        a = cut_codes(data[row_feature].to_numpy(), row_edges).astype(np.intp)
+        b = cut_codes(data[column_feature].to_numpy(), column_edges).astype(np.intp)
+        valid = (a >= 0) & (b >= 0)
+        index = a[valid] * resolution + b[valid]
+        popularity = data['popularity'].to_numpy(dtype=np.float64)[valid]
+        count = np.bincount(index, minlength=resolution * resolution).reshape(resolution, resolution)
+        total = np.bincount(index, weights=popularity, minlength=resolution * resolution).reshape(resolution, resolution)
+        return count, total, row_edges, column_edges
+
+
+def build_joint_histograms(frame):
+    engine = get_derived(frame, 'filter_engine')
+    histograms = JointHistograms(frame, engine.codes, engine.n_cells, engine.tracks)
+    for resolution in PREBUILT_RESOLUTIONS:
+        histograms.table(resolution)
+    return histograms
+
+
+register_builder('joint_histograms', build_joint_histograms)
+
+
+@timed('aggregation')
+def joint_popularity(data, row_feature, column_feature, resolution):
+    """(count, mean popularity, row edges, column edges) per pair of equal-width bins of two audio features
+
+    Bins span the full dataset's range when `data` is a known filter state, otherwise the range of `data`.
+    """
+    if row_feature == column_feature:
+        raise ValueError('joint_popularity needs two different features')
+    histograms = get_derived(data, 'joint_histograms')
+    selection = get_selection(data) if histograms is not None else None
+    cells = get_derived(data, 'filter_engine').cells(*selection) if selection is not None else None
+    if selection is None:
+        count, total, row_edges, column_edges = JointHistograms(unique_tracks(data)).query(None, row_feature, column_feature, resolution)
+    elif cells is None:
+        # Selected genres share tracks, their cells would count those twice
+        count, total, row_edges, column_edges = histograms.query_rows(data, row_feature, column_feature, resolution)
+    else:
+        count, total, row_edges, column_edges = histograms.query(cells, row_feature, column_feature, resolution)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+    return count, mean, row_edges, column_edges
@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+
+from .dataset import find_dataset_path, file_signature, load_dataset
+from .store import prepare, release
+from .streaming import OUT_OF_CORE, stream_dataset
+
+# Seconds between checks of the dataset file for changes, 0 disables reloading
+DATASET_RELOAD_INTERVAL = float(os.environ.get('DATASET_RELOAD_INTERVAL', 5))
+
+logger = logging.getLogger(__name__)
+
+
+class LiveDataset:
+    """The dataset the app serves, reloaded in the background when its CSV changes
+
+    A watcher thread polls the file's size and mtime. Once a change has settled, it loads the new
+    frame and builds its derived structures off the request path, then swaps it in with a single
+    reference assignment. Reruns that already hold the previous frame finish on it: the previous
+    version stays registered until the next swap, and older ones are released.
+    """
+
+    def __init__(self, columns=None, csv_path=None, interval=DATASET_RELOAD_INTERVAL):
+        self.columns = columns
+        self.csv_path = csv_path or find_dataset_path()
+        self.interval = interval
+        self._frame = None
+        self._previous = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def current(self):
+        """The live prepared frame, loading it on first use"""
+        frame = self._frame
+        if frame is None:
+            with self._lock:
+                if self._frame is None:
+                    self._load()
+                frame = self._frame
+        return frame
+
+    @property
+    def fingerprint(self):
+        return None if self._frame is None else self._frame.attrs['fingerprint']
+
+    def _load(self):
+        # Recorded first, so a file that fails to load is not retried until it changes again
+        self._signature = file_signature(self.csv_path)
+        if OUT_OF_CORE:
+            frame = stream_dataset(self.csv_path, self.columns)
+        else:
+            frame = load_dataset(self.csv_path, self.columns)
+        for version in (self._frame, self._previous):
+            if version is not None and version.attrs['fingerprint'] == frame.attrs['fingerprint']:
+                # Same contents as a loaded version, e.g. the file was only touched
+                frame = version
+                break
+        else:
+            frame = prepare(frame)
+        if frame is self._frame:
+            return False
+        if self._previous is not None and self._previous is not frame:
+            release(self._previous.attrs['fingerprint'])
+        self._previous, self._frame = self._frame, frame
+        return True
+
+    def check(self, pending=None):
+        """Reload when the file changed and still has the signature `pending` seen on the previous check
+
+        Returns the signature to pass next time, so a file being written is only read once it stops changing.
+        """
+        try:
+            signature = file_signature(self.csv_path)
+        except OSError:
+            # Missing while it is being replaced
+            return None
+        if signature == self._signature:
+            return None
+        if signature != pending:
+            return signature
+        with self._lock:
+            previous = self.fingerprint
+            if self._load():
+                logger.info("Dataset reloaded: %s -> %s, %d tracks", previous, self.fingerprint, len(self._frame))
+        return None
+
+    def watch(self):
+        """Start the watcher thread, or return None when reloading is disabled"""
+        if self.interval <= 0 or self._thread is not None:
+            return self._thread
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+        def run():
+            pending = None
+            while not self._stop.wait(self.interval):
+                try:
+                    pending = self.check(pending)
+                except Exception:
+                    pending = None
+                    logger.exception("Dataset reload failed, still serving %s", self.fingerprint)
+
+        self._thread = threading.Thread(target=run, name='dataset-watcher', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
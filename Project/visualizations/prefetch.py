@@ -0,0 +1,77 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .store import get_selection
+from .figure_cache import cached_figure, figure_key, figure_cache
+
+# Background threads building charts ahead of navigation, 0 disables prefetching
+PREFETCH_WORKERS = int(os.environ.get('PREFETCH_WORKERS', 2))
+
+# Sessions whose pending prefetches are tracked, the oldest are forgotten first
+MAX_OWNERS = 1024
+
+
+def _build(func, data):
+    # The figure lands in the figure cache, the future itself holds nothing
+    cached_figure(func, data)
+
+
+class Prefetcher:
+    """Builds charts into the figure cache before they are asked for
+
+    Each owner (a browser session) has at most one filter state being prefetched,
+    moving to another state cancels the work still queued for the previous one.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='chart-prefetch') if workers > 0 else None
+        self._owners = OrderedDict()
+        self._inflight = {}
+        # Reentrant because cancelling a queued future runs its done callback in this thread
+        self._lock = threading.RLock()
+
+    def prefetch(self, owner, data, funcs):
+        """Queue func(data) for each of `funcs` that is neither cached nor already being built"""
+        selection = get_selection(data)
+        if self._pool is None or selection is None:
+            return
+        state = selection + (data.attrs['fingerprint'],)
+        with self._lock:
+            previous = self._owners.pop(owner, None)
+            if previous is not None and previous[0] != state:
+                for future in previous[1]:
+                    future.cancel()
+                previous = None
+            futures = previous[1] if previous is not None else []
+            for func in funcs:
+                key = figure_key(func, data)
+                if key not in self._inflight and key not in figure_cache:
+                    future = self._pool.submit(_build, func, data)
+                    self._inflight[key] = future
+                    future.add_done_callback(lambda _, key=key: self._forget(key))
+                    futures.append(future)
+            self._owners[owner] = (state, [f for f in futures if not f.done()])
+            while len(self._owners) > MAX_OWNERS:
+                self._owners.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def figure(self, func, data, **kwargs):
+        """cached_figure(func, data, **kwargs), waiting for a prefetch of the same chart instead of building it twice"""
+        key = figure_key(func, data, **kwargs)
+        with self._lock:
+            future = self._inflight.get(key)
+        if future is not None:
+            try:
+                future.result()
+            except Exception:
+                # Cancelled or failed, building it here reports the error as usual
+                pass
+        return cached_figure(func, data, **kwargs)
+
+
+prefetcher = Prefetcher(PREFETCH_WORKERS)
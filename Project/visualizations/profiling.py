@@ -0,0 +1,113 @@
+import contextlib
+import cProfile
+import functools
+import json
+import marshal
+import os
+import threading
+import time
+
+# Timing spans are only recorded when this is set, each rerun is then appended to PROFILE_LOG
+PROFILE_ENABLED = os.environ.get('SPOTIFY_PROFILE', '') not in ('', '0')
+PROFILE_LOG = os.environ.get('SPOTIFY_PROFILE_LOG', 'profile_log.jsonl')
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+class Trace:
+    """Timing spans recorded by one thread during one app rerun, nested spans keep their depth"""
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = []
+        self.depth = 0
+        self.created = time.time()
+        self.start = time.perf_counter()
+
+    def record(self):
+        return {
+            'trace': self.name,
+            'time': self.created,
+            'total_ms': (time.perf_counter() - self.start) * 1000,
+            'spans': self.spans
+        }
+
+
+def start_trace(name='rerun'):
+    """Begin recording spans on this thread, or return None when profiling is disabled"""
+    if not PROFILE_ENABLED:
+        return None
+    _local.trace = Trace(name)
+    return _local.trace
+
+
+@contextlib.contextmanager
+def span(stage, **fields):
+    """Time the block as `stage` in this thread's trace, yields the span dict for extra fields"""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        yield None
+        return
+    entry = {'stage': stage, 'depth': trace.depth, **fields}
+    trace.spans.append(entry)
+    trace.depth += 1
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry['ms'] = (time.perf_counter() - start) * 1000
+        trace.depth -= 1
+
+
+def timed(stage):
+    """Decorator recording every call of the function as a `stage` span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, 'trace', None) is None:
+                return func(*args, **kwargs)
+            with span(stage, name=func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def finish_trace(path=PROFILE_LOG):
+    """Stop this thread's trace, append it to `path` as one JSON line and return it"""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return None
+    _local.trace = None
+    record = trace.record()
+    if path:
+        with _log_lock, open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    return record
+
+
+def stage_totals(record):
+    """Milliseconds per stage of a finished trace, counting only the time not spent in nested spans"""
+    totals = {}
+    for i, entry in enumerate(record['spans']):
+        nested = 0.0
+        for child in record['spans'][i + 1:]:
+            if child['depth'] <= entry['depth']:
+                break
+            if child['depth'] == entry['depth'] + 1:
+                nested += child.get('ms', 0.0)
+        totals[entry['stage']] = totals.get(entry['stage'], 0.0) + entry.get('ms', 0.0) - nested
+    return totals
+
+
+def start_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profile(profiler):
+    """Stop `profiler` and return its stats in the .prof format read by pstats and snakeviz"""
+    profiler.disable()
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
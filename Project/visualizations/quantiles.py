@@ -0,0 +1,163 @@
+import copy
+import numpy as np
+from .profiling import timed
+from .store import register_builder, get_derived, get_selection
+from .box_stats import quantile_from_counts
+from .tracks import unique_tracks
+
+# Columns read through the sketches: loudness for the colour range of the tempo/loudness chart, energy for its box plots
+SKETCH_COLUMNS = ['energy', 'loudness']
+
+COLUMNS = ['track_genre', 'explicit'] + SKETCH_COLUMNS
+
+# Most levels of a grid, columns with more distinct written values are binned into this many
+SKETCH_LEVELS = 2048
+MAX_DECIMALS = 4
+
+# Selections up to this many rows sort them for exact quantiles instead of reading the sketch
+EXACT_QUANTILE_ROWS = 20_000
+
+
+def grid_decimals(values):
+    """Fewest decimals, up to MAX_DECIMALS, every value is written with, None when they need more"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iub':
+        return 0
+    values = values[~np.isnan(values)]
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        # float32 columns hold decimals approximately, so compare in their own precision
+        if np.array_equal((np.rint(values.astype(np.float64) * scale) / scale).astype(values.dtype), values):
+            return decimals
+    return None
+
+
+def value_grid(low, high, decimals):
+    """(first level, step, number of levels, decimals) covering [low, high]
+
+    A level per written value when `decimals` allow at most SKETCH_LEVELS of them, otherwise the centers
+    of SKETCH_LEVELS equal bins with decimals None.
+    """
+    if decimals is not None:
+        scale = 10.0 ** decimals
+        first = np.rint(low * scale) / scale
+        n_levels = int(np.rint((high - first) * scale)) + 1
+        if n_levels <= SKETCH_LEVELS:
+            return first, 1 / scale, n_levels, decimals
+    step = (high - low) / SKETCH_LEVELS if high > low else 1.0
+    return low + step / 2, step, SKETCH_LEVELS, None
+
+
+class QuantileSketches:
+    """Sparse value counts on a fixed grid per filter engine cell for each of the SKETCH_COLUMNS
+
+    Only the (cell, level) pairs that occur are kept, as sorted int32 keys cell * levels + level with
+    int32 counts. Counts add up across cells, so quantiles of any filter state whose cells hold its
+    tracks once come from one cumulative sum over the grid. A column written with few decimals gets a
+    level per value and exact quantiles, others are binned and their quantiles are off by at most half
+    a bin, error() of the column.
+    """
+
+    def __init__(self, n_cells, grids):
+        self.n_cells = n_cells
+        self.grids = grids
+        self.keys = {column: np.array([], dtype=np.int32) for column in grids}
+        self.counts = {column: np.array([], dtype=np.int32) for column in grids}
+        self.n_entries = 0
+
+    @classmethod
+    def from_frame(cls, frame):
+        engine = get_derived(frame, 'filter_engine')
+        grids = {}
+        for column in SKETCH_COLUMNS:
+            if column in frame.columns:
+                values = frame[column].to_numpy()
+                present = values[~np.isnan(values)] if values.dtype.kind == 'f' else values
+                if len(present):
+                    grids[column] = value_grid(float(present.min()), float(present.max()), grid_decimals(present))
+        sketches = cls(engine.n_cells, grids)
+        sketches.add(frame, engine.codes, engine.tracks)
+        sketches.n_entries = engine.n_entries
+        return sketches
+
+    def add(self, frame, cell_codes, rows=None):
+        """Count the rows `rows` of `frame` (all by default), whose filter engine cells are `cell_codes`"""
+        rows = np.arange(len(frame)) if rows is None else rows
+        for column, (first, step, n_levels, _) in self.grids.items():
+            values = frame[column].to_numpy(dtype=np.float64)[rows]
+            keep = ~np.isnan(values)
+            levels = np.clip(np.rint((values[keep] - first) / step), 0, n_levels - 1).astype(np.int64)
+            keys = np.concatenate([self.keys[column], np.asarray(cell_codes)[keep] * n_levels + levels])
+            counts = np.concatenate([self.counts[column], np.ones(keep.sum(), dtype=np.int32)])
+            keys, inverse = np.unique(keys, return_inverse=True)
+            self.keys[column] = keys.astype(np.int32)
+            self.counts[column] = np.bincount(inverse, weights=counts, minlength=len(keys)).astype(np.int32)
+
+    def extend(self, frame, start):
+        """Sketches of `frame` counting the entries added after `start`, or None when they add genres or leave a grid"""
+        engine = get_derived(frame, 'filter_engine')
+        if engine.n_cells != self.n_cells:
+            return None
+        delta = frame.iloc[start:]
+        for column, (first, step, n_levels, decimals) in self.grids.items():
+            values = delta[column].to_numpy()
+            values = values[~np.isnan(values)] if values.dtype.kind == 'f' else values
+            if len(values) == 0:
+                continue
+            if values.min() < first - step / 2 or values.max() > first + (n_levels - 0.5) * step:
+                return None
+            if decimals is not None and (grid_decimals(values) is None or grid_decimals(values) > decimals):
+                return None
+        sketches = copy.copy(self)
+        sketches.keys, sketches.counts = dict(self.keys), dict(self.counts)
+        sketches.add(frame, engine.codes[self.n_entries:], engine.tracks[self.n_entries:])
+        sketches.n_entries = engine.n_entries
+        return sketches
+
+    def levels(self, column):
+        first, step, n_levels, _ = self.grids[column]
+        return first + np.arange(n_levels) * step
+
+    def is_exact(self, column):
+        """True when `column` has a level per written value, so its counts give exact quantiles and boxes"""
+        return column in self.grids and self.grids[column][3] is not None
+
+    def error(self, column):
+        """Largest difference between a quantile of `column` and the one of its values"""
+        _, step, _, decimals = self.grids[column]
+        return 0.0 if decimals is not None else step / 2
+
+    def counts_of(self, column, cells):
+        """Dense counts per level of `column` over the filter engine `cells`"""
+        n_levels = self.grids[column][2]
+        keys, counts = self.keys[column], self.counts[column]
+        cells = np.asarray(cells, dtype=np.int64)
+        bounds = np.searchsorted(keys, np.stack([cells, cells + 1]) * n_levels)
+        picked = np.concatenate([np.arange(lo, hi) for lo, hi in bounds.T] or [np.array([], dtype=np.intp)])
+        return np.bincount(keys[picked] % n_levels, weights=counts[picked], minlength=n_levels).astype(np.int64)
+
+    def quantiles(self, column, qs, cells):
+        """Linear quantiles `qs` of `column` over the filter engine `cells`, NaN when they have no values"""
+        counts = self.counts_of(column, cells)
+        if counts.sum() == 0:
+            return np.full(len(qs), np.nan)
+        levels, cumulative = self.levels(column), np.cumsum(counts)
+        return np.array([quantile_from_counts(counts, levels, q, cumulative) for q in qs])
+
+
+register_builder('quantile_sketches', QuantileSketches.from_frame)
+
+
+@timed('aggregation')
+def feature_quantiles(data, column, qs):
+    """Quantiles `qs` of `column` over the rows of `data`, linear like Series.quantile
+
+    Known filter states over EXACT_QUANTILE_ROWS rows, and samples standing for a streamed dataset,
+    are answered from the quantile sketches. Smaller selections sort their rows.
+    """
+    sketches = get_derived(data, 'quantile_sketches')
+    selection = get_selection(data) if sketches is not None and column in sketches.grids else None
+    cells = get_derived(data, 'filter_engine').cells(*selection) if selection is not None else None
+    if cells is not None and (len(data) > EXACT_QUANTILE_ROWS or data.attrs.get('sampled')):
+        return sketches.quantiles(column, qs, cells)
+    return unique_tracks(data)[column].quantile(list(qs)).to_numpy(dtype=np.float64)
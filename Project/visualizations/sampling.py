@@ -0,0 +1,96 @@
+import copy
+import numpy as np
+from .profiling import timed
+from .sql_backend import sql_database
+from .store import register_builder, get_derived, get_selection
+
+SAMPLE_SEED = 42
+
+COLUMNS = ['track_genre', 'explicit']
+
+
+class StableSampler:
+    """One random priority per track, fixed at load, so samples are stable across filter changes
+
+    The sample for a filter state is the k highest-priority tracks passing the filter.
+    """
+
+    def __init__(self, frame, priority=None):
+        self.frame = frame
+        self.engine = get_derived(frame, 'filter_engine')
+        if priority is None:
+            rng = np.random.default_rng(SAMPLE_SEED)
+            self.order = rng.permutation(len(frame))
+        else:
+            # Lowest first, e.g. the priorities a streamed sample was drawn with
+            self.order = np.argsort(priority, kind='stable')
+        self.rank = np.empty_like(self.order)
+        self.rank[self.order] = np.arange(len(frame))
+
+        # Filter engine entries of every cell, each cell's entries in priority order
+        codes = self.engine.codes
+        self.cell_entries = np.lexsort((self.rank[self.engine.tracks], codes))
+        self.cell_offsets = np.searchsorted(codes[self.cell_entries], np.arange(self.engine.n_cells + 1))
+
+    def extend(self, frame, start):
+        """Sampler for `frame` with the tracks appended after `start` given priorities among the existing ones
+
+        Existing tracks keep their relative order, so samples only change where a new track outranks them.
+        """
+        engine = get_derived(frame, 'filter_engine')
+        if engine.n_cells != self.engine.n_cells:
+            return None
+        rng = np.random.default_rng([SAMPLE_SEED, start])
+        new_rows = np.arange(start, len(frame))
+        slots = np.zeros(len(frame), dtype=bool)
+        slots[rng.choice(len(frame), len(new_rows), replace=False)] = True
+
+        sampler = copy.copy(self)
+        sampler.frame = frame
+        sampler.engine = engine
+        sampler.order = np.empty(len(frame), dtype=self.order.dtype)
+        sampler.order[slots] = rng.permutation(new_rows)
+        sampler.order[~slots] = self.order
+        sampler.rank = np.empty_like(sampler.order)
+        sampler.rank[sampler.order] = np.arange(len(frame))
+
+        # Old entries keep their cell and relative priority, so the new ones are merged into the sorted cell order
+        codes, rank = engine.codes, sampler.rank[engine.tracks]
+        new_entries = np.arange(self.engine.n_entries, engine.n_entries)
+        keys = codes[self.cell_entries] * len(frame) + rank[self.cell_entries]
+        new_keys = codes[new_entries] * len(frame) + rank[new_entries]
+        by_key = np.argsort(new_keys)
+        sampler.cell_entries = np.insert(self.cell_entries, np.searchsorted(keys, new_keys[by_key]), new_entries[by_key])
+        sampler.cell_offsets = np.searchsorted(codes[sampler.cell_entries], np.arange(engine.n_cells + 1))
+        return sampler
+
+    def rows(self, genres, explicit, k):
+        """Positions of the k highest-priority tracks of the filter state, in priority order"""
+        cells = self.engine.cells(genres, explicit)
+        if cells is None:
+            # Selected genres share tracks, so rank the selected tracks themselves
+            tracks = np.arange(len(self.frame))[self.engine.positions(genres, explicit)]
+            return tracks[np.argsort(self.rank[tracks], kind='stable')[:k]]
+
+        cells = np.asarray(cells, dtype=np.intp)
+        starts, stops = self.cell_offsets[cells], self.cell_offsets[cells + 1]
+        if int((stops - starts).sum()) == 0:
+            return np.array([], dtype=np.intp)
+        # Each cell's first k entries always contain the overall top k, and cells share no track
+        candidates = self.engine.tracks[np.concatenate([self.cell_entries[start:min(stop, start + k)] for start, stop in zip(starts, stops)])]
+        return candidates[np.argsort(self.rank[candidates], kind='stable')][:k]
+
+
+register_builder('stable_sampler', StableSampler)
+
+
+@timed('aggregation')
+def stable_sample(data, n):
+    """Up to n rows of `data`, drawn from the global priority order when `data` is a known filter state"""
+    sampler = get_derived(data, 'stable_sampler')
+    selection = get_selection(data) if sampler is not None else None
+    if selection is None:
+        return data.sample(n=min(n, len(data)), random_state=SAMPLE_SEED)
+    database = sql_database(data)
+    rows = database.sample_positions(*selection, n) if database is not None else sampler.rows(*selection, n)
+    return sampler.frame.take(rows)
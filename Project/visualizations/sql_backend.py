@@ -0,0 +1,303 @@
+import os
+import sys
+import threading
+import numpy as np
+import pandas as pd
+
+from .binning import BINNINGS, code_column
+from .store import register_builder, get_derived, get_selection
+
+# Engine behind grouped_stats, top_tracks and genre_counts: 'pandas' (the stats cube, then pandas) or 'duckdb'
+QUERY_BACKEND = os.environ.get('SPOTIFY_QUERY_BACKEND', 'pandas')
+
+TABLE = 'tracks'
+# (_row, track_genre) pairs of the genre membership, joined for groupings by genre
+MEMBERSHIP_TABLE = 'membership'
+# Track position in the frame, so ties break on the first track like idxmax
+ROW_COLUMN = '_row'
+# Track rank in the stable sampler's priority order, so SQL samples draw the same tracks
+RANK_COLUMN = '_rank'
+
+SQL_STATS = {
+    'mean': 'avg',
+    'std': 'stddev_samp',
+    'count': 'count',
+    'sum': 'sum',
+    'min': 'min',
+    'max': 'max',
+    'median': 'median'
+}
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _normalize_spec(spec):
+    return {column: [stats] if isinstance(stats, str) else list(stats) for column, stats in spec.items()}
+
+
+def _arrow_table(frame):
+    """The frame as an Arrow table, mapped from its snapshot when that holds the same rows"""
+    import pyarrow as pa
+    from .dataset import find_dataset_path, snapshot_path, _snapshot_metadata
+
+    table = None
+    snap_path = snapshot_path(find_dataset_path())
+    try:
+        if _snapshot_metadata(snap_path).get(b'source_fingerprint', b'').decode() == frame.attrs.get('fingerprint'):
+            # Zero-copy: DuckDB scans the same mapped pages the frame was loaded from
+            table = pa.ipc.open_file(pa.memory_map(snap_path)).read_all()
+            table = table.select([name for name in table.column_names if name in frame.columns])
+    except (OSError, pa.ArrowInvalid):
+        table = None
+    if table is None or table.num_rows != len(frame):
+        # NaN becomes NULL here, so COUNT and AVG skip missing values like pandas
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.append_column(ROW_COLUMN, pa.array(np.arange(len(frame), dtype=np.int64)))
+    return table.append_column(RANK_COLUMN, pa.array(get_derived(frame, 'stable_sampler').rank.astype(np.int64)))
+
+
+def _membership_table(frame):
+    import pyarrow as pa
+
+    membership = get_derived(frame, 'genre_membership')
+    return pa.table({
+        ROW_COLUMN: pa.array(membership.tracks.astype(np.int64)),
+        'track_genre': pa.array(membership.genres[membership.genre_codes], type=pa.string())
+    })
+
+
+class SQLDatabase:
+    """The dataset registered in an in-process DuckDB database, answering filtered group-bys in SQL
+
+    Tracks and their genre membership are two tables, joined for groupings by genre. The filter state
+    becomes the WHERE clause of every query and only the grouped result comes back as a frame.
+    Queries are serialized on one connection, DuckDB parallelizes each of them.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.columns = set(frame.columns) | {'track_genre'}
+        self._table = None
+        self._membership = None
+        self._connection = None
+        self._lock = threading.Lock()
+        # Fail on load rather than on the first chart when duckdb is missing
+        self._connect()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_table'] = state['_membership'] = state['_connection'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            import duckdb
+
+            self._table = _arrow_table(self.frame)
+            self._membership = _membership_table(self.frame)
+            self._connection = duckdb.connect()
+            self._connection.register(TABLE, self._table)
+            self._connection.register(MEMBERSHIP_TABLE, self._membership)
+        return self._connection
+
+    def execute(self, sql, params=()):
+        """Result of `sql` over the TABLE as a pandas frame"""
+        with self._lock:
+            return self._connect().execute(sql, list(params)).df()
+
+    def _source(self, by_genre):
+        return f'{TABLE} JOIN {MEMBERSHIP_TABLE} USING ({ROW_COLUMN})' if by_genre else TABLE
+
+    def _where(self, genres, explicit, by_genre, conditions=()):
+        """WHERE clause of a filter state over the joined pairs when `by_genre`, otherwise over the tracks"""
+        conditions, params = list(conditions), []
+        if genres is not None:
+            listed = f"track_genre IN ({', '.join('?' * len(genres))})"
+            if not genres:
+                conditions.append('FALSE')
+            elif by_genre:
+                conditions.append(listed)
+            else:
+                conditions.append(f'{ROW_COLUMN} IN (SELECT {ROW_COLUMN} FROM {MEMBERSHIP_TABLE} WHERE {listed})')
+            params.extend(genres)
+        if explicit is not None:
+            conditions.append('explicit = ?')
+            params.append(bool(explicit))
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+    def supports(self, by, spec):
+        keys = [code_column(by) if isinstance(by, str) and by in BINNINGS else by] if isinstance(by, str) else list(by)
+        spec = _normalize_spec(spec)
+        return (set(keys) | set(spec)) <= self.columns and all(set(stats) <= set(SQL_STATS) for stats in spec.values())
+
+    def grouped_stats(self, by, spec, genres=None, explicit=None):
+        """Equivalent of data.groupby(by).agg(spec) for the tracks matching the filter state
+
+        Groupings by genre count a track in every selected genre listing it, others count it once.
+        """
+        binning = by if isinstance(by, str) and by in BINNINGS else None
+        keys = [code_column(binning)] if binning else ([by] if isinstance(by, str) else list(by))
+        by_genre = 'track_genre' in keys
+        # pandas drops rows whose key is missing, and bin code -1 is a value outside every bin
+        conditions = [f'{_quote(code_column(binning))} >= 0'] if binning else []
+        conditions += [f'{_quote(key)} IS NOT NULL' for key in keys if not binning]
+
+        flat = all(isinstance(stats, str) for stats in spec.values())
+        spec = _normalize_spec(spec)
+        outputs = [(column, stat) for column, stats in spec.items() for stat in stats]
+        select = [_quote(key) for key in keys] + [
+            f'{SQL_STATS[stat]}({_quote(column)}) AS v{i}' for i, (column, stat) in enumerate(outputs)]
+        where, params = self._where(genres, explicit, by_genre, conditions)
+        source = self._source(by_genre)
+        order = ', '.join(_quote(key) for key in keys)
+        result = self.execute(f'SELECT {", ".join(select)} FROM {source}{where} GROUP BY {order} ORDER BY {order}', params)
+
+        if binning:
+            labels = BINNINGS[binning]['labels']
+            codes = result[keys[0]].to_numpy(dtype=np.intp)
+            if not BINNINGS[binning]['observed']:
+                result = result.set_index(keys[0]).reindex(range(len(labels))).reset_index()
+                codes = np.arange(len(labels))
+            index = pd.CategoricalIndex(pd.Categorical.from_codes(codes, categories=labels, ordered=True), name=binning)
+        elif len(keys) == 1:
+            index = pd.Index(result[keys[0]].to_numpy(dtype=bool if keys[0] == 'explicit' else object), name=keys[0])
+        else:
+            index = pd.MultiIndex.from_arrays(
+                [result[key].to_numpy(dtype=bool if key == 'explicit' else object) for key in keys], names=keys)
+
+        columns = {}
+        for i, (column, stat) in enumerate(outputs):
+            values = result[f'v{i}']
+            values = values.fillna(0).to_numpy(dtype=np.int64) if stat == 'count' else values.to_numpy(dtype=np.float64, na_value=np.nan)
+            columns[column if flat else (column, stat)] = values
+        return pd.DataFrame(columns, index=index)
+
+    def top_tracks(self, genres=None, explicit=None):
+        """Most popular track per genre of the filter state, the first track on ties"""
+        where, params = self._where(genres, explicit, True)
+        result = self.execute(
+            f'SELECT track_genre, track_name, artists, popularity FROM {self._source(True)}{where} '
+            f'QUALIFY row_number() OVER (PARTITION BY track_genre ORDER BY popularity DESC, {ROW_COLUMN}) = 1 '
+            'ORDER BY track_genre', params)
+        return pd.DataFrame({
+            'track_name': result['track_name'].to_numpy(dtype=object),
+            'artists': result['artists'].to_numpy(dtype=object),
+            'popularity': result['popularity'].to_numpy(dtype=self.frame['popularity'].dtype)
+        }, index=pd.Index(result['track_genre'].to_numpy(dtype=object), name='track_genre'))
+
+    def positions(self, genres=None, explicit=None):
+        """Ascending positions of the tracks matching the filter state"""
+        where, params = self._where(genres, explicit, False)
+        result = self.execute(f'SELECT {ROW_COLUMN} FROM {TABLE}{where} ORDER BY {ROW_COLUMN}', params)
+        return result[ROW_COLUMN].to_numpy(dtype=np.intp)
+
+    def sample_positions(self, genres, explicit, k):
+        """Positions of the k highest-priority tracks of the filter state, in priority order, like StableSampler.rows"""
+        where, params = self._where(genres, explicit, False)
+        result = self.execute(f'SELECT {ROW_COLUMN} FROM {TABLE}{where} ORDER BY {RANK_COLUMN} LIMIT ?', params + [int(k)])
+        return result[ROW_COLUMN].to_numpy(dtype=np.intp)
+
+    def genre_rows(self, genres=None, explicit=None):
+        """Track count per genre of the filter state, largest first, ties in genre order"""
+        where, params = self._where(genres, explicit, True)
+        result = self.execute(
+            f'SELECT track_genre, count(*) AS n FROM {self._source(True)}{where} '
+            'GROUP BY track_genre ORDER BY n DESC, track_genre', params)
+        return pd.Series(result['n'].to_numpy(dtype=np.int64), index=pd.Index(result['track_genre'].to_numpy(dtype=object), name='track_genre'), name='count')
+
+
+if QUERY_BACKEND == 'duckdb':
+    register_builder('sql_database', SQLDatabase)
+
+
+def sql_database(data):
+    """The database of the dataset `data` was cut from when the duckdb backend is on, else None"""
+    if QUERY_BACKEND != 'duckdb' or data.attrs.get('sampled'):
+        return None
+    return get_derived(data, 'sql_database')
+
+
+def sql_database_for(data):
+    """(database, (genres, explicit)) when `data` is a known filter state and the duckdb backend is on, else (None, None)"""
+    database = sql_database(data)
+    selection = get_selection(data) if database is not None else None
+    return (database, selection) if selection is not None else (None, None)
+
+
+def check_parity(df, database, states):
+    """Differences between DuckDB and pandas answers for every (genres, explicit) state, as printable lines"""
+    from .aggregates import VALUE_COLUMNS
+    from .binning import category_labels
+    from .tracks import with_genres
+
+    plain = df.copy(deep=False)
+    plain.attrs = {}
+    # Every (track, genre) pair, labelled with the track's position
+    pairs = with_genres(df)
+    pairs.attrs = {}
+    spec = {column: ['mean', 'std', 'count'] for column in VALUE_COLUMNS if column in df.columns}
+    groupings = ['track_genre', 'explicit', ['track_genre', 'explicit']] + list(BINNINGS)
+
+    mismatches = []
+    for genres, explicit in states:
+        rows, tracks = pairs, plain
+        if genres is not None:
+            rows = rows[rows['track_genre'].isin(genres)]
+            tracks = tracks.loc[np.unique(rows.index)]
+        if explicit is not None:
+            rows = rows[rows['explicit'] == explicit]
+            tracks = tracks[tracks['explicit'] == explicit]
+        expected, actual = {}, {}
+        for by in groupings:
+            if not database.supports(by, spec):
+                continue
+            name = f'grouped_stats({by})'
+            by_genre = 'track_genre' in ([by] if isinstance(by, str) else by)
+            grouped = rows if by_genre else tracks
+            if isinstance(by, str) and by in BINNINGS:
+                expected[name] = grouped.groupby(category_labels(grouped, by), observed=BINNINGS[by]['observed']).agg(spec)
+            else:
+                expected[name] = grouped.groupby(by).agg(spec)
+            actual[name] = database.grouped_stats(by, spec, genres, explicit)
+        rows = rows.reset_index(drop=True)
+        top = rows.loc[rows.groupby('track_genre')['popularity'].idxmax()][['track_genre', 'track_name', 'artists', 'popularity']]
+        expected['top_tracks'] = top.set_index('track_genre')
+        actual['top_tracks'] = database.top_tracks(genres, explicit)
+        expected['genre_rows'] = rows['track_genre'].value_counts()
+        actual['genre_rows'] = database.genre_rows(genres, explicit)
+
+        for name in expected:
+            compare = pd.testing.assert_series_equal if name == 'genre_rows' else pd.testing.assert_frame_equal
+            try:
+                compare(actual[name], expected[name], check_dtype=False, check_index_type=False, check_exact=False, rtol=1e-5)
+            except AssertionError as e:
+                mismatches.append(f"{name} for {genres or 'All Genres'} / {explicit}: {str(e).splitlines()[0]}")
+    return mismatches
+
+
+if __name__ == '__main__':
+    import time
+    from . import dataset_columns
+    from .dataset import load_dataset
+    from .filtering import dataset_genres
+    from .store import prepare
+
+    df = prepare(load_dataset(columns=dataset_columns()))
+    start = time.perf_counter()
+    database = SQLDatabase(df)
+    genres = dataset_genres(df)
+    states = [(None, explicit) for explicit in (None, True, False)]
+    states += [((genre,), explicit) for genre in genres for explicit in (None, True, False)]
+    states += [(tuple(genres[:3]), None), ((), None)]
+    mismatches = check_parity(df, database, states)
+    for line in mismatches:
+        print(line)
+    print(f"{len(states)} filter states checked against pandas in {time.perf_counter() - start:.1f}s, {len(mismatches)} mismatches")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,140 @@
+import hashlib
+import importlib
+import threading
+import pandas as pd
+
+_datasets = {}
+_builders = {}
+_lock = threading.RLock()
+
+# Modules registering builders, imported by prepare() so structures exist before any chart module loads
+BUILDER_MODULES = ('binning', 'filtering', 'aggregates', 'sampling', 'box_stats', 'artists', 'joint_histograms', 'tracks', 'quantiles')
+
+EXPLICIT_FILTERS = {
+    "All": None,
+    "Explicit Only": True,
+    "Non-Explicit Only": False
+}
+
+
+def register_builder(name, builder):
+    """Register a function that derives an index or aggregate from the full dataset"""
+    _builders[name] = builder
+
+
+def frame_fingerprint(df):
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()[:16]
+
+
+def prepare(df, fingerprint=None):
+    """Register a loaded frame and build every derived structure for it once, starting from the disk cache when one exists"""
+    from .disk_cache import load_derived
+
+    fingerprint = fingerprint or df.attrs.get('fingerprint') or frame_fingerprint(df)
+    df.attrs['fingerprint'] = fingerprint
+    stamp_selection(df, None, 'All')
+    for module in BUILDER_MODULES:
+        importlib.import_module(f'.{module}', __package__)
+    with _lock:
+        entry = _datasets.setdefault(fingerprint, {'frame': df, 'derived': {}})
+        if entry['frame'] is df and not set(_builders) <= set(entry['derived']):
+            # Structures registered with the frame, like its genre membership, are kept over cached ones
+            for name, value in load_derived(df).items():
+                if name in _builders:
+                    entry['derived'].setdefault(name, value)
+    for name in list(_builders):
+        get_derived(df, name)
+    return df
+
+
+def register(frame, derived, fingerprint=None):
+    """Register `frame` with derived structures computed elsewhere, e.g. folded from a source streamed in chunks
+
+    Builders only run on `frame` itself for names missing from `derived`.
+    """
+    fingerprint = fingerprint or frame.attrs.get('fingerprint') or frame_fingerprint(frame)
+    frame.attrs['fingerprint'] = fingerprint
+    stamp_selection(frame, None, 'All')
+    with _lock:
+        entry = _datasets.setdefault(fingerprint, {'frame': frame, 'derived': {}})
+        for name, structure in derived.items():
+            entry['derived'].setdefault(name, structure)
+    return frame
+
+
+def extend_dataset(data, frame, fingerprint=None, derived=None):
+    """Register `frame`, the dataset of `data` with rows appended, deriving its structures from the appended rows where possible
+
+    `derived` holds structures computed alongside `frame`, e.g. its genre membership. Structures with an
+    extend(frame, start) method return an updated copy or None, anything left is built from scratch.
+    The dataset of `data` stays registered and unchanged.
+    """
+    old = _datasets.get(data.attrs.get('fingerprint'))
+    if old is None:
+        return prepare(register(frame, derived or {}, fingerprint), fingerprint)
+    start = len(old['frame'])
+    fingerprint = fingerprint or f"{data.attrs['fingerprint']}+{len(frame) - start:x}"
+    frame.attrs['fingerprint'] = fingerprint
+    stamp_selection(frame, None, 'All')
+    with _lock:
+        entry = _datasets.setdefault(fingerprint, {'frame': frame, 'derived': {}})
+        for name, structure in (derived or {}).items():
+            entry['derived'].setdefault(name, structure)
+    for name, structure in list(old['derived'].items()):
+        if name not in entry['derived'] and hasattr(structure, 'extend'):
+            extended = structure.extend(frame, start)
+            if extended is not None:
+                entry['derived'].setdefault(name, extended)
+    for name in list(_builders):
+        get_derived(frame, name)
+    return frame
+
+
+def release(fingerprint):
+    """Forget the dataset registered as `fingerprint`, frames already cut from it fall back to pandas"""
+    with _lock:
+        _datasets.pop(fingerprint, None)
+
+
+def get_derived(data, name):
+    """Derived structure `name` for the dataset `data` was cut from, or None when it is not registered"""
+    entry = _datasets.get(data.attrs.get('fingerprint'))
+    if entry is None or name not in _builders:
+        return None
+    derived = entry['derived']
+    if name not in derived:
+        with _lock:
+            if name not in derived:
+                derived[name] = _builders[name](entry['frame'])
+    return derived[name]
+
+
+def derived_structures(data):
+    """Every derived structure built so far for the dataset `data` was cut from"""
+    entry = _datasets.get(data.attrs.get('fingerprint'))
+    return {} if entry is None else dict(entry['derived'])
+
+
+def canonical_filters(selected_genres, explicit_filter):
+    genres = None
+    if selected_genres and 'All Genres' not in selected_genres:
+        genres = tuple(sorted(set(selected_genres)))
+    return genres, EXPLICIT_FILTERS.get(explicit_filter)
+
+
+def stamp_selection(filtered_df, selected_genres, explicit_filter):
+    """Record which filter state produced `filtered_df` so charts can answer from derived structures"""
+    genres, explicit = canonical_filters(selected_genres, explicit_filter)
+    filtered_df.attrs['selection'] = {'genres': genres, 'explicit': explicit, 'rows': len(filtered_df)}
+    return filtered_df
+
+
+def get_selection(data):
+    """(genres, explicit) filter state stamped on `data`, or None when it is unstamped or its rows no longer match"""
+    if data.attrs.get('fingerprint') not in _datasets:
+        return None
+    selection = data.attrs.get('selection')
+    if selection is None or selection['rows'] != len(data):
+        return None
+    return selection['genres'], selection['explicit']
@@ -0,0 +1,249 @@
+import os
+import numpy as np
+import pandas as pd
+
+from .binning import BINNINGS, ValueRanges, bin_codes, code_column, equal_width_edges
+from .dataset import CSV_DTYPES, compact_frame, dataset_fingerprint, find_dataset_path
+from .store import register, get_derived
+from .tracks import TRACK_ID, split_tracks
+from .aggregates import StatsCube, cube_arrays
+from .box_stats import PopularityHistogram, is_popularity_integral
+from .artists import ArtistTotals
+from .joint_histograms import JointHistograms, RESOLUTIONS
+from .sampling import StableSampler, SAMPLE_SEED
+from .quantiles import QuantileSketches, SKETCH_COLUMNS, grid_decimals, value_grid
+from .utils import SCATTER_SAMPLE_SIZE
+
+# Stream the dataset through aggregates and a bounded sample instead of loading it, for sources larger than memory
+OUT_OF_CORE = os.environ.get('SPOTIFY_OUT_OF_CORE', '') not in ('', '0')
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 500_000))
+
+# Rows the streamed sample keeps in all, shared out between the (genre, explicit) cells
+STREAM_SAMPLE_ROWS = SCATTER_SAMPLE_SIZE
+
+# Appended to the source's fingerprint, so a streamed sample never shares a registry entry or cache with the loaded dataset
+OUT_OF_CORE_SUFFIX = '-ooc'
+
+PRIORITY_COLUMN = '_priority'
+
+
+def iter_chunks(path, columns=None, chunk_rows=STREAM_CHUNK_ROWS):
+    """Frames of at most `chunk_rows` rows of a CSV, Parquet or Arrow file in turn, with the narrow CSV_DTYPES"""
+    if path.endswith(('.parquet', '.feather', '.arrow')):
+        import pyarrow.dataset as ds
+
+        source = ds.dataset(path, format='parquet' if path.endswith('.parquet') else 'ipc')
+        names = [name for name in source.schema.names if columns is None or name in columns]
+        for batch in source.to_batches(columns=names, batch_size=chunk_rows):
+            yield compact_frame(batch.to_pandas())
+        return
+
+    usecols = None if columns is None else (lambda column: column in columns)
+    with pd.read_csv(path, dtype=CSV_DTYPES, usecols=usecols, chunksize=chunk_rows) as reader:
+        yield from reader
+
+
+def _lowest_priority(frame, cap):
+    # The `cap` lowest priorities of every cell, a uniform sample of each that merges across chunks
+    frame = frame.sort_values(PRIORITY_COLUMN, kind='stable')
+    rank = frame.groupby(['track_genre', 'explicit'], dropna=False, sort=False).cumcount()
+    return frame[rank.to_numpy() < cap]
+
+
+def _cell_cap(sizes, budget):
+    """Largest number of rows per cell that keeps the cells of `sizes` rows within `budget` rows in all
+
+    Cells smaller than the cap keep every row, so their unused share goes to the larger ones.
+    """
+    sizes = np.sort(np.asarray(sizes, dtype=np.int64))
+    below = np.r_[0, np.cumsum(sizes)[:-1]]
+    caps = (budget - below) // (len(sizes) - np.arange(len(sizes)))
+    short = np.flatnonzero(caps < sizes)
+    return int(caps[short[0]]) if len(short) else budget
+
+
+def _scan(chunks, rng):
+    """Value ranges of the numeric columns, the quantile sketch grids and the sample of the rows, in one pass
+
+    The sample holds at most STREAM_SAMPLE_ROWS rows, split evenly between the (genre, explicit) cells
+    up to the size of each. Every chunk only contributes its lowest priorities under the current cap.
+    """
+    ranges, decimals = {}, {}
+    sample, cap = None, STREAM_SAMPLE_ROWS
+    for chunk in chunks:
+        for column in chunk.columns:
+            if chunk[column].dtype.kind in 'fiu':
+                values = chunk[column].to_numpy()
+                values = values[~np.isnan(values)] if values.dtype.kind == 'f' else values
+                if len(values):
+                    low, high = ranges.get(column, (np.inf, -np.inf))
+                    ranges[column] = (min(low, float(values.min())), max(high, float(values.max())))
+                    if column in SKETCH_COLUMNS and decimals.get(column, 0) is not None:
+                        written = grid_decimals(values)
+                        decimals[column] = None if written is None else max(written, decimals.get(column, 0))
+        candidates = _lowest_priority(chunk.assign(**{PRIORITY_COLUMN: rng.random(len(chunk))}), cap)
+        sample = candidates if sample is None else pd.concat([sample, candidates], ignore_index=True)
+        cap = _cell_cap(sample.groupby(['track_genre', 'explicit'], dropna=False).size(), STREAM_SAMPLE_ROWS)
+        sample = _lowest_priority(sample, cap)
+    grids = {column: value_grid(*ranges[column], decimals[column]) for column in decimals}
+    return ValueRanges(ranges), grids, sample
+
+
+def _with_codes(chunks, edges):
+    for chunk in chunks:
+        for name, spec in BINNINGS.items():
+            if spec['column'] in chunk.columns:
+                chunk[code_column(name)] = bin_codes(chunk[spec['column']], name, edges[name])
+        yield chunk
+
+
+class SeenKeys:
+    """Sorted 64-bit hashes of the keys met so far, with the source row each was first met at
+
+    Lets a stream count every key once across chunks, in memory linear in the distinct keys.
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.first_rows = np.empty(0, dtype=np.int64)
+
+    def first(self, keys, rows):
+        """True at the first occurrence of every key of `keys`, at source rows `rows`, not met in an earlier call"""
+        new = ~pd.Series(keys).duplicated().to_numpy()
+        if len(self.keys):
+            new &= self.keys[np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)] != keys
+        order = np.argsort(keys[new])
+        added = keys[new][order]
+        at = np.searchsorted(self.keys, added)
+        self.keys = np.insert(self.keys, at, added)
+        self.first_rows = np.insert(self.first_rows, at, rows[new][order])
+        return new
+
+    def first_row(self, keys):
+        """Source row each of `keys`, all met already, was first met at"""
+        return self.first_rows[np.searchsorted(self.keys, keys)]
+
+
+def _fold(chunks, frame, ranges, grids):
+    """Derived structures of every row of `chunks`, coded like the filter engine of the sample `frame`
+
+    Tracks are matched across chunks by a hash of their TRACK_ID: a track counts under "All Genres" at
+    its first row, and under each of its genres at the first row listing it there, with that row's values.
+    Without a TRACK_ID column every row counts as a track of its own. Selections of several genres add
+    up their cells, so a track listed under more than one of them counts once per genre.
+    """
+    engine = get_derived(frame, 'filter_engine')
+    genres = engine.membership.genres
+    n_genres = engine.n_genres
+
+    cube_cells, top = None, {}
+    histogram = PopularityHistogram(frame) if is_popularity_integral(frame) else None
+    popularity_counts = 0
+    sketches = QuantileSketches(engine.n_cells, grids)
+    artists = ArtistTotals(engine.n_cells)
+    joint = JointHistograms(frame, engine.codes, engine.n_cells, engine.tracks)
+    joint.edges = {resolution: [equal_width_edges(ranges.values(f), resolution) for f in joint.features] for resolution in RESOLUTIONS}
+    joint.tables = {}
+
+    seen_tracks, seen_pairs = SeenKeys(), SeenKeys()
+    start = 0
+    for chunk in chunks:
+        source_rows = start + np.arange(len(chunk), dtype=np.int64)
+        start += len(chunk)
+        genre_codes = chunk['track_genre'].map(engine.genre_codes).fillna(-1).to_numpy(dtype=np.intp)
+        explicit = chunk['explicit'].to_numpy(dtype=bool).astype(np.intp)
+        if TRACK_ID in chunk.columns:
+            ids = chunk[TRACK_ID]
+            # Rows without an id are tracks of their own
+            unnamed = ids.isna().to_numpy()
+            track_keys = pd.util.hash_array(ids.fillna('').to_numpy(dtype=object))
+            # A (track, genre) key mixes the genre code into the track's hash
+            pair_keys = track_keys ^ (genre_codes.astype(np.uint64) + np.uint64(1)) * np.uint64(0x9E3779B97F4A7C15)
+            firsts = np.flatnonzero(seen_tracks.first(track_keys, source_rows) | unnamed)
+            listed = np.flatnonzero((seen_pairs.first(pair_keys, source_rows) | unnamed) & (genre_codes >= 0))
+            # Tracks rank by their first row, where the loaded track table places them
+            track_rows = np.where(unnamed, source_rows, seen_tracks.first_row(track_keys))
+        else:
+            firsts, listed = np.arange(len(chunk)), np.flatnonzero(genre_codes >= 0)
+            track_rows = source_rows
+        # Entries like the filter engine's: (track, genre) pairs under the genre, then tracks under "All Genres"
+        rows = np.concatenate([listed, firsts])
+        cells = np.concatenate([genre_codes[listed], np.full(len(firsts), n_genres)]) * 2 + explicit[rows]
+
+        arrays, _ = cube_arrays(chunk, cells // 2, n_genres + 1, rows)
+        cube_cells = arrays if cube_cells is None else {
+            name: {stat: cube_cells[name][stat] + array for stat, array in stats.items()} for name, stats in arrays.items()}
+        # Top spot per cell: highest popularity, then the track with the earliest first row, like the loaded idxmax
+        popularity = chunk['popularity'].to_numpy()
+        order = np.lexsort((track_rows[rows], -popularity[rows].astype(np.float64), cells))
+        order = order[~np.isnan(popularity[rows][order].astype(np.float64))]
+        for i in order[np.r_[True, cells[order][1:] != cells[order][:-1]]] if len(order) else order:
+            cell, row = cells[i], rows[i]
+            candidate = (popularity[row], -track_rows[row])
+            if cell not in top or candidate > top[cell][:2]:
+                top[cell] = candidate + (chunk['track_name'].iloc[row], chunk['artists'].iloc[row])
+
+        if histogram is not None and is_popularity_integral(chunk):
+            popularity_counts = popularity_counts + histogram.counts_of(chunk, cells, rows)
+        else:
+            histogram = None
+
+        sketches.add(chunk, cells, rows)
+        artists.add(chunk.iloc[listed], cells[:len(listed)])
+        artists.add(chunk.iloc[firsts], cells[len(listed):])
+
+        part = JointHistograms(chunk, cells, engine.n_cells, rows)
+        for resolution, edges in joint.edges.items():
+            count, total = part._histogram(edges, resolution, 0)
+            if resolution in joint.tables:
+                count, total = joint.tables[resolution][0] + count, joint.tables[resolution][1] + total
+            joint.tables[resolution] = (count, total)
+
+    top_cells = sorted(top)
+    top_frame = pd.DataFrame({
+        'track_name': [top[cell][2] for cell in top_cells],
+        'artists': [top[cell][3] for cell in top_cells],
+        'popularity': np.array([top[cell][0] for cell in top_cells], dtype=frame['popularity'].dtype)
+    })
+    top_row = np.full(engine.n_cells, -1, dtype=np.intp)
+    top_row[top_cells] = np.arange(len(top_cells))
+    cube = StatsCube(genres, cube_cells, {'row': top_row.reshape(n_genres + 1, 2), 'popularity': top_frame['popularity'].to_numpy()}, top_frame)
+
+    if histogram is not None:
+        histogram.counts = popularity_counts
+
+    return {
+        'stats_cube': cube,
+        # Energy boxes are read from the sketch, exact when energies are written with few decimals as in the source
+        'energy_boxes': None,
+        'popularity_histogram': histogram,
+        'artist_index': artists,
+        'joint_histograms': joint,
+        'quantile_sketches': sketches
+    }
+
+
+def stream_dataset(path=None, columns=None, chunk_rows=STREAM_CHUNK_ROWS):
+    """A registered sample of the dataset at `path` whose derived structures cover every row
+
+    The source is read twice in chunks of `chunk_rows` rows: once for value ranges and a sample of
+    STREAM_SAMPLE_ROWS rows shared by the (genre, explicit) cells, once to fold each chunk into the aggregates.
+    Memory is bounded by the chunk size, the sample and the aggregates rather than the source, and
+    charts reading raw rows (the scatter plots) see the sample.
+    """
+    path = path or find_dataset_path()
+    if columns is not None:
+        columns = sorted(set(columns) | {TRACK_ID})
+    ranges, grids, sample = _scan(iter_chunks(path, columns, chunk_rows), np.random.default_rng(SAMPLE_SEED))
+    edges = {name: ranges.edges(name) for name in BINNINGS}
+
+    # Each sampled row is a track of its own, so the genres stay disjoint and every selection reads the folded cells
+    frame, membership = split_tracks(next(_with_codes([sample.drop(columns=TRACK_ID, errors='ignore').reset_index(drop=True)], edges)))
+    priority = frame.pop(PRIORITY_COLUMN).to_numpy()
+    frame.attrs['sampled'] = True
+    register(frame, {'genre_membership': membership}, dataset_fingerprint(path) + OUT_OF_CORE_SUFFIX)
+
+    derived = _fold(_with_codes(iter_chunks(path, columns, chunk_rows), edges), frame, ranges, grids)
+    derived['stable_sampler'] = StableSampler(frame, priority)
+    derived['value_ranges'] = ranges
+    return register(frame, derived)
@@ -1,22 +1,25 @@
+import numpy as np
 import plotly.graph_objects as go
-import plotly.express as px
-from .utils import get_modern_layout
+from .utils import get_modern_layout, track_labels, compact_array, SCATTER_SAMPLE_SIZE
+from .dataset import load_dataset
+from .sampling import stable_sample
+from .quantiles import feature_quantiles
 
 def create_tempo_loudness_analysis(data=None):
     if data is None:
-        import pandas as pd
-        data = pd.read_csv('data/dataset.csv')
+        data = load_dataset()
 
-    sample_df = data.sample(n=min(8000, len(data)), random_state=42)
+    sample_df = stable_sample(data, SCATTER_SAMPLE_SIZE)
+    loudness_low, loudness_high = feature_quantiles(data, 'loudness', (0.05, 0.95))
     
     fig = go.Figure()
     
-    fig.add_trace(go.Scatter(
-        x=sample_df['tempo'],
-        y=sample_df['popularity'],
+    fig.add_trace(go.Scattergl(
+        x=compact_array(sample_df['tempo']),
+        y=compact_array(sample_df['popularity'], np.uint8),
         mode='markers',
         marker=dict(
-            color=sample_df['loudness'],
+            color=compact_array(sample_df['loudness']),
             colorscale=[
                 [0, '#0066CC'],      
                 [0.25, '#4A90E2'],  
@@ -32,16 +35,16 @@ def create_tempo_loudness_analysis(data=None):
                 len=0.6
             ),
             line=dict(width=0.3, color='#FFFFFF'),
-            cmin=sample_df['loudness'].quantile(0.05), 
-            cmax=sample_df['loudness'].quantile(0.95) 
+            cmin=round(float(loudness_low), 3), 
+            cmax=round(float(loudness_high), 3) 
         ),
+        text=track_labels(sample_df),
         hovertemplate=
-        "<b>%{customdata[0]}</b><br>" +
+        "<b>%{text}</b><br>" +
         "Tempo: <b>%{x:.0f} BPM</b><br>" +
         "Popularity: <b>%{y}</b><br>" +
         "Loudness: <b>%{marker.color:.1f} dB</b>" +
-        "<extra></extra>",
-        customdata=sample_df[['track_name']].values
+        "<extra></extra>"
     ))
     
     layout_update = get_modern_layout()
@@ -1,11 +1,11 @@
-import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px
 from .utils import get_modern_layout
+from .box_stats import length_box_summaries
+from .dataset import load_dataset
 
 def create_track_length_viral(data=None):
     if data is None:
-        data = pd.read_csv('data/dataset.csv')
+        data = load_dataset()
     
 
     if data.empty:
@@ -21,47 +21,41 @@ def create_track_length_viral(data=None):
         fig.update_layout(**layout_update)
         return fig
 
-    df_copy = data.copy()
-    df_copy['duration_min'] = df_copy['duration_ms'] / 60000
-    
-
-    try:
-        df_copy['length_category'] = pd.cut(df_copy['duration_min'], 
-                                      bins=[0, 2.5, 3.5, 4.5, 10], 
-                                      labels=['Short (0-2.5min)', 'Medium (2.5-3.5min)', 'Long (3.5-4.5min)', 'Very Long (4.5min+)'])
-    except Exception as e:
-        fig = go.Figure()
-        fig.add_annotation(
-            text=f"Error processing track length data: {str(e)}",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5,
-            showarrow=False,
-            font=dict(size=16, color='#B8B8B8')
-        )
-        layout_update = get_modern_layout()
-        fig.update_layout(**layout_update)
-        return fig
+    summaries = length_box_summaries(data)
     
     fig = go.Figure()
     
     colors = ['#43E97B', '#1DB954', '#0D7D2C', '#0A5D1F']
     
-    for i, category in enumerate(['Short (0-2.5min)', 'Medium (2.5-3.5min)', 'Long (3.5-4.5min)', 'Very Long (4.5min+)']):
-        category_data = df_copy[df_copy['length_category'] == category]['popularity']
-        
+    for i, (category, summary) in enumerate(summaries.items()):
 
-        if not category_data.empty:
+        if summary is not None:
             fig.add_trace(go.Box(
-                y=category_data,
+                x=[category],
+                q1=[summary['q1']],
+                median=[summary['median']],
+                q3=[summary['q3']],
+                lowerfence=[summary['lowerfence']],
+                upperfence=[summary['upperfence']],
                 name=category,
                 marker_color=colors[i],
                 line=dict(color='#FFFFFF', width=2),
                 fillcolor=colors[i],
                 opacity=0.7,
-                boxpoints='outliers',  
+                boxpoints=False,
                 hoverinfo='y',  
                 hovertemplate=None  
             ))
+            if len(summary['outliers']):
+                fig.add_trace(go.Scatter(
+                    x=[category] * len(summary['outliers']),
+                    y=summary['outliers'],
+                    mode='markers',
+                    name=category,
+                    marker_color=colors[i],
+                    opacity=0.7,
+                    hoverinfo='y'
+                ))
     
     layout_update = get_modern_layout()
     layout_update.update(dict(
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from .store import register_builder, get_derived, get_selection
+
+COLUMNS = ['track_genre', 'explicit']
+
+# Source column identifying a track, read to split the rows into tracks and not kept on the loaded frame
+TRACK_ID = 'track_id'
+
+
+class GenreMembership:
+    """(track, genre) pairs as integer arrays sorted by genre, the only place the genres of a track are kept
+
+    The source lists a track once per genre it belongs to. The track table holds its columns once,
+    `tracks` are positions in that table and `genre_codes` index `genres`.
+    """
+
+    def __init__(self, tracks, genre_codes, genres):
+        self.genres = np.asarray(genres, dtype=object)
+        n_tracks = int(np.max(tracks, initial=-1)) + 1
+        # A track listed twice under one genre is one pair
+        keys = np.unique(np.asarray(genre_codes, dtype=np.int64) * n_tracks + tracks)
+        self.tracks = (keys % max(n_tracks, 1)).astype(np.int32)
+        self.genre_codes = (keys // max(n_tracks, 1)).astype(np.int16)
+        self.indptr = np.searchsorted(self.genre_codes, np.arange(len(self.genres) + 1))
+
+    @classmethod
+    def from_rows(cls, frame):
+        """Membership of a frame with a 'track_genre' column, each of its rows a track of its own"""
+        if 'track_genre' not in frame.columns:
+            return cls(np.array([], dtype=np.int32), np.array([], dtype=np.int16), [])
+        codes, genres = pd.factorize(frame['track_genre'], sort=True)
+        rows = np.flatnonzero(codes >= 0)
+        return cls(rows, codes[rows], genres)
+
+    def tracks_of(self, code):
+        """Ascending positions of the tracks listed under genre `code`"""
+        return self.tracks[self.indptr[code]:self.indptr[code + 1]]
+
+    def is_disjoint(self):
+        """True when no track is listed under two genres, so per-genre sums count every track once"""
+        return len(np.unique(self.tracks)) == len(self.tracks)
+
+    def merge(self, tracks, genres):
+        """Membership with the pairs of track positions `tracks` and genre names `genres` added"""
+        genres = np.asarray(genres, dtype=object)
+        names = np.union1d(self.genres, genres) if len(genres) else self.genres
+        old_codes = np.searchsorted(names, self.genres)[self.genre_codes]
+        new_codes = np.searchsorted(names, genres)
+        return GenreMembership(np.concatenate([self.tracks, tracks]), np.concatenate([old_codes, new_codes]), names)
+
+
+register_builder('genre_membership', GenreMembership.from_rows)
+
+
+def split_tracks(rows):
+    """(track table, membership) of `rows` listing a track once per genre like the source CSV
+
+    Each track keeps the columns of its first row, without 'track_genre'. Tracks are ordered by
+    explicit flag, then by first row, so the "All Genres" states are contiguous. Without a TRACK_ID
+    column every row is a track of its own.
+    """
+    if TRACK_ID in rows.columns:
+        track, _ = pd.factorize(rows[TRACK_ID])
+        # Rows without an id are tracks of their own
+        missing = np.flatnonzero(track < 0)
+        track[missing] = track.max(initial=-1) + 1 + np.arange(len(missing))
+    else:
+        track = np.arange(len(rows))
+    _, first = np.unique(track, return_index=True)
+    explicit = rows['explicit'].to_numpy(dtype=bool)[first]
+    order = np.lexsort((first, explicit))
+    position = np.empty(len(first), dtype=np.int32)
+    position[order] = np.arange(len(first))
+
+    tracks = rows.take(first[order]).drop(columns='track_genre', errors='ignore').reset_index(drop=True)
+    if 'track_genre' not in rows.columns:
+        return tracks, GenreMembership.from_rows(tracks)
+    genre_codes, genres = pd.factorize(rows['track_genre'], sort=True)
+    listed = genre_codes >= 0
+    return tracks, GenreMembership(position[track[listed]], genre_codes[listed], genres)
+
+
+def match_tracks(track_ids, rows):
+    """(first row of every new track, track position of every row) for `rows` added to tracks identified by `track_ids`
+
+    Rows of a known track map to its position. New tracks, including rows without an id, follow the
+    known ones in order of first row.
+    """
+    n_known = len(track_ids)
+    ids = pd.concat([pd.Series(np.asarray(track_ids, dtype=object)), pd.Series(rows[TRACK_ID].to_numpy(dtype=object))], ignore_index=True)
+    codes, uniques = pd.factorize(ids)
+    known, added = codes[:n_known], codes[n_known:]
+    position = np.full(len(uniques), -1, dtype=np.int64)
+    position[known[known >= 0]] = np.flatnonzero(known >= 0)
+    track = np.where(added >= 0, position[np.maximum(added, 0)], -1)
+
+    fresh = np.flatnonzero(track < 0)
+    # Rows without an id are tracks of their own
+    keys = np.where(added[fresh] >= 0, added[fresh], len(uniques) + fresh)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(first))
+    track[fresh] = n_known + rank[inverse]
+    return rows.iloc[fresh[np.sort(first)]], track
+
+
+def with_genres(data):
+    """Rows of `data` joined with their genres through the membership, one per (track, genre), with a 'track_genre' column
+
+    Only the selected genres are joined when `data` is a known filter state. Frames that already carry
+    the column, e.g. rows read straight from the CSV, are returned as they are.
+    """
+    engine = get_derived(data, 'filter_engine')
+    if 'track_genre' in data.columns or engine is None:
+        return data
+    membership = engine.membership
+    selection = get_selection(data)
+    if selection is None or selection[0] is None:
+        codes = range(len(membership.genres))
+    else:
+        codes = sorted(engine.genre_codes[g] for g in selection[0] if g in engine.genre_codes)
+    pairs = np.concatenate([np.arange(membership.indptr[c], membership.indptr[c + 1]) for c in codes] or [np.array([], dtype=np.intp)])
+    # Rows of a frame cut from the track table are labelled with their positions in it
+    pairs = pairs[np.isin(membership.tracks[pairs], data.index.to_numpy())]
+    rows = data.loc[membership.tracks[pairs]]
+    return rows.assign(track_genre=membership.genres[membership.genre_codes[pairs]])
+
+
+def unique_tracks(data):
+    """Rows of `data` with each track once, at its first row, for frames of source rows carrying the TRACK_ID
+
+    A registered track table holds every track once already.
+    """
+    if TRACK_ID not in data.columns:
+        return data
+    ids = data[TRACK_ID]
+    return data[~ids.duplicated() | ids.isna()]
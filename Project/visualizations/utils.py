@@ -1,10 +1,4 @@
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import numpy as np
-from scipy import stats
-import os
 
 PRIMARY_BLUE = '#667EEA'
 SECONDARY_PURPLE = '#764BA2'
@@ -15,7 +9,10 @@ ACCENT_GREEN = '#43E97B'
 
 modern_colors = ['#667EEA', '#764BA2', '#F093FB', '#F9844A', '#4FACFE', '#43E97B', '#A855F7', '#06B6D4']
 
-def get_modern_layout():
+MODERN_TEMPLATE = 'spotify_modern'
+
+
+def _modern_theme():
     return dict(
         plot_bgcolor='#191919',
         paper_bgcolor='#191919',
@@ -47,4 +44,37 @@ def get_modern_layout():
             font=dict(color="white", size=12, family='Inter'),
             align="left"
         )
-    ) 
\ No newline at end of file
+    )
+
+
+def register_modern_template():
+    """Register the dashboard theme as a plotly.io template on top of Plotly's default one"""
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    if MODERN_TEMPLATE not in pio.templates:
+        template = go.layout.Template(pio.templates['plotly'])
+        template.layout.update(_modern_theme())
+        pio.templates[MODERN_TEMPLATE] = template
+    return MODERN_TEMPLATE
+
+
+def get_modern_layout():
+    return dict(template=register_modern_template())
+
+
+SCATTER_SAMPLE_SIZE = 15000
+
+
+def track_labels(data, width=36):
+    """'Track · Artist' hover label per row, truncated so per-point strings stay small"""
+    artists = data['artists'].fillna('').astype(str).str.split(';').str[0]
+    labels = data['track_name'].fillna('').astype(str) + ' · ' + artists
+    long = labels.str.len() > width
+    labels[long] = labels[long].str.slice(0, width - 1) + '…'
+    return labels.to_numpy(dtype=object)
+
+
+def compact_array(values, dtype=np.float32):
+    """Numeric column as a narrow NumPy array, which Plotly serializes as a base64 typed array"""
+    return np.asarray(values, dtype=dtype)
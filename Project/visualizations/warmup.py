@@ -0,0 +1,94 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import get_chart, dataset_columns
+from .store import EXPLICIT_FILTERS
+
+# Worker processes rendering figures at startup, 0 (the default) disables the warmup
+CHART_WARMUP_WORKERS = int(os.environ.get('CHART_WARMUP_WORKERS', 0))
+
+WARMUP_STATES = [(['All Genres'], explicit) for explicit in EXPLICIT_FILTERS]
+
+logger = logging.getLogger(__name__)
+
+_worker_df = None
+
+
+def _init_worker(columns):
+    global _worker_df
+    from .dataset import load_dataset
+    from .store import prepare
+    from .streaming import OUT_OF_CORE, stream_dataset
+
+    _worker_df = stream_dataset(columns=columns) if OUT_OF_CORE else prepare(load_dataset(columns=columns))
+
+
+def _render(name, genres, explicit):
+    """(dataset fingerprint, serialized figure) of chart `name` for a filter state, built in a worker process"""
+    from .filtering import filter_frame
+    from .figure_cache import cached_figure
+
+    return _worker_df.attrs['fingerprint'], cached_figure(get_chart(name), filter_frame(_worker_df, genres, explicit)).to_json()
+
+
+def _warm(df, charts, workers):
+    from .frozen_figure import FrozenFigure
+    from .filtering import filter_frame
+    from .figure_cache import figure_cache, figure_key
+
+    start = time.perf_counter()
+    tasks = [(name, genres, explicit) for genres, explicit in WARMUP_STATES for name in charts]
+    logger.info("Chart warmup: rendering %d figures in %d worker processes", len(tasks), workers)
+
+    done, failed = 0, 0
+    # Spawned workers load the dataset themselves rather than forking the server's threads
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(dataset_columns(),)) as pool:
+        futures = {pool.submit(_render, *task): task for task in tasks}
+        for future in as_completed(futures):
+            name, genres, explicit = futures[future]
+            try:
+                fingerprint, text = future.result()
+            except Exception as e:
+                failed += 1
+                logger.warning("Chart warmup: %s for %s / %s failed: %r", name, genres[0], explicit, e)
+                continue
+            if fingerprint != df.attrs['fingerprint']:
+                # The dataset changed after the warmup started, the figure belongs to another version
+                failed += 1
+                continue
+            key = figure_key(get_chart(name), filter_frame(df, genres, explicit))
+            figure_cache.put(key, FrozenFigure(text), size=len(text))
+            done += 1
+            logger.info("Chart warmup: %d/%d %s for %s / %s (%.1fs)", done + failed, len(tasks), name, genres[0], explicit, time.perf_counter() - start)
+
+    logger.info("Chart warmup finished: %d cached, %d failed in %.1fs", done, failed, time.perf_counter() - start)
+
+
+def start_warmup(df, charts, workers=CHART_WARMUP_WORKERS):
+    """Render `charts` for the WARMUP_STATES in a process pool from a background thread, filling the figure cache
+
+    Returns the thread, or None when the warmup is disabled.
+    """
+    if workers <= 0:
+        return None
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    def run():
+        try:
+            _warm(df, charts, workers)
+        except Exception:
+            logger.exception("Chart warmup aborted")
+
+    thread = threading.Thread(target=run, name='chart-warmup', daemon=True)
+    thread.start()
+    return thread